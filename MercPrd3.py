@@ -1,14 +1,501 @@
 import sqlite3
 import datetime
 import os
+import atexit
+import itertools
+import csv
+import json
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+# --- Configurações de exclusão lógica e compactação ---
+
+DIAS_RETENCAO_EXCLUIDOS = 30   # Por quantos dias um registro excluído ainda pode ser restaurado
+TAMANHO_LOTE_EXPURGO = 500     # Quantos registros excluídos são removidos por transação
+PAGINAS_POR_VACUUM = 1000      # Quantas páginas livres o VACUUM incremental devolve por passo
+HORARIO_COMPACTACAO = (2, 5)   # Janela de baixo movimento (hora inicial, hora final)
+DIAS_HISTORICO_DETALHADO = 90  # Depois disso o histórico de preços guarda só o último preço de cada dia
+
+# --- Configurações da detecção de produtos duplicados ---
+
+LIMIAR_SEMELHANCA = 0.6             # Semelhança mínima (Jaccard dos trigramas) para considerar dois nomes duplicados
+LIMITE_FREQUENCIA_TRIGRAMA = 200    # Trigramas mais comuns que isso não geram candidatos (no cadastro e no relatório em lote)
+
+# --- Configurações do registro de alterações (changelog) ---
+
+TAMANHO_LOTE_CHANGELOG = 500   # Máximo de alterações devolvidas por chamada de buscar_alteracoes()
+
+# --- Configurações de lotes e validade ---
+
+DIAS_AVISO_VALIDADE = 7        # Padrão do relatório "vencendo nos próximos N dias"
+
+# --- Configurações das categorias ---
+
+NIVEIS_CATEGORIA = ('Departamento', 'Seção', 'Subseção')   # Nome de cada nível da árvore, do topo para baixo
+
+# --- Configurações do armazenamento (podem vir de variáveis de ambiente) ---
+
+CAMINHO_BANCO = os.environ.get('MERCPRD_DB', 'mercprd.db')             # Arquivo do banco (ou do snapshot, no motor em memória)
+MOTOR_BANCO = os.environ.get('MERCPRD_MOTOR', 'disco')                 # 'disco', 'memoria' ou 'offline'
+INTERVALO_SNAPSHOT = int(os.environ.get('MERCPRD_SNAPSHOT_S', '300'))  # Segundos entre snapshots do motor em memória
+
+# --- Armazenamento ---
+
+class ArmazenamentoDisco:
+    """Banco em um arquivo SQLite; cada conexão abre o arquivo."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.descricao = caminho
+        # Arquivo onde o banco fica guardado; o arquivo de vendas é criado ao lado dele
+        self.arquivo_banco = caminho
+        # Só uma réplica de terminal offline deixa de registrar lotes e de alterar categorias (veja terminal_offline.py)
+        self.replica = False
+
+    def conectar(self):
+        return sqlite3.connect(self.caminho)
+
+    def preparar(self, conn):
+        """Nada a fazer: as tabelas de criar_banco_de_dados() bastam."""
+
+    def salvar_snapshot(self):
+        """Nada a fazer: os dados já estão no disco."""
+
+    def fechar(self):
+        """Nada a fazer: cada conexão é fechada por quem a abriu."""
+
+class ArmazenamentoMemoria:
+    """
+    Banco inteiro na memória, em um SQLite ':memory:' com cache compartilhado, para que
+    todas as conexões do processo vejam os mesmos dados. Uma conexão "âncora" fica aberta
+    enquanto o armazenamento existir, pois o banco some quando a última conexão fecha.
+    Se houver 'caminho_snapshot', o banco é carregado dele na criação, salvo nele a cada
+    'intervalo_snapshot' segundos e salvo uma última vez ao fechar (ou no fim do processo).
+    O banco em memória só existe dentro do processo; vários processos devem usar o disco.
+    O ganho está nos commits, que não esperam o disco (2000 cadastros com um commit cada:
+    cerca de 0,85 s no disco e 0,07 s aqui). O verificar_planos.py gasta o tempo na CPU
+    (rastreio dos comandos, relatório de duplicados, carga do caixa) e leva quase o
+    mesmo tempo nos dois motores.
+    """
+    _numeracao = itertools.count()
+
+    def __init__(self, caminho_snapshot=None, intervalo_snapshot=INTERVALO_SNAPSHOT):
+        self.caminho_snapshot = caminho_snapshot
+        self.arquivo_banco = caminho_snapshot
+        self.replica = False
+        self.descricao = f"memória (snapshot em '{caminho_snapshot}')" if caminho_snapshot else "memória"
+        self.uri = f"file:mercprd_memoria_{os.getpid()}_{next(self._numeracao)}?mode=memory&cache=shared"
+        self.ancora = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        self.trava = threading.Lock()
+        self.parar = threading.Event()
+
+        if caminho_snapshot and os.path.exists(caminho_snapshot):
+            origem = sqlite3.connect(caminho_snapshot)
+            origem.backup(self.ancora)
+            origem.close()
+
+        if caminho_snapshot and intervalo_snapshot > 0:
+            def salvar_periodicamente():
+                while not self.parar.wait(intervalo_snapshot):
+                    self.salvar_snapshot()
+            threading.Thread(target=salvar_periodicamente, name="snapshot-mercprd", daemon=True).start()
+
+        atexit.register(self.fechar)
+
+    def conectar(self):
+        return sqlite3.connect(self.uri, uri=True)
+
+    def preparar(self, conn):
+        """Nada a fazer: as tabelas de criar_banco_de_dados() bastam."""
+
+    def salvar_snapshot(self):
+        """Copia o banco para um arquivo temporário e o troca pelo snapshot de uma vez só."""
+        if not self.caminho_snapshot:
+            return
+        temporario = self.caminho_snapshot + '.tmp'
+        # A conferência da âncora fica dentro da trava: fechar() pode estar fechando-a
+        with self.trava:
+            if self.ancora is None:
+                return
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            destino = sqlite3.connect(temporario)
+            self.ancora.backup(destino)
+            destino.close()
+            os.replace(temporario, self.caminho_snapshot)
+
+    def fechar(self):
+        self.parar.set()
+        self.salvar_snapshot()
+        with self.trava:
+            if self.ancora is None:
+                return
+            self.ancora.close()
+            self.ancora = None
+        atexit.unregister(self.fechar)
+
+_armazenamento = None
+
+def configurar_armazenamento(caminho=None, motor=None, intervalo_snapshot=None):
+    """
+    Escolhe onde o sistema guarda os dados. Sem argumentos usa CAMINHO_BANCO e MOTOR_BANCO.
+    No motor 'memoria', 'caminho' é o arquivo de snapshot; caminho '' ou ':memory:'
+    deixa o banco só na memória, sem persistência.
+    No motor 'offline', 'caminho' é o banco central e o terminal trabalha sobre uma
+    réplica local sincronizada em segundo plano (veja terminal_offline.py).
+    Retorna o armazenamento configurado.
+    """
+    global _armazenamento
+    caminho = CAMINHO_BANCO if caminho is None else caminho
+    motor = MOTOR_BANCO if motor is None else motor
+    intervalo_snapshot = INTERVALO_SNAPSHOT if intervalo_snapshot is None else intervalo_snapshot
+
+    if _armazenamento is not None:
+        _armazenamento.fechar()
+
+    if motor == 'disco':
+        _armazenamento = ArmazenamentoDisco(caminho)
+    elif motor == 'memoria':
+        _armazenamento = ArmazenamentoMemoria(caminho if caminho not in ('', ':memory:') else None, intervalo_snapshot)
+    elif motor == 'offline':
+        import terminal_offline
+        _armazenamento = terminal_offline.ArmazenamentoOffline(caminho)
+    else:
+        raise ValueError(f"Motor de armazenamento desconhecido: {motor!r} (use 'disco', 'memoria' ou 'offline')")
+    return _armazenamento
+
+def armazenamento():
+    """Retorna o armazenamento em uso, configurando o padrão na primeira chamada."""
+    if _armazenamento is None:
+        configurar_armazenamento()
+    return _armazenamento
+
+# Função chamada com cada comando SQL executado (usada pelo verificar_planos.py); None desliga
+_rastreador_sql = None
+
+def definir_rastreador_sql(funcao):
+    """Registra uma função que recebe o texto de cada comando SQL executado pelas próximas conexões."""
+    global _rastreador_sql
+    _rastreador_sql = funcao
+
+def rastrear(conn):
+    """Liga o rastreador de SQL, se houver, em uma conexão (também nas abertas fora de conectar())."""
+    if _rastreador_sql is not None:
+        conn.set_trace_callback(_rastreador_sql)
+    return conn
+
+def conectar():
+    """Abre uma conexão com o banco de dados do sistema, no armazenamento configurado."""
+    return rastrear(armazenamento().conectar())
+
+# --- Registros e repositórios ---
+
+class Registro:
+    """
+    Base dos registros lidos do banco. As subclasses declaram as colunas em __slots__,
+    então cada linha ocupa só os campos, sem o dicionário de atributos de um objeto comum,
+    e os campos são acessados pelo nome (usuario.is_admin) em vez da posição (usuario[2]).
+    """
+    __slots__ = ()
+
+    def __init__(self, **campos):
+        for nome in self.__slots__:
+            setattr(self, nome, campos.get(nome))
+
+    def __repr__(self):
+        campos = ", ".join(f"{nome}={getattr(self, nome)!r}" for nome in self.__slots__)
+        return f"{type(self).__name__}({campos})"
+
+    @classmethod
+    def colunas(cls):
+        """Lista de colunas para usar no SELECT."""
+        return ", ".join(cls.__slots__)
+
+    @classmethod
+    def fabrica(cls, cursor, linha):
+        """row_factory do sqlite3: monta o registro pelos nomes das colunas do cursor."""
+        registro = cls.__new__(cls)
+        for coluna, valor in zip(cursor.description, linha):
+            setattr(registro, coluna[0], valor)
+        return registro
+
+class Usuario(Registro):
+    __slots__ = ('username', 'password', 'is_admin', 'deleted_at')
+
+class Produto(Registro):
+    __slots__ = ('id', 'nome', 'preco', 'quantidade', 'estoque_minimo', 'deleted_at', 'categoria_id')
+
+class Lote(Registro):
+    __slots__ = ('id', 'produto_id', 'quantidade', 'validade', 'criado_em')
+
+class Categoria(Registro):
+    __slots__ = ('id', 'nome', 'pai_id', 'nivel')
+
+class Repositorio:
+    """
+    Base dos repositórios. Os métodos de listagem são geradores: as linhas são lidas do
+    cursor uma a uma enquanto quem chamou percorre o resultado, sem montar a lista inteira.
+    O repositório não faz commit; quem o usa decide quando confirmar a transação.
+    """
+    registro = None
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _executar(self, sql, parametros=()):
+        cursor = self.conn.cursor()
+        cursor.row_factory = self.registro.fabrica
+        cursor.execute(sql, parametros)
+        return cursor
+
+    def _um(self, sql, parametros=()):
+        return self._executar(sql, parametros).fetchone()
+
+    def _varios(self, sql, parametros=()):
+        yield from self._executar(sql, parametros)
+
+class RepositorioUsuarios(Repositorio):
+    registro = Usuario
+
+    def autenticar(self, username, password):
+        """Retorna o usuário ativo com esse nome e senha, ou None."""
+        return self._um(f"SELECT {Usuario.colunas()} FROM usuarios WHERE username = ? AND password = ? AND deleted_at IS NULL", (username, password))
+
+    def buscar(self, username):
+        """Retorna o usuário ativo com esse nome, ou None."""
+        return self._um(f"SELECT {Usuario.colunas()} FROM usuarios WHERE username = ? AND deleted_at IS NULL", (username,))
+
+    def listar(self):
+        """Gera os usuários ativos em ordem de nome."""
+        return self._varios(f"SELECT {Usuario.colunas()} FROM usuarios WHERE deleted_at IS NULL ORDER BY username")
+
+    def buscar_excluido(self, username):
+        """Retorna a conta excluída (ainda restaurável) com esse nome, ou None."""
+        return self._um(f"SELECT {Usuario.colunas()} FROM usuarios WHERE username = ? AND deleted_at IS NOT NULL", (username,))
+
+    def listar_excluidos(self):
+        """Gera os usuários excluídos, do mais recente para o mais antigo."""
+        return self._varios(f"SELECT {Usuario.colunas()} FROM usuarios WHERE deleted_at IS NOT NULL ORDER BY deleted_at DESC")
+
+    def contar_administradores(self):
+        cursor = self.conn.execute("SELECT COUNT(*) FROM usuarios WHERE is_admin = 1 AND deleted_at IS NULL")
+        return cursor.fetchone()[0]
+
+    def criar(self, username, password, is_admin=0):
+        self.conn.execute("INSERT INTO usuarios (username, password, is_admin) VALUES (?, ?, ?)", (username, password, is_admin))
+
+    def alterar_senha(self, username, nova_senha):
+        self.conn.execute("UPDATE usuarios SET password = ? WHERE username = ? AND deleted_at IS NULL", (nova_senha, username))
+
+    def excluir(self, username):
+        """Exclusão lógica: a conta pode ser restaurada até a compactação do banco."""
+        self.conn.execute("UPDATE usuarios SET deleted_at = ? WHERE username = ?", (agora_texto(), username))
+
+    def restaurar(self, username):
+        """Desfaz a exclusão; retorna False se não havia conta excluída com esse nome."""
+        cursor = self.conn.execute("UPDATE usuarios SET deleted_at = NULL WHERE username = ? AND deleted_at IS NOT NULL", (username,))
+        return cursor.rowcount > 0
+
+class RepositorioProdutos(Repositorio):
+    registro = Produto
+
+    # Colunas que podem ser alteradas por atualizar()
+    campos_editaveis = ('nome', 'preco', 'quantidade', 'estoque_minimo', 'categoria_id')
+
+    def buscar(self, produto_id):
+        """Retorna o produto ativo com esse ID, ou None."""
+        return self._um(f"SELECT {Produto.colunas()} FROM produtos WHERE id = ? AND deleted_at IS NULL", (produto_id,))
+
+    def listar(self):
+        """Gera os produtos ativos em ordem de nome."""
+        return self._varios(f"SELECT {Produto.colunas()} FROM produtos WHERE deleted_at IS NULL ORDER BY nome")
+
+    def listar_da_categoria(self, categoria_id):
+        """
+        Gera os produtos ativos da categoria e de todas as suas subcategorias, em ordem
+        de nome. A tabela de fechamento entrega a subárvore inteira em uma junção pelo
+        índice, sem percorrer o catálogo.
+        """
+        return self._varios(f"""
+            SELECT {Produto.colunas()}
+            FROM categorias_fechamento AS f
+            JOIN produtos AS p ON p.categoria_id = f.descendente_id
+            WHERE f.ancestral_id = ? AND p.deleted_at IS NULL
+            ORDER BY p.nome
+        """, (categoria_id,))
+
+    def listar_excluidos(self):
+        """Gera os produtos excluídos, do mais recente para o mais antigo."""
+        return self._varios(f"SELECT {Produto.colunas()} FROM produtos WHERE deleted_at IS NOT NULL ORDER BY deleted_at DESC")
+
+    def criar(self, nome, preco, quantidade, estoque_minimo=0, categoria_id=None):
+        """Cadastra o produto, atualiza o índice de trigramas e retorna o ID."""
+        cursor = self.conn.execute(
+            "INSERT INTO produtos (nome, preco, quantidade, estoque_minimo, categoria_id) VALUES (?, ?, ?, ?, ?)",
+            (nome, preco, quantidade, estoque_minimo, categoria_id)
+        )
+        indexar_trigramas(cursor, cursor.lastrowid, nome)
+        return cursor.lastrowid
+
+    def atualizar(self, produto_id, **campos):
+        """Altera só os campos informados (veja campos_editaveis) de um produto ativo."""
+        invalidos = set(campos) - set(self.campos_editaveis)
+        if invalidos:
+            raise ValueError(f"Campos não editáveis: {', '.join(sorted(invalidos))}")
+        if not campos:
+            return
+
+        atribuicoes = ", ".join(f"{campo} = ?" for campo in campos)
+        cursor = self.conn.execute(f"UPDATE produtos SET {atribuicoes} WHERE id = ? AND deleted_at IS NULL", (*campos.values(), produto_id))
+        if 'nome' in campos:
+            indexar_trigramas(cursor, produto_id, campos['nome'])
+
+    def excluir(self, produto_id):
+        """Exclusão lógica: o produto pode ser restaurado até a compactação do banco."""
+        self.conn.execute("UPDATE produtos SET deleted_at = ? WHERE id = ?", (agora_texto(), produto_id))
+
+    def restaurar(self, produto_id):
+        """Desfaz a exclusão; retorna False se não havia produto excluído com esse ID."""
+        cursor = self.conn.execute("UPDATE produtos SET deleted_at = NULL WHERE id = ? AND deleted_at IS NOT NULL", (produto_id,))
+        return cursor.rowcount > 0
+
+class RepositorioLotes(Repositorio):
+    registro = Lote
+
+    def criar(self, produto_id, quantidade, validade):
+        """Registra a entrada de um lote; o gatilho soma a quantidade ao produto. Retorna o ID."""
+        cursor = self.conn.execute(
+            "INSERT INTO lotes (produto_id, quantidade, validade, criado_em) VALUES (?, ?, ?, ?)",
+            (produto_id, quantidade, validade, agora_texto())
+        )
+        return cursor.lastrowid
+
+    def listar_do_produto(self, produto_id):
+        """Gera os lotes com saldo de um produto, do que vence primeiro para o último."""
+        return self._varios(f"SELECT {Lote.colunas()} FROM lotes WHERE produto_id = ? AND quantidade > 0 ORDER BY validade", (produto_id,))
+
+    def disponiveis_para_venda(self, produto_id, hoje):
+        """Gera os lotes ainda dentro da validade, do que vence primeiro para o último."""
+        return self._varios(
+            f"SELECT {Lote.colunas()} FROM lotes WHERE produto_id = ? AND validade >= ? AND quantidade > 0 ORDER BY validade, id",
+            (produto_id, hoje)
+        )
+
+    def total_do_produto(self, produto_id):
+        """Soma do saldo dos lotes de um produto."""
+        cursor = self.conn.execute("SELECT COALESCE(SUM(quantidade), 0) FROM lotes WHERE produto_id = ?", (produto_id,))
+        return cursor.fetchone()[0]
+
+    def vencendo_ate(self, data_limite):
+        """Gera (lote, nome do produto) dos lotes com saldo que vencem até 'data_limite', em ordem de validade."""
+        cursor = self.conn.execute("""
+            SELECT l.id, l.produto_id, l.quantidade, l.validade, l.criado_em, p.nome
+            FROM lotes AS l
+            JOIN produtos AS p ON p.id = l.produto_id
+            WHERE l.validade <= ? AND l.quantidade > 0 AND p.deleted_at IS NULL
+            ORDER BY l.validade
+        """, (data_limite,))
+        for lote_id, produto_id, quantidade, validade, criado_em, nome in cursor:
+            yield Lote(id=lote_id, produto_id=produto_id, quantidade=quantidade, validade=validade, criado_em=criado_em), nome
+
+    def baixar(self, lote_id, quantidade):
+        """Tira 'quantidade' do saldo do lote; o gatilho desconta do produto."""
+        self.conn.execute("UPDATE lotes SET quantidade = quantidade - ? WHERE id = ?", (quantidade, lote_id))
+
+class RepositorioCategorias(Repositorio):
+    registro = Categoria
+
+    def buscar(self, categoria_id):
+        """Retorna a categoria com esse ID, ou None."""
+        return self._um(f"SELECT {Categoria.colunas()} FROM categorias WHERE id = ?", (categoria_id,))
+
+    def listar(self):
+        """Gera todas as categorias em ordem de nível e nome (a árvore é montada por quem chama)."""
+        return self._varios(f"SELECT {Categoria.colunas()} FROM categorias ORDER BY nivel, nome")
+
+    def caminho(self, categoria_id):
+        """Nomes da categoria e de seus ancestrais, do departamento até ela."""
+        cursor = self.conn.execute("""
+            SELECT c.nome
+            FROM categorias_fechamento AS f
+            JOIN categorias AS c ON c.id = f.ancestral_id
+            WHERE f.descendente_id = ?
+            ORDER BY f.profundidade DESC
+        """, (categoria_id,))
+        return [nome for (nome,) in cursor]
+
+    def criar(self, nome, pai_id=None):
+        """
+        Cadastra a categoria abaixo de 'pai_id' (ou como departamento) e retorna o ID.
+        O gatilho inclui as linhas da tabela de fechamento e zera os totais.
+        """
+        nivel = 1
+        if pai_id is not None:
+            pai = self.buscar(pai_id)
+            if not pai:
+                raise ValueError("Categoria superior não encontrada.")
+            nivel = pai.nivel + 1
+        if nivel > len(NIVEIS_CATEGORIA):
+            raise ValueError(f"Uma {NIVEIS_CATEGORIA[-1].lower()} não pode ter subcategorias.")
+
+        cursor = self.conn.execute("INSERT INTO categorias (nome, pai_id, nivel) VALUES (?, ?, ?)", (nome, pai_id, nivel))
+        return cursor.lastrowid
+
+    def renomear(self, categoria_id, nome):
+        self.conn.execute("UPDATE categorias SET nome = ? WHERE id = ?", (nome, categoria_id))
+
+    def tem_subcategorias(self, categoria_id):
+        cursor = self.conn.execute(
+            "SELECT 1 FROM categorias_fechamento WHERE ancestral_id = ? AND profundidade > 0 LIMIT 1", (categoria_id,)
+        )
+        return cursor.fetchone() is not None
+
+    def excluir(self, categoria_id):
+        """
+        Exclui uma categoria sem subcategorias nem produtos ativos. Os produtos excluídos
+        que ainda apontavam para ela ficam sem categoria (pelo gatilho).
+        """
+        if self.tem_subcategorias(categoria_id):
+            raise ValueError("A categoria tem subcategorias.")
+        if self.totais(categoria_id)[0]:
+            raise ValueError("A categoria tem produtos.")
+        self.conn.execute("DELETE FROM categorias WHERE id = ?", (categoria_id,))
+
+    def totais(self, categoria_id):
+        """(produtos, quantidade, valor do estoque) da categoria com todas as subcategorias."""
+        cursor = self.conn.execute(
+            "SELECT produtos, quantidade, valor_estoque FROM categorias_totais WHERE categoria_id = ?", (categoria_id,)
+        )
+        return cursor.fetchone() or (0, 0, 0.0)
+
+    def todos_os_totais(self):
+        """{categoria_id: (produtos, quantidade, valor do estoque)} de todas as categorias."""
+        cursor = self.conn.execute("SELECT categoria_id, produtos, quantidade, valor_estoque FROM categorias_totais")
+        return {categoria_id: (produtos, quantidade, valor) for categoria_id, produtos, quantidade, valor in cursor}
 
 def criar_banco_de_dados():
     """
     Cria ou se conecta ao banco de dados e cria as tabelas 'usuarios' e 'produtos'.
     Adiciona a coluna 'is_admin' à tabela 'usuarios' se ela não existir.
+    Adiciona a coluna 'deleted_at' (exclusão lógica) às duas tabelas e os índices
+    parciais que ignoram os registros excluídos.
+    Cria a tabela 'historico_precos' e os gatilhos que registram cada mudança de preço.
+    Adiciona a coluna 'estoque_minimo' e cria a fila 'alertas_estoque', alimentada por
+    gatilhos apenas quando o estoque de um produto cruza o mínimo.
+    Cria o índice de trigramas 'trigramas_produtos' usado na detecção de duplicados.
+    Cria o 'changelog' e os gatilhos que registram toda inclusão, alteração e exclusão
+    em 'produtos' e 'usuarios', além da tabela de consumidores desse registro.
+    Cria as tabelas 'lotes' (quantidade e validade) e 'vendas', com os gatilhos que
+    mantêm 'produtos.quantidade' em dia a cada entrada ou baixa de lote e a impedem
+    de ficar abaixo do saldo dos lotes.
+    Cria a árvore 'categorias' (departamento > seção > subseção), a tabela de fechamento
+    'categorias_fechamento', a coluna 'categoria_id' dos produtos e os totais por
+    categoria em 'categorias_totais', mantidos por gatilhos.
     """
     try:
-        conn = sqlite3.connect('mercprd.db')
+        conn = conectar()
         cursor = conn.cursor()
 
         # Cria a tabela 'usuarios' se ela não existir
@@ -35,8 +522,391 @@ def criar_banco_de_dados():
             );
         """)
 
+        # Adiciona a coluna 'deleted_at' se ela não existir
+        cursor.execute("PRAGMA table_info(produtos)")
+        colunas_produtos = [info[1] for info in cursor.fetchall()]
+        if 'deleted_at' not in colunas_usuarios:
+            cursor.execute("ALTER TABLE usuarios ADD COLUMN deleted_at TEXT;")
+        if 'deleted_at' not in colunas_produtos:
+            cursor.execute("ALTER TABLE produtos ADD COLUMN deleted_at TEXT;")
+
+        # Adiciona a coluna 'estoque_minimo' se ela não existir
+        if 'estoque_minimo' not in colunas_produtos:
+            cursor.execute("ALTER TABLE produtos ADD COLUMN estoque_minimo INTEGER NOT NULL DEFAULT 0;")
+
+        # Adiciona a coluna 'categoria_id' se ela não existir
+        if 'categoria_id' not in colunas_produtos:
+            cursor.execute("ALTER TABLE produtos ADD COLUMN categoria_id INTEGER;")
+
+        # Índices parciais: as consultas do dia a dia só enxergam registros ativos,
+        # e a compactação só enxerga os excluídos
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_usuarios_admin_ativos ON usuarios (is_admin) WHERE deleted_at IS NULL;")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_usuarios_excluidos ON usuarios (deleted_at) WHERE deleted_at IS NOT NULL;")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_produtos_nome_ativos ON produtos (nome) WHERE deleted_at IS NULL;")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_produtos_excluidos ON produtos (deleted_at) WHERE deleted_at IS NOT NULL;")
+
+        # Cria a tabela 'historico_precos' se ela não existir. A chave (produto_id, momento)
+        # em uma tabela WITHOUT ROWID mantém o histórico de cada produto agrupado no disco,
+        # então qualquer consulta por período é uma busca na árvore B seguida de leitura sequencial.
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'historico_precos'")
+        historico_existia = cursor.fetchone() is not None
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS historico_precos (
+                produto_id INTEGER NOT NULL,
+                momento TEXT NOT NULL,
+                preco REAL NOT NULL,
+                PRIMARY KEY (produto_id, momento)
+            ) WITHOUT ROWID;
+        """)
+        if not historico_existia:
+            cursor.execute("INSERT INTO historico_precos (produto_id, momento, preco) SELECT id, ?, preco FROM produtos", (agora_texto() + '.000',))
+
+        # Gatilhos: qualquer caminho que grave um preço (edição, atualização em massa,
+        # importação) passa a ser registrado no histórico
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_historico_precos_insercao AFTER INSERT ON produtos
+            BEGIN
+                INSERT OR REPLACE INTO historico_precos (produto_id, momento, preco)
+                VALUES (NEW.id, strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'), NEW.preco);
+            END;
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_historico_precos_alteracao AFTER UPDATE OF preco ON produtos
+            WHEN NEW.preco <> OLD.preco
+            BEGIN
+                INSERT OR REPLACE INTO historico_precos (produto_id, momento, preco)
+                VALUES (NEW.id, strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'), NEW.preco);
+            END;
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_historico_precos_exclusao AFTER DELETE ON produtos
+            BEGIN
+                DELETE FROM historico_precos WHERE produto_id = OLD.id;
+            END;
+        """)
+
+        # Cria a fila 'alertas_estoque' se ela não existir. Só os alertas pendentes
+        # entram no índice parcial por data, então listá-los custa O(alertas), e não O(catálogo).
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS alertas_estoque (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                produto_id INTEGER NOT NULL,
+                quantidade INTEGER NOT NULL,
+                estoque_minimo INTEGER NOT NULL,
+                criado_em TEXT NOT NULL,
+                resolvido_em TEXT
+            );
+        """)
+        cursor.execute("DROP INDEX IF EXISTS idx_alertas_estoque_pendentes;")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_alertas_estoque_produto ON alertas_estoque (produto_id);")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_alertas_estoque_pendentes_data ON alertas_estoque (criado_em) WHERE resolvido_em IS NULL;")
+
+        # Gatilhos: um alerta nasce quando o estoque passa de "no mínimo ou acima" para
+        # "abaixo do mínimo" e é resolvido quando o estoque volta ao mínimo
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_alerta_estoque_insercao AFTER INSERT ON produtos
+            WHEN NEW.quantidade < NEW.estoque_minimo
+            BEGIN
+                INSERT INTO alertas_estoque (produto_id, quantidade, estoque_minimo, criado_em)
+                VALUES (NEW.id, NEW.quantidade, NEW.estoque_minimo, datetime('now', 'localtime'));
+            END;
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_alerta_estoque_queda AFTER UPDATE OF quantidade, estoque_minimo ON produtos
+            WHEN NEW.quantidade < NEW.estoque_minimo AND OLD.quantidade >= OLD.estoque_minimo
+            BEGIN
+                INSERT INTO alertas_estoque (produto_id, quantidade, estoque_minimo, criado_em)
+                VALUES (NEW.id, NEW.quantidade, NEW.estoque_minimo, datetime('now', 'localtime'));
+            END;
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_alerta_estoque_reposicao AFTER UPDATE OF quantidade, estoque_minimo ON produtos
+            WHEN NEW.quantidade >= NEW.estoque_minimo AND OLD.quantidade < OLD.estoque_minimo
+            BEGIN
+                UPDATE alertas_estoque SET resolvido_em = datetime('now', 'localtime')
+                WHERE produto_id = NEW.id AND resolvido_em IS NULL;
+            END;
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_alerta_estoque_exclusao AFTER DELETE ON produtos
+            BEGIN
+                DELETE FROM alertas_estoque WHERE produto_id = OLD.id;
+            END;
+        """)
+
+        # Cria o índice de trigramas se ele não existir e indexa os produtos já cadastrados
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'trigramas_produtos'")
+        trigramas_existia = cursor.fetchone() is not None
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS trigramas_produtos (
+                trigrama TEXT NOT NULL,
+                produto_id INTEGER NOT NULL,
+                PRIMARY KEY (trigrama, produto_id)
+            ) WITHOUT ROWID;
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_trigramas_produto ON trigramas_produtos (produto_id);")
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_trigramas_exclusao AFTER DELETE ON produtos
+            BEGIN
+                DELETE FROM trigramas_produtos WHERE produto_id = OLD.id;
+            END;
+        """)
+        if not trigramas_existia:
+            cursor.execute("SELECT id, nome FROM produtos")
+            for produto_id, nome in cursor.fetchall():
+                indexar_trigramas(cursor, produto_id, nome)
+
+        # Cria o 'changelog' se ele não existir. O 'seq' AUTOINCREMENT nunca é reutilizado,
+        # nem depois da poda, então "alterações desde seq N" é sempre uma leitura por faixa
+        # da chave primária. A senha dos usuários nunca entra no registro.
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS changelog (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                tabela TEXT NOT NULL,
+                operacao TEXT NOT NULL,
+                chave TEXT NOT NULL,
+                dados TEXT,
+                momento TEXT NOT NULL
+            );
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS consumidores_changelog (
+                nome TEXT PRIMARY KEY,
+                ultimo_seq INTEGER NOT NULL,
+                atualizado_em TEXT NOT NULL
+            );
+        """)
+
+        # Gatilhos: operação 'I' (inclusão), 'U' (alteração) ou 'D' (exclusão).
+        # Os de 'produtos' são recriados em bancos antigos, de antes da coluna 'categoria_id'.
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_changelog_produtos_insercao'")
+        gatilho = cursor.fetchone()
+        if gatilho and 'categoria_id' not in gatilho[0]:
+            for operacao in ('insercao', 'alteracao', 'exclusao'):
+                cursor.execute(f"DROP TRIGGER trg_changelog_produtos_{operacao}")
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_changelog_produtos_insercao AFTER INSERT ON produtos
+            BEGIN
+                INSERT INTO changelog (tabela, operacao, chave, dados, momento)
+                VALUES ('produtos', 'I', NEW.id, json_object('id', NEW.id, 'nome', NEW.nome, 'preco', NEW.preco, 'quantidade', NEW.quantidade, 'estoque_minimo', NEW.estoque_minimo, 'deleted_at', NEW.deleted_at, 'categoria_id', NEW.categoria_id), datetime('now', 'localtime'));
+            END;
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_changelog_produtos_alteracao AFTER UPDATE ON produtos
+            BEGIN
+                INSERT INTO changelog (tabela, operacao, chave, dados, momento)
+                VALUES ('produtos', 'U', NEW.id, json_object('id', NEW.id, 'nome', NEW.nome, 'preco', NEW.preco, 'quantidade', NEW.quantidade, 'estoque_minimo', NEW.estoque_minimo, 'deleted_at', NEW.deleted_at, 'categoria_id', NEW.categoria_id), datetime('now', 'localtime'));
+            END;
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_changelog_produtos_exclusao AFTER DELETE ON produtos
+            BEGIN
+                INSERT INTO changelog (tabela, operacao, chave, dados, momento)
+                VALUES ('produtos', 'D', OLD.id, json_object('id', OLD.id, 'nome', OLD.nome, 'preco', OLD.preco, 'quantidade', OLD.quantidade, 'estoque_minimo', OLD.estoque_minimo, 'deleted_at', OLD.deleted_at, 'categoria_id', OLD.categoria_id), datetime('now', 'localtime'));
+            END;
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_changelog_usuarios_insercao AFTER INSERT ON usuarios
+            BEGIN
+                INSERT INTO changelog (tabela, operacao, chave, dados, momento)
+                VALUES ('usuarios', 'I', NEW.username, json_object('username', NEW.username, 'is_admin', NEW.is_admin, 'deleted_at', NEW.deleted_at), datetime('now', 'localtime'));
+            END;
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_changelog_usuarios_alteracao AFTER UPDATE ON usuarios
+            BEGIN
+                INSERT INTO changelog (tabela, operacao, chave, dados, momento)
+                VALUES ('usuarios', 'U', NEW.username, json_object('username', NEW.username, 'is_admin', NEW.is_admin, 'deleted_at', NEW.deleted_at), datetime('now', 'localtime'));
+            END;
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_changelog_usuarios_exclusao AFTER DELETE ON usuarios
+            BEGIN
+                INSERT INTO changelog (tabela, operacao, chave, dados, momento)
+                VALUES ('usuarios', 'D', OLD.username, json_object('username', OLD.username, 'is_admin', OLD.is_admin, 'deleted_at', OLD.deleted_at), datetime('now', 'localtime'));
+            END;
+        """)
+
+        # Cria a tabela 'lotes' se ela não existir. O índice parcial por validade só
+        # guarda lotes com saldo, então o relatório de vencimentos é uma busca por faixa.
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS lotes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                produto_id INTEGER NOT NULL,
+                quantidade INTEGER NOT NULL CHECK (quantidade >= 0),
+                validade TEXT NOT NULL,
+                criado_em TEXT NOT NULL
+            );
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_lotes_produto_validade ON lotes (produto_id, validade);")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_lotes_validade_com_saldo ON lotes (validade) WHERE quantidade > 0;")
+
+        # Gatilhos: 'produtos.quantidade' soma ou subtrai só a diferença de cada lote,
+        # sem recalcular o total. O estoque que não pertence a nenhum lote (cadastrado
+        # antes dos lotes ou pela edição do produto) continua valendo.
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_lotes_insercao AFTER INSERT ON lotes
+            BEGIN
+                UPDATE produtos SET quantidade = quantidade + NEW.quantidade WHERE id = NEW.produto_id;
+            END;
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_lotes_alteracao AFTER UPDATE OF quantidade ON lotes
+            WHEN NEW.quantidade <> OLD.quantidade
+            BEGIN
+                UPDATE produtos SET quantidade = quantidade + NEW.quantidade - OLD.quantidade WHERE id = NEW.produto_id;
+            END;
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_lotes_exclusao AFTER DELETE ON lotes
+            BEGIN
+                UPDATE produtos SET quantidade = quantidade - OLD.quantidade WHERE id = OLD.produto_id;
+            END;
+        """)
+        # 'produtos.quantidade' nunca fica abaixo do saldo dos lotes, venha a alteração da
+        # tela, do repositório ou da sincronização. Só uma queda pode quebrar a regra, então
+        # a soma dos lotes só é lida quando a quantidade diminui. Em um banco antigo, os
+        # produtos que já estavam abaixo dos lotes são acertados uma vez pelo saldo dos lotes.
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_lotes_quantidade_minima'")
+        if cursor.fetchone() is None:
+            cursor.execute("""
+                UPDATE produtos SET quantidade = (SELECT SUM(quantidade) FROM lotes WHERE produto_id = produtos.id)
+                WHERE id IN (SELECT produto_id FROM lotes GROUP BY produto_id HAVING SUM(quantidade) > 0)
+                  AND quantidade < (SELECT SUM(quantidade) FROM lotes WHERE produto_id = produtos.id)
+            """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_lotes_quantidade_minima BEFORE UPDATE OF quantidade ON produtos
+            WHEN NEW.quantidade < OLD.quantidade
+            BEGIN
+                SELECT RAISE(ABORT, 'A quantidade não pode ficar abaixo do saldo dos lotes')
+                WHERE NEW.quantidade < (SELECT COALESCE(SUM(quantidade), 0) FROM lotes WHERE produto_id = NEW.id);
+            END;
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_lotes_produto_exclusao AFTER DELETE ON produtos
+            BEGIN
+                DELETE FROM lotes WHERE produto_id = OLD.id;
+            END;
+        """)
+
+        # Cria a tabela 'vendas' se ela não existir
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS vendas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                produto_id INTEGER NOT NULL,
+                quantidade INTEGER NOT NULL,
+                momento TEXT NOT NULL
+            );
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_vendas_produto_momento ON vendas (produto_id, momento);")
+        # Localiza o início e o fim de um período de vendas (planejador de reposição)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_vendas_momento ON vendas (momento);")
+
+        # Cria a árvore de categorias se ela não existir. 'categorias_fechamento' guarda um
+        # par (ancestral, descendente) para cada caminho da árvore, inclusive o da própria
+        # categoria com profundidade 0; assim a subárvore inteira sai de uma busca pela
+        # chave primária, sem consulta recursiva.
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS categorias (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome TEXT NOT NULL,
+                pai_id INTEGER REFERENCES categorias (id),
+                nivel INTEGER NOT NULL CHECK (nivel BETWEEN 1 AND 3)
+            );
+        """)
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_categorias_pai_nome ON categorias (IFNULL(pai_id, 0), nome);")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS categorias_fechamento (
+                ancestral_id INTEGER NOT NULL,
+                descendente_id INTEGER NOT NULL,
+                profundidade INTEGER NOT NULL,
+                PRIMARY KEY (ancestral_id, descendente_id)
+            ) WITHOUT ROWID;
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_categorias_fechamento_descendente ON categorias_fechamento (descendente_id, ancestral_id);")
+        # Totais da subárvore de cada categoria (produtos ativos, unidades e valor do estoque)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS categorias_totais (
+                categoria_id INTEGER PRIMARY KEY,
+                produtos INTEGER NOT NULL DEFAULT 0,
+                quantidade INTEGER NOT NULL DEFAULT 0,
+                valor_estoque REAL NOT NULL DEFAULT 0
+            );
+        """)
+        # Só os produtos com categoria entram no índice; a junção pela categoria o usa direto
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_produtos_categoria ON produtos (categoria_id, nome) WHERE categoria_id IS NOT NULL;")
+
+        # Gatilhos da árvore: a nova categoria herda os caminhos do pai. Só categorias sem
+        # subcategorias são excluídas (veja RepositorioCategorias.excluir).
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_categorias_insercao AFTER INSERT ON categorias
+            BEGIN
+                INSERT INTO categorias_fechamento (ancestral_id, descendente_id, profundidade)
+                SELECT ancestral_id, NEW.id, profundidade + 1 FROM categorias_fechamento WHERE descendente_id = NEW.pai_id
+                UNION ALL
+                SELECT NEW.id, NEW.id, 0;
+                INSERT INTO categorias_totais (categoria_id) VALUES (NEW.id);
+            END;
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_categorias_exclusao AFTER DELETE ON categorias
+            BEGIN
+                UPDATE produtos SET categoria_id = NULL WHERE categoria_id = OLD.id;
+                DELETE FROM categorias_fechamento WHERE descendente_id = OLD.id;
+                DELETE FROM categorias_totais WHERE categoria_id = OLD.id;
+            END;
+        """)
+
+        # Gatilhos dos totais: cada mudança de produto ativo tira a contribuição antiga e
+        # soma a nova em todos os ancestrais da categoria (no máximo três linhas), sem
+        # recalcular a categoria inteira.
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_categorias_totais_insercao AFTER INSERT ON produtos
+            WHEN NEW.categoria_id IS NOT NULL AND NEW.deleted_at IS NULL
+            BEGIN
+                UPDATE categorias_totais
+                SET produtos = produtos + 1, quantidade = quantidade + NEW.quantidade, valor_estoque = valor_estoque + NEW.quantidade * NEW.preco
+                WHERE categoria_id IN (SELECT ancestral_id FROM categorias_fechamento WHERE descendente_id = NEW.categoria_id);
+            END;
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_categorias_totais_alteracao AFTER UPDATE OF categoria_id, quantidade, preco, deleted_at ON produtos
+            WHEN OLD.categoria_id IS NOT NULL OR NEW.categoria_id IS NOT NULL
+            BEGIN
+                UPDATE categorias_totais
+                SET produtos = produtos - 1, quantidade = quantidade - OLD.quantidade, valor_estoque = valor_estoque - OLD.quantidade * OLD.preco
+                WHERE OLD.deleted_at IS NULL
+                  AND categoria_id IN (SELECT ancestral_id FROM categorias_fechamento WHERE descendente_id = OLD.categoria_id);
+                UPDATE categorias_totais
+                SET produtos = produtos + 1, quantidade = quantidade + NEW.quantidade, valor_estoque = valor_estoque + NEW.quantidade * NEW.preco
+                WHERE NEW.deleted_at IS NULL
+                  AND categoria_id IN (SELECT ancestral_id FROM categorias_fechamento WHERE descendente_id = NEW.categoria_id);
+            END;
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_categorias_totais_exclusao AFTER DELETE ON produtos
+            WHEN OLD.categoria_id IS NOT NULL AND OLD.deleted_at IS NULL
+            BEGIN
+                UPDATE categorias_totais
+                SET produtos = produtos - 1, quantidade = quantidade - OLD.quantidade, valor_estoque = valor_estoque - OLD.quantidade * OLD.preco
+                WHERE categoria_id IN (SELECT ancestral_id FROM categorias_fechamento WHERE descendente_id = OLD.categoria_id);
+            END;
+        """)
+
         conn.commit()
-        print("Banco de dados 'mercprd.db' e as tabelas 'usuarios' e 'produtos' prontos.")
+        armazenamento().preparar(conn)
+        print(f"Banco de dados '{armazenamento().descricao}' e as tabelas 'usuarios' e 'produtos' prontos.")
+
+        # Ativa o VACUUM incremental. Em um banco já existente o modo só passa a valer
+        # depois de um VACUUM completo, feito uma única vez. O VACUUM falha se outro
+        # terminal estiver lendo o banco; aí só o modo fica para a próxima inicialização.
+        try:
+            cursor.execute("PRAGMA auto_vacuum")
+            if cursor.fetchone()[0] != 2:
+                cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                cursor.execute("VACUUM")
+        except sqlite3.OperationalError as e:
+            print(f"Aviso: VACUUM incremental não ativado agora ({e}); nova tentativa na próxima inicialização.")
 
     except sqlite3.Error as e:
         print(f"Erro ao criar o banco de dados: {e}")
@@ -57,6 +927,25 @@ def saudacao():
     else:
         return "Boa noite!"
 
+def agora_texto():
+    """Retorna a data e hora atuais no formato gravado no banco ('AAAA-MM-DD HH:MM:SS')."""
+    return datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+def explicar_nome_em_uso(conn, username):
+    """
+    Explica por que o nome de usuário não pode ser usado. Uma conta excluída continua
+    com o nome reservado até a compactação, para poder ser restaurada.
+    """
+    excluida = RepositorioUsuarios(conn).buscar_excluido(username)
+    if not excluida:
+        print("\nErro: Este nome de usuário já existe. Por favor, escolha outro.")
+        return
+
+    excluida_em = datetime.datetime.strptime(excluida.deleted_at, '%Y-%m-%d %H:%M:%S')
+    liberado_em = (excluida_em + datetime.timedelta(days=DIAS_RETENCAO_EXCLUIDOS)).strftime('%d/%m/%Y')
+    print(f"\nErro: Este nome de usuário pertence a uma conta excluída em {excluida.deleted_at}.")
+    print(f"Um administrador pode restaurá-la em 'Gerenciar Usuários'; se não for, o nome fica livre na compactação a partir de {liberado_em}.")
+
 def registrar_usuario():
     """
     Permite ao usuário criar uma nova conta (não-admin) e armazena no banco de dados.
@@ -72,16 +961,14 @@ def registrar_usuario():
     username_lower = username.lower()
 
     try:
-        conn = sqlite3.connect('mercprd.db')
-        cursor = conn.cursor()
-
-        cursor.execute("INSERT INTO usuarios (username, password, is_admin) VALUES (?, ?, ?)", (username_lower, password, 0))
+        conn = conectar()
+        RepositorioUsuarios(conn).criar(username_lower, password, 0)
         
         conn.commit()
         print("\nConta criada com sucesso! Agora você pode fazer o login.")
 
     except sqlite3.IntegrityError:
-        print("\nErro: Este nome de usuário já existe. Por favor, escolha outro.")
+        explicar_nome_em_uso(conn, username_lower)
 
     except sqlite3.Error as e:
         print(f"\nErro ao registrar usuário: {e}")
@@ -101,16 +988,12 @@ def fazer_login():
     username_lower = username.lower()
 
     try:
-        conn = sqlite3.connect('mercprd.db')
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT * FROM usuarios WHERE username = ? AND password = ?", (username_lower, password))
-        usuario = cursor.fetchone()
+        conn = conectar()
+        usuario = RepositorioUsuarios(conn).autenticar(username_lower, password)
 
         if usuario:
-            print(f"\nLogin bem-sucedido! Bem-vindo(a), {usuario[0].capitalize()}!")
-            is_admin = usuario[2]
-            if is_admin == 1:
+            print(f"\nLogin bem-sucedido! Bem-vindo(a), {usuario.username.capitalize()}!")
+            if usuario.is_admin == 1:
                 menu_admin()
             else:
                 menu_usuario()
@@ -135,13 +1018,10 @@ def trocar_senha():
     username_lower = username.lower()
 
     try:
-        conn = sqlite3.connect('mercprd.db')
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT * FROM usuarios WHERE username = ? AND password = ?", (username_lower, senha_atual))
-        usuario = cursor.fetchone()
+        conn = conectar()
+        usuarios = RepositorioUsuarios(conn)
 
-        if not usuario:
+        if not usuarios.autenticar(username_lower, senha_atual):
             print("\nErro: Usuário ou senha atual inválidos.")
             return
 
@@ -151,7 +1031,7 @@ def trocar_senha():
             print("\nErro: A nova senha deve ter no mínimo 8 caracteres, com pelo menos uma letra e um número.")
             return
 
-        cursor.execute("UPDATE usuarios SET password = ? WHERE username = ?", (nova_senha, username_lower))
+        usuarios.alterar_senha(username_lower, nova_senha)
         conn.commit()
         print("\nSenha alterada com sucesso!")
 
@@ -174,21 +1054,20 @@ def criar_admin():
     username_lower = username.lower()
 
     try:
-        conn = sqlite3.connect('mercprd.db')
-        cursor = conn.cursor()
+        conn = conectar()
+        usuarios = RepositorioUsuarios(conn)
 
-        cursor.execute("SELECT COUNT(*) FROM usuarios WHERE is_admin = 1")
-        if cursor.fetchone()[0] > 0:
+        if usuarios.contar_administradores() > 0:
             print("\nErro: Já existe uma conta de administrador. Não é possível criar outra.")
             return
         
-        cursor.execute("INSERT INTO usuarios (username, password, is_admin) VALUES (?, ?, ?)", (username_lower, password, 1))
+        usuarios.criar(username_lower, password, 1)
         
         conn.commit()
         print("\nConta de administrador criada com sucesso!")
 
     except sqlite3.IntegrityError:
-        print("\nErro: Este nome de usuário já existe.")
+        explicar_nome_em_uso(conn, username_lower)
 
     finally:
         if conn:
@@ -205,13 +1084,10 @@ def excluir_conta(username_to_delete=None):
     username_lower = username.lower()
 
     try:
-        conn = sqlite3.connect('mercprd.db')
-        cursor = conn.cursor()
+        conn = conectar()
+        usuarios = RepositorioUsuarios(conn)
 
-        cursor.execute("SELECT * FROM usuarios WHERE username = ?", (username_lower,))
-        usuario = cursor.fetchone()
-
-        if not usuario:
+        if not usuarios.buscar(username_lower):
             print(f"\nErro: Usuário '{username}' não encontrado.")
             return
 
@@ -220,9 +1096,9 @@ def excluir_conta(username_to_delete=None):
             print("\nOperação cancelada.")
             return
 
-        cursor.execute("DELETE FROM usuarios WHERE username = ?", (username_lower,))
+        usuarios.excluir(username_lower)
         conn.commit()
-        print(f"\nConta de '{username}' excluída com sucesso.")
+        print(f"\nConta de '{username}' excluída com sucesso. Ela pode ser restaurada por {DIAS_RETENCAO_EXCLUIDOS} dias.")
 
     except sqlite3.Error as e:
         print(f"Erro ao excluir a conta: {e}")
@@ -231,6 +1107,37 @@ def excluir_conta(username_to_delete=None):
         if conn:
             conn.close()
 
+def restaurar_conta():
+    """Permite ao administrador desfazer a exclusão de uma conta de usuário."""
+    print("\n--- Restaurar Conta Excluída ---")
+    try:
+        conn = conectar()
+        usuarios = RepositorioUsuarios(conn)
+
+        encontrou = False
+        for usuario in usuarios.listar_excluidos():
+            print(f" - Usuário: {usuario.username.capitalize()} (excluído em {usuario.deleted_at})")
+            encontrou = True
+
+        if not encontrou:
+            print("Nenhuma conta excluída para restaurar.")
+            return
+
+        username = input("Digite o nome de usuário da conta que deseja restaurar: ")
+        if not usuarios.restaurar(username.lower()):
+            print(f"\nErro: Nenhuma conta excluída com o nome '{username}'.")
+            return
+
+        conn.commit()
+        print(f"\nConta de '{username}' restaurada com sucesso.")
+
+    except sqlite3.Error as e:
+        print(f"Erro ao restaurar a conta: {e}")
+
+    finally:
+        if conn:
+            conn.close()
+
 def alterar_senha_admin(username_to_alter=None):
     """Permite ao administrador alterar a senha de qualquer conta."""
     if username_to_alter is None:
@@ -242,13 +1149,10 @@ def alterar_senha_admin(username_to_alter=None):
     username_lower = username.lower()
 
     try:
-        conn = sqlite3.connect('mercprd.db')
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT * FROM usuarios WHERE username = ?", (username_lower,))
-        usuario = cursor.fetchone()
+        conn = conectar()
+        usuarios = RepositorioUsuarios(conn)
 
-        if not usuario:
+        if not usuarios.buscar(username_lower):
             print("\nErro: Usuário não encontrado.")
             return
 
@@ -258,7 +1162,7 @@ def alterar_senha_admin(username_to_alter=None):
             print("\nErro: A nova senha deve ter no mínimo 8 caracteres, com pelo menos uma letra e um número.")
             return
 
-        cursor.execute("UPDATE usuarios SET password = ? WHERE username = ?", (nova_senha, username_lower))
+        usuarios.alterar_senha(username_lower, nova_senha)
         conn.commit()
         print(f"\nSenha do usuário '{username}' alterada com sucesso!")
 
@@ -269,6 +1173,15 @@ def alterar_senha_admin(username_to_alter=None):
         if conn:
             conn.close()
 
+def exibir_contas(usuarios):
+    """Mostra as contas ativas, uma por linha, e retorna quantas foram mostradas."""
+    total = 0
+    for usuario in usuarios.listar():
+        status = "Administrador" if usuario.is_admin == 1 else "Usuário Comum"
+        print(f" - Usuário: {usuario.username.capitalize()} ({status})")
+        total += 1
+    return total
+
 def visualizar_contas_e_gerenciar():
     """
     Permite ao administrador visualizar todas as contas cadastradas e
@@ -276,39 +1189,30 @@ def visualizar_contas_e_gerenciar():
     """
     print("\n--- Gerenciamento de Contas ---")
     try:
-        conn = sqlite3.connect('mercprd.db')
-        cursor = conn.cursor()
+        conn = conectar()
+        usuarios = RepositorioUsuarios(conn)
         
-        cursor.execute("SELECT username, is_admin FROM usuarios ORDER BY username")
-        usuarios = cursor.fetchall()
-        
-        if not usuarios:
+        if not exibir_contas(usuarios):
             print("Nenhum usuário cadastrado.")
             return
 
-        for usuario in usuarios:
-            status = "Administrador" if usuario[1] == 1 else "Usuário Comum"
-            print(f" - Usuário: {usuario[0].capitalize()} ({status})")
-
         print("-" * 30)
         
         while True:
             opcao = input("Deseja alterar ou excluir alguma conta? (s/n): ")
             if opcao.lower() == 's':
-                acao = input("Digite 'a' para Alterar senha ou 'e' para Excluir conta: ")
+                acao = input("Digite 'a' para Alterar senha, 'e' para Excluir conta ou 'r' para Restaurar conta excluída: ")
                 if acao.lower() == 'a':
                     alterar_senha_admin()
                 elif acao.lower() == 'e':
                     excluir_conta()
+                elif acao.lower() == 'r':
+                    restaurar_conta()
                 else:
                     print("Opção inválida.")
                 
                 print("\nLista de contas atualizada:")
-                cursor.execute("SELECT username, is_admin FROM usuarios ORDER BY username")
-                usuarios = cursor.fetchall()
-                for usuario in usuarios:
-                    status = "Administrador" if usuario[1] == 1 else "Usuário Comum"
-                    print(f" - Usuário: {usuario[0].capitalize()} ({status})")
+                exibir_contas(usuarios)
                 print("-" * 30)
 
             elif opcao.lower() == 'n':
@@ -324,6 +1228,195 @@ def visualizar_contas_e_gerenciar():
         if conn:
             conn.close()
 
+# --- Detecção de produtos duplicados ---
+
+def normalizar_nome(nome):
+    """Normaliza um nome de produto: sem acentos, minúsculo e só com letras e números ("ARROZ 5 Kg" -> "arroz5kg")."""
+    sem_acentos = unicodedata.normalize('NFKD', nome)
+    return ''.join(char for char in sem_acentos.lower() if char.isalnum())
+
+def trigramas(nome):
+    """Retorna o conjunto de trigramas do nome normalizado, com marcadores de início e fim."""
+    normalizado = f"$${normalizar_nome(nome)}$"
+    return {normalizado[i:i + 3] for i in range(len(normalizado) - 2)}
+
+def semelhanca(trigramas_a, trigramas_b):
+    """Coeficiente de Jaccard entre dois conjuntos de trigramas."""
+    if not trigramas_a or not trigramas_b:
+        return 0.0
+    comuns = len(trigramas_a & trigramas_b)
+    return comuns / (len(trigramas_a) + len(trigramas_b) - comuns)
+
+def indexar_trigramas(cursor, produto_id, nome):
+    """Atualiza o índice de trigramas de um produto (usado no cadastro e na edição do nome)."""
+    cursor.execute("DELETE FROM trigramas_produtos WHERE produto_id = ?", (produto_id,))
+    cursor.executemany(
+        "INSERT OR IGNORE INTO trigramas_produtos (trigrama, produto_id) VALUES (?, ?)",
+        [(trigrama, produto_id) for trigrama in trigramas(nome)]
+    )
+
+def trigramas_raros(cursor, trigramas_nome):
+    """
+    Separa os trigramas que aparecem em no máximo LIMITE_FREQUENCIA_TRIGRAMA produtos.
+    Cada contagem para no limite, então um trigrama comum custa o mesmo que um raro.
+    """
+    raros = []
+    for trigrama in trigramas_nome:
+        cursor.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM trigramas_produtos WHERE trigrama = ? LIMIT ?)",
+            (trigrama, LIMITE_FREQUENCIA_TRIGRAMA + 1)
+        )
+        if cursor.fetchone()[0] <= LIMITE_FREQUENCIA_TRIGRAMA:
+            raros.append(trigrama)
+    return raros
+
+def buscar_produtos_semelhantes(cursor, nome, ignorar_id=None, categoria_id=None):
+    """
+    Retorna os produtos ativos cujo nome é parecido com 'nome', do mais para o menos
+    parecido: [(semelhança, id, nome)]. Lê só as listas de produtos dos trigramas do
+    nome procurado, sem percorrer o catálogo, e ignora os trigramas muito comuns, como
+    o relatório em lote (agrupar_duplicados). Um nome só de trigramas comuns ainda
+    encontra os produtos com o nome idêntico, pelo índice de nomes. Com 'categoria_id',
+    só entram os produtos dessa categoria e de suas subcategorias.
+    """
+    filtro_categoria, parametros_categoria = "", []
+    if categoria_id is not None:
+        filtro_categoria = "AND p.categoria_id IN (SELECT descendente_id FROM categorias_fechamento WHERE ancestral_id = ?)"
+        parametros_categoria = [categoria_id]
+
+    cursor.execute(f"SELECT p.id, p.nome FROM produtos AS p WHERE p.nome = ? AND p.deleted_at IS NULL {filtro_categoria}",
+                   [nome, *parametros_categoria])
+    candidatos = dict(cursor.fetchall())
+
+    trigramas_nome = trigramas(nome)
+    raros = trigramas_raros(cursor, trigramas_nome)
+    if raros:
+        # Os trigramas comuns ignorados deixam de contar: o mínimo cai o mesmo tanto
+        minimo_comuns = max(1, int(LIMIAR_SEMELHANCA * len(trigramas_nome)) - (len(trigramas_nome) - len(raros)))
+        marcadores = ", ".join("?" * len(raros))
+        cursor.execute(f"""
+            SELECT p.id, p.nome
+            FROM (
+                SELECT produto_id FROM trigramas_produtos
+                WHERE trigrama IN ({marcadores})
+                GROUP BY produto_id
+                HAVING COUNT(*) >= ?
+            ) AS candidatos
+            JOIN produtos AS p ON p.id = candidatos.produto_id
+            WHERE p.deleted_at IS NULL {filtro_categoria}
+        """, [*raros, minimo_comuns, *parametros_categoria])
+        candidatos.update(cursor.fetchall())
+
+    semelhantes = []
+    for produto_id, nome_existente in candidatos.items():
+        if produto_id == ignorar_id:
+            continue
+        grau = semelhanca(trigramas_nome, trigramas(nome_existente))
+        if grau >= LIMIAR_SEMELHANCA:
+            semelhantes.append((grau, produto_id, nome_existente))
+
+    semelhantes.sort(reverse=True)
+    return semelhantes
+
+def agrupar_duplicados(cursor):
+    """
+    Agrupa todo o catálogo em grupos de nomes parecidos e retorna só os grupos com
+    mais de um produto: [[(id, nome), ...], ...].
+    Os pares candidatos vêm das listas do índice de trigramas, ignorando os trigramas
+    muito comuns; assim o custo cresce com o tamanho dessas listas, e não com todos
+    os pares possíveis do catálogo.
+    """
+    cursor.execute("SELECT id, nome FROM produtos WHERE deleted_at IS NULL")
+    nomes = dict(cursor.fetchall())
+    trigramas_por_id = {produto_id: trigramas(nome) for produto_id, nome in nomes.items()}
+
+    # União e busca (union-find) para juntar os pares semelhantes em grupos
+    pai = {produto_id: produto_id for produto_id in nomes}
+
+    def raiz(produto_id):
+        while pai[produto_id] != produto_id:
+            pai[produto_id] = pai[pai[produto_id]]
+            produto_id = pai[produto_id]
+        return produto_id
+
+    def unir(a, b):
+        raiz_a, raiz_b = raiz(a), raiz(b)
+        if raiz_a != raiz_b:
+            pai[max(raiz_a, raiz_b)] = min(raiz_a, raiz_b)
+
+    # Nomes iguais depois de normalizados já são duplicados
+    por_chave = {}
+    for produto_id, nome in nomes.items():
+        chave = normalizar_nome(nome)
+        if chave in por_chave:
+            unir(por_chave[chave], produto_id)
+        else:
+            por_chave[chave] = produto_id
+
+    # Pares candidatos: produtos que dividem trigramas pouco frequentes
+    pares = Counter()
+    lista_atual, trigrama_atual = [], None
+    cursor.execute("SELECT trigrama, produto_id FROM trigramas_produtos ORDER BY trigrama")
+    for trigrama, produto_id in cursor:
+        if trigrama != trigrama_atual:
+            if 1 < len(lista_atual) <= LIMITE_FREQUENCIA_TRIGRAMA:
+                for i, a in enumerate(lista_atual):
+                    for b in lista_atual[i + 1:]:
+                        pares[(a, b)] += 1
+            lista_atual, trigrama_atual = [], trigrama
+        if produto_id in nomes:
+            lista_atual.append(produto_id)
+    if 1 < len(lista_atual) <= LIMITE_FREQUENCIA_TRIGRAMA:
+        for i, a in enumerate(lista_atual):
+            for b in lista_atual[i + 1:]:
+                pares[(a, b)] += 1
+
+    for (a, b), comuns in pares.items():
+        if comuns >= 2 and raiz(a) != raiz(b) and semelhanca(trigramas_por_id[a], trigramas_por_id[b]) >= LIMIAR_SEMELHANCA:
+            unir(a, b)
+
+    grupos = {}
+    for produto_id in nomes:
+        grupos.setdefault(raiz(produto_id), []).append((produto_id, nomes[produto_id]))
+
+    return [sorted(grupo) for grupo in grupos.values() if len(grupo) > 1]
+
+def relatorio_duplicados():
+    """Mostra os grupos de produtos com nomes parecidos e permite exportá-los em CSV."""
+    print("\n--- Relatório de Produtos Duplicados ---")
+    conn = None
+    try:
+        conn = conectar()
+        cursor = conn.cursor()
+
+        grupos = agrupar_duplicados(cursor)
+        if not grupos:
+            print("Nenhum produto duplicado encontrado.")
+            return
+
+        for numero, grupo in enumerate(grupos, start=1):
+            print(f"\nGrupo {numero}:")
+            for produto_id, nome in grupo:
+                print(f"  ID: {produto_id} | Nome: {nome}")
+
+        print("-" * 30)
+        print(f"{len(grupos)} grupo(s) de possíveis duplicados.")
+        if input("Deseja exportar o relatório? (s/n): ").lower() == 's':
+            caminho = f"duplicados_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            with open(caminho, 'w', newline='', encoding='utf-8') as arquivo:
+                escritor = csv.writer(arquivo, delimiter=';')
+                escritor.writerow(['grupo', 'id', 'nome'])
+                for numero, grupo in enumerate(grupos, start=1):
+                    for produto_id, nome in grupo:
+                        escritor.writerow([numero, produto_id, nome])
+            print(f"\nRelatório exportado para '{caminho}'.")
+
+    except (sqlite3.Error, OSError) as e:
+        print(f"\nErro ao gerar o relatório de duplicados: {e}")
+    finally:
+        if conn:
+            conn.close()
+
 def cadastrar_produto():
     """Permite cadastrar um novo produto."""
     print("\n--- Cadastrar Novo Produto ---")
@@ -331,14 +1424,31 @@ def cadastrar_produto():
     try:
         preco = float(input("Preço: "))
         quantidade = int(input("Quantidade: "))
+        estoque_minimo = int(input("Estoque mínimo (deixe em branco para não alertar): ") or 0)
+        categoria_str = input("ID da categoria (deixe em branco para nenhuma): ")
+        categoria_id = int(categoria_str) if categoria_str else None
     except ValueError:
-        print("\nErro: Preço e Quantidade devem ser números.")
+        print("\nErro: Preço, Quantidade, Estoque mínimo e Categoria devem ser números.")
         return
 
     try:
-        conn = sqlite3.connect('mercprd.db')
+        conn = conectar()
         cursor = conn.cursor()
-        cursor.execute("INSERT INTO produtos (nome, preco, quantidade) VALUES (?, ?, ?)", (nome, preco, quantidade))
+
+        if categoria_id is not None and not RepositorioCategorias(conn).buscar(categoria_id):
+            print("\nErro: Categoria não encontrada.")
+            return
+
+        semelhantes = buscar_produtos_semelhantes(cursor, nome)
+        if semelhantes:
+            print("\nAtenção: já existem produtos com nome parecido:")
+            for grau, produto_id, nome_existente in semelhantes[:5]:
+                print(f"  ID: {produto_id} | Nome: {nome_existente} ({grau:.0%} parecido)")
+            if input("Deseja cadastrar mesmo assim? (s/n): ").lower() != 's':
+                print("\nOperação cancelada.")
+                return
+
+        RepositorioProdutos(conn).criar(nome, preco, quantidade, estoque_minimo, categoria_id)
         conn.commit()
         print("\nProduto cadastrado com sucesso!")
     except sqlite3.Error as e:
@@ -347,21 +1457,24 @@ def cadastrar_produto():
         if conn:
             conn.close()
 
-def visualizar_produtos():
-    """Permite visualizar todos os produtos cadastrados."""
+def visualizar_produtos(categoria_id=None):
+    """
+    Permite visualizar todos os produtos cadastrados, ou só os de uma categoria
+    (com as subcategorias).
+    """
     print("\n--- Produtos Cadastrados ---")
     try:
-        conn = sqlite3.connect('mercprd.db')
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, nome, preco, quantidade FROM produtos ORDER BY nome")
-        produtos = cursor.fetchall()
-        
-        if not produtos:
-            print("Nenhum produto cadastrado.")
-            return
+        conn = conectar()
+        produtos = RepositorioProdutos(conn)
+
+        encontrou = False
+        listagem = produtos.listar() if categoria_id is None else produtos.listar_da_categoria(categoria_id)
+        for produto in listagem:
+            print(f"ID: {produto.id} | Nome: {produto.nome} | Preço: R${produto.preco:.2f} | Quantidade: {produto.quantidade}")
+            encontrou = True
 
-        for produto in produtos:
-            print(f"ID: {produto[0]} | Nome: {produto[1]} | Preço: R${produto[2]:.2f} | Quantidade: {produto[3]}")
+        if not encontrou:
+            print("Nenhum produto cadastrado.")
     except sqlite3.Error as e:
         print(f"\nErro ao visualizar produtos: {e}")
     finally:
@@ -377,55 +1490,66 @@ def editar_produto():
         novo_nome = input("Novo nome do produto (deixe em branco para não alterar): ")
         novo_preco_str = input("Novo preço (deixe em branco para não alterar): ")
         nova_quantidade_str = input("Nova quantidade (deixe em branco para não alterar): ")
+        novo_estoque_minimo_str = input("Novo estoque mínimo (deixe em branco para não alterar): ")
+        nova_categoria_str = input("Nova categoria (ID, 0 para nenhuma, deixe em branco para não alterar): ")
 
-        conn = sqlite3.connect('mercprd.db')
-        cursor = conn.cursor()
+        conn = conectar()
+        produtos = RepositorioProdutos(conn)
 
-        cursor.execute("SELECT * FROM produtos WHERE id = ?", (produto_id,))
-        produto_existente = cursor.fetchone()
-        if not produto_existente:
+        if not produtos.buscar(produto_id):
             print("\nErro: Produto não encontrado.")
             return
 
-        update_query = "UPDATE produtos SET "
-        updates = []
-        params = []
+        alteracoes = {}
 
         if novo_nome:
-            updates.append("nome = ?")
-            params.append(novo_nome)
+            alteracoes['nome'] = novo_nome
         
         if novo_preco_str:
             try:
-                novo_preco = float(novo_preco_str)
-                updates.append("preco = ?")
-                params.append(novo_preco)
+                alteracoes['preco'] = float(novo_preco_str)
             except ValueError:
                 print("\nErro: Preço inválido. Edição cancelada.")
                 return
 
         if nova_quantidade_str:
             try:
-                nova_quantidade = int(nova_quantidade_str)
-                updates.append("quantidade = ?")
-                params.append(nova_quantidade)
+                alteracoes['quantidade'] = int(nova_quantidade_str)
             except ValueError:
                 print("\nErro: Quantidade inválida. Edição cancelada.")
                 return
 
-        if not updates:
+        if novo_estoque_minimo_str:
+            try:
+                alteracoes['estoque_minimo'] = int(novo_estoque_minimo_str)
+            except ValueError:
+                print("\nErro: Estoque mínimo inválido. Edição cancelada.")
+                return
+
+        if nova_categoria_str:
+            try:
+                nova_categoria = int(nova_categoria_str)
+            except ValueError:
+                print("\nErro: Categoria inválida. Edição cancelada.")
+                return
+            if nova_categoria and not RepositorioCategorias(conn).buscar(nova_categoria):
+                print("\nErro: Categoria não encontrada. Edição cancelada.")
+                return
+            alteracoes['categoria_id'] = nova_categoria or None
+
+        if not alteracoes:
             print("\nNenhuma alteração foi feita.")
             return
 
-        update_query += ", ".join(updates) + " WHERE id = ?"
-        params.append(produto_id)
-
-        cursor.execute(update_query, tuple(params))
+        produtos.atualizar(produto_id, **alteracoes)
         conn.commit()
         print("\nProduto editado com sucesso!")
 
     except ValueError:
         print("\nErro: ID do produto inválido.")
+    except sqlite3.IntegrityError as e:
+        # Regras do próprio banco, como a do gatilho trg_lotes_quantidade_minima
+        print(f"\nErro: {e}. Edição cancelada.")
     except sqlite3.Error as e:
         print(f"\nErro ao editar produto: {e}")
     finally:
@@ -439,23 +1563,22 @@ def excluir_produto():
     try:
         produto_id = int(input("Digite o ID do produto que deseja excluir: "))
 
-        conn = sqlite3.connect('mercprd.db')
-        cursor = conn.cursor()
+        conn = conectar()
+        produtos = RepositorioProdutos(conn)
 
-        cursor.execute("SELECT * FROM produtos WHERE id = ?", (produto_id,))
-        produto_existente = cursor.fetchone()
+        produto_existente = produtos.buscar(produto_id)
         if not produto_existente:
             print("\nErro: Produto não encontrado.")
             return
         
-        confirmacao = input(f"Tem certeza que deseja excluir o produto '{produto_existente[1]}'? (s/n): ")
+        confirmacao = input(f"Tem certeza que deseja excluir o produto '{produto_existente.nome}'? (s/n): ")
         if confirmacao.lower() != 's':
             print("\nOperação cancelada.")
             return
 
-        cursor.execute("DELETE FROM produtos WHERE id = ?", (produto_id,))
+        produtos.excluir(produto_id)
         conn.commit()
-        print("\nProduto excluído com sucesso!")
+        print(f"\nProduto excluído com sucesso! Ele pode ser restaurado por {DIAS_RETENCAO_EXCLUIDOS} dias.")
     except ValueError:
         print("\nErro: ID do produto inválido.")
     except sqlite3.Error as e:
@@ -464,40 +1587,1006 @@ def excluir_produto():
         if conn:
             conn.close()
 
-# --- Menus ---
+def restaurar_produto():
+    """Permite desfazer a exclusão de um produto."""
+    print("\n--- Restaurar Produto Excluído ---")
+    try:
+        conn = conectar()
+        produtos = RepositorioProdutos(conn)
 
-def menu_admin():
-    """Menu exclusivo para administradores."""
-    while True:
-        print("\n--- Menu do Administrador ---")
-        print("1 - Gerenciar Usuários")
-        print("2 - Gerenciar Produtos")
-        print("3 - Trocar minha senha")
-        print("4 - Sair do menu de administrador")
-        
-        opcao = input("Escolha uma opção (1, 2, 3 ou 4): ")
+        encontrou = False
+        for produto in produtos.listar_excluidos():
+            print(f"ID: {produto.id} | Nome: {produto.nome} | Excluído em: {produto.deleted_at}")
+            encontrou = True
 
-        if opcao == '1':
-            visualizar_contas_e_gerenciar()
-        elif opcao == '2':
-            menu_produtos_admin()
-        elif opcao == '3':
-            trocar_senha()
-        elif opcao == '4':
-            print("\nSaindo do menu de administrador...")
-            break
-        else:
-            print("\nOpção inválida. Por favor, tente novamente.")
+        if not encontrou:
+            print("Nenhum produto excluído para restaurar.")
+            return
 
-def menu_produtos_admin():
-    """Menu de gerenciamento de produtos para o administrador."""
-    while True:
-        print("\n--- Gerenciamento de Produtos ---")
-        print("1 - Cadastrar novo produto")
-        print("2 - Visualizar produtos")
-        print("3 - Editar produto")
-        print("4 - Excluir produto")
-        print("5 - Voltar ao menu principal")
+        produto_id = int(input("Digite o ID do produto que deseja restaurar: "))
+        if not produtos.restaurar(produto_id):
+            print("\nErro: Produto excluído não encontrado.")
+            return
+
+        conn.commit()
+        print("\nProduto restaurado com sucesso!")
+    except ValueError:
+        print("\nErro: ID do produto inválido.")
+    except sqlite3.Error as e:
+        print(f"\nErro ao restaurar produto: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+# --- Lotes, validade e vendas ---
+
+class EstoqueInsuficiente(Exception):
+    """A venda pede mais do que o estoque vendável do produto."""
+
+def retirar_estoque_fefo(conn, produto_id, quantidade, momento, ja_vendida=False):
+    """
+    Tira 'quantidade' unidades do produto, dos lotes dentro da validade no dia de
+    'momento' na ordem em que vencem e, se faltar, do estoque sem lote, e grava a venda
+    com esse 'momento'. Não abre nem fecha transação: isso fica com quem chama.
+    Levanta EstoqueInsuficiente se não houver estoque vendável suficiente, a não ser com
+    'ja_vendida' (venda feita em um terminal offline, que já aconteceu): aí o que faltar
+    sai dos lotes vencidos e o que ainda faltar não é baixado, mas a venda é gravada
+    inteira, mesmo a de um produto que já saiu do catálogo.
+    Retorna a lista [(lote_id ou None, quantidade retirada)].
+    """
+    produtos = RepositorioProdutos(conn)
+    lotes = RepositorioLotes(conn)
+
+    retiradas = []
+    produto = produtos.buscar(produto_id)
+    if produto:
+        sem_lote = produto.quantidade - lotes.total_do_produto(produto_id)
+        falta = quantidade
+        for lote in list(lotes.disponiveis_para_venda(produto_id, momento[:10])):
+            if falta == 0:
+                break
+            retirar = min(falta, lote.quantidade)
+            lotes.baixar(lote.id, retirar)
+            retiradas.append((lote.id, retirar))
+            falta -= retirar
+
+        if falta > 0 and sem_lote < falta and not ja_vendida:
+            raise EstoqueInsuficiente(f"Estoque vendável insuficiente: faltam {falta - max(sem_lote, 0)} unidade(s).")
+        retirar = min(falta, max(sem_lote, 0))
+        if retirar > 0:
+            conn.execute("UPDATE produtos SET quantidade = quantidade - ? WHERE id = ?", (retirar, produto_id))
+            retiradas.append((None, retirar))
+            falta -= retirar
+
+        if falta > 0:
+            # Só sobra falta em uma venda já feita: os lotes com saldo que restam são os vencidos
+            for lote in list(lotes.listar_do_produto(produto_id)):
+                retirar = min(falta, lote.quantidade)
+                lotes.baixar(lote.id, retirar)
+                retiradas.append((lote.id, retirar))
+                falta -= retirar
+                if falta == 0:
+                    break
+    elif not ja_vendida:
+        raise EstoqueInsuficiente("Produto não encontrado.")
+
+    conn.execute(
+        "INSERT INTO vendas (produto_id, quantidade, momento) VALUES (?, ?, ?)",
+        (produto_id, quantidade, momento)
+    )
+    return retiradas
+
+def baixar_estoque_fefo(conn, produto_id, quantidade):
+    """
+    Registra a venda de 'quantidade' unidades, tirando dos lotes dentro da validade na
+    ordem em que vencem (primeiro a vencer, primeiro a sair) e, se faltar, do estoque
+    sem lote. Tudo acontece em uma única transação: ou a venda inteira é gravada, ou nada.
+    Retorna a lista [(lote_id ou None, quantidade retirada)].
+    Levanta EstoqueInsuficiente se não houver estoque vendável suficiente.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        retiradas = retirar_estoque_fefo(conn, produto_id, quantidade, agora_texto())
+        conn.commit()
+        return retiradas
+    except BaseException:
+        conn.rollback()
+        raise
+
+def registrar_venda():
+    """Permite registrar a venda de um produto, com baixa nos lotes que vencem primeiro."""
+    print("\n--- Registrar Venda ---")
+    conn = None
+    try:
+        produto_id = int(input("ID do produto: "))
+        quantidade = int(input("Quantidade vendida: "))
+        if quantidade <= 0:
+            print("\nErro: A quantidade deve ser maior que zero.")
+            return
+
+        conn = conectar()
+        retiradas = baixar_estoque_fefo(conn, produto_id, quantidade)
+
+        print("\nVenda registrada com sucesso!")
+        for lote_id, retirada in retiradas:
+            origem = f"lote {lote_id}" if lote_id is not None else "estoque sem lote"
+            print(f"  {retirada} unidade(s) do {origem}")
+    except ValueError:
+        print("\nErro: ID do produto e quantidade devem ser números.")
+    except EstoqueInsuficiente as e:
+        print(f"\nErro: {e}")
+    except sqlite3.Error as e:
+        print(f"\nErro ao registrar venda: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+def cadastrar_lote():
+    """Permite registrar a entrada de um lote de um produto, com sua validade."""
+    print("\n--- Entrada de Lote ---")
+    if armazenamento().replica:
+        print("\nErro: Lotes só podem ser registrados no banco central, não em um terminal offline.")
+        return
+
+    conn = None
+    try:
+        produto_id = int(input("ID do produto: "))
+        quantidade = int(input("Quantidade do lote: "))
+        validade = datetime.date.fromisoformat(input("Validade (AAAA-MM-DD): ")).isoformat()
+        if quantidade <= 0:
+            print("\nErro: A quantidade deve ser maior que zero.")
+            return
+
+        conn = conectar()
+        if not RepositorioProdutos(conn).buscar(produto_id):
+            print("\nErro: Produto não encontrado.")
+            return
+
+        lote_id = RepositorioLotes(conn).criar(produto_id, quantidade, validade)
+        conn.commit()
+        print(f"\nLote {lote_id} registrado com sucesso!")
+    except ValueError:
+        print("\nErro: ID, quantidade e validade (AAAA-MM-DD) devem ser válidos.")
+    except sqlite3.Error as e:
+        print(f"\nErro ao registrar lote: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+def visualizar_lotes_produto():
+    """Mostra os lotes com saldo de um produto, do que vence primeiro para o último."""
+    print("\n--- Lotes do Produto ---")
+    conn = None
+    try:
+        produto_id = int(input("ID do produto: "))
+
+        conn = conectar()
+        produto = RepositorioProdutos(conn).buscar(produto_id)
+        if not produto:
+            print("\nErro: Produto não encontrado.")
+            return
+
+        em_lotes = 0
+        for lote in RepositorioLotes(conn).listar_do_produto(produto_id):
+            print(f"Lote: {lote.id} | Quantidade: {lote.quantidade} | Validade: {lote.validade}")
+            em_lotes += lote.quantidade
+
+        print("-" * 30)
+        print(f"Total: {produto.quantidade} | Em lotes: {em_lotes} | Sem lote: {produto.quantidade - em_lotes}")
+    except ValueError:
+        print("\nErro: ID do produto inválido.")
+    except sqlite3.Error as e:
+        print(f"\nErro ao consultar lotes: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+def relatorio_validade():
+    """Mostra os lotes com saldo que vencem nos próximos N dias (e os já vencidos)."""
+    print("\n--- Produtos Vencendo ---")
+    conn = None
+    try:
+        dias = int(input(f"Vencendo em quantos dias? (padrão {DIAS_AVISO_VALIDADE}): ") or DIAS_AVISO_VALIDADE)
+        hoje = datetime.date.today()
+        data_limite = (hoje + datetime.timedelta(days=dias)).isoformat()
+
+        conn = conectar()
+        encontrou = False
+        for lote, nome in RepositorioLotes(conn).vencendo_ate(data_limite):
+            situacao = "VENCIDO" if lote.validade < hoje.isoformat() else f"vence em {(datetime.date.fromisoformat(lote.validade) - hoje).days} dia(s)"
+            print(f"Validade: {lote.validade} ({situacao}) | Produto: {nome} (ID {lote.produto_id}) | Lote: {lote.id} | Quantidade: {lote.quantidade}")
+            encontrou = True
+
+        if not encontrou:
+            print(f"Nenhum lote vencendo nos próximos {dias} dias.")
+    except ValueError:
+        print("\nErro: A quantidade de dias deve ser um número.")
+    except sqlite3.Error as e:
+        print(f"\nErro ao gerar o relatório de validade: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+def menu_lotes():
+    """Menu de lotes e validade."""
+    while True:
+        print("\n--- Lotes e Validade ---")
+        print("1 - Entrada de lote")
+        print("2 - Lotes de um produto")
+        print("3 - Produtos vencendo")
+        print("4 - Registrar venda")
+        print("5 - Voltar")
+
+        opcao = input("Escolha uma opção: ")
+
+        if opcao == '1':
+            cadastrar_lote()
+        elif opcao == '2':
+            visualizar_lotes_produto()
+        elif opcao == '3':
+            relatorio_validade()
+        elif opcao == '4':
+            registrar_venda()
+        elif opcao == '5':
+            break
+        else:
+            print("\nOpção inválida.")
+
+# --- Categorias ---
+
+def exibir_arvore_categorias(conn):
+    """
+    Mostra a árvore de categorias com os totais de cada uma (já somadas as subcategorias).
+    Retorna False se não houver categorias.
+    """
+    categorias = RepositorioCategorias(conn)
+    filhas = {}
+    for categoria in categorias.listar():
+        filhas.setdefault(categoria.pai_id, []).append(categoria)
+    if not filhas:
+        print("Nenhuma categoria cadastrada.")
+        return False
+
+    totais = categorias.todos_os_totais()
+
+    def exibir(pai_id):
+        for categoria in filhas.get(pai_id, []):
+            produtos, quantidade, valor = totais.get(categoria.id, (0, 0, 0.0))
+            recuo = "  " * (categoria.nivel - 1)
+            print(f"{recuo}[{categoria.id}] {categoria.nome} ({NIVEIS_CATEGORIA[categoria.nivel - 1]}) | "
+                  f"Produtos: {produtos} | Unidades: {quantidade} | Valor em estoque: R${valor:.2f}")
+            exibir(categoria.id)
+
+    exibir(None)
+    return True
+
+def visualizar_categorias():
+    """Mostra a árvore de categorias com a contagem de produtos e o valor em estoque."""
+    print("\n--- Categorias ---")
+    conn = None
+    try:
+        conn = conectar()
+        exibir_arvore_categorias(conn)
+    except sqlite3.Error as e:
+        print(f"\nErro ao visualizar categorias: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+def cadastrar_categoria():
+    """Permite cadastrar um departamento, uma seção ou uma subseção."""
+    print("\n--- Cadastrar Categoria ---")
+    if armazenamento().replica:
+        print("\nErro: Categorias só podem ser alteradas no banco central, não em um terminal offline.")
+        return
+
+    conn = None
+    try:
+        conn = conectar()
+        exibir_arvore_categorias(conn)
+
+        nome = input("\nNome da categoria: ").strip()
+        if not nome:
+            print("\nErro: O nome não pode ficar em branco.")
+            return
+        pai_str = input("ID da categoria superior (deixe em branco para um novo departamento): ")
+        try:
+            pai_id = int(pai_str) if pai_str else None
+        except ValueError:
+            print("\nErro: ID da categoria inválido.")
+            return
+
+        try:
+            categoria_id = RepositorioCategorias(conn).criar(nome, pai_id)
+        except ValueError as e:
+            print(f"\nErro: {e}")
+            return
+        conn.commit()
+        print(f"\nCategoria {categoria_id} cadastrada com sucesso!")
+    except sqlite3.IntegrityError:
+        print("\nErro: Já existe uma categoria com esse nome nesse lugar da árvore.")
+    except sqlite3.Error as e:
+        print(f"\nErro ao cadastrar categoria: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+def renomear_categoria():
+    """Permite alterar o nome de uma categoria."""
+    print("\n--- Renomear Categoria ---")
+    if armazenamento().replica:
+        print("\nErro: Categorias só podem ser alteradas no banco central, não em um terminal offline.")
+        return
+
+    conn = None
+    try:
+        conn = conectar()
+        if not exibir_arvore_categorias(conn):
+            return
+
+        categoria_id = int(input("\nID da categoria: "))
+        categorias = RepositorioCategorias(conn)
+        if not categorias.buscar(categoria_id):
+            print("\nErro: Categoria não encontrada.")
+            return
+        nome = input("Novo nome: ").strip()
+        if not nome:
+            print("\nErro: O nome não pode ficar em branco.")
+            return
+
+        categorias.renomear(categoria_id, nome)
+        conn.commit()
+        print("\nCategoria renomeada com sucesso!")
+    except ValueError:
+        print("\nErro: ID da categoria inválido.")
+    except sqlite3.IntegrityError:
+        print("\nErro: Já existe uma categoria com esse nome nesse lugar da árvore.")
+    except sqlite3.Error as e:
+        print(f"\nErro ao renomear categoria: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+def excluir_categoria():
+    """Permite excluir uma categoria vazia (sem subcategorias e sem produtos)."""
+    print("\n--- Excluir Categoria ---")
+    if armazenamento().replica:
+        print("\nErro: Categorias só podem ser alteradas no banco central, não em um terminal offline.")
+        return
+
+    conn = None
+    try:
+        conn = conectar()
+        if not exibir_arvore_categorias(conn):
+            return
+
+        try:
+            categoria_id = int(input("\nID da categoria: "))
+        except ValueError:
+            print("\nErro: ID da categoria inválido.")
+            return
+        categorias = RepositorioCategorias(conn)
+        categoria = categorias.buscar(categoria_id)
+        if not categoria:
+            print("\nErro: Categoria não encontrada.")
+            return
+        if input(f"Tem certeza que deseja excluir '{categoria.nome}'? (s/n): ").lower() != 's':
+            print("\nOperação cancelada.")
+            return
+
+        try:
+            categorias.excluir(categoria_id)
+        except ValueError as e:
+            print(f"\nErro: {e} Exclusão cancelada.")
+            return
+        conn.commit()
+        print("\nCategoria excluída com sucesso!")
+    except sqlite3.Error as e:
+        print(f"\nErro ao excluir categoria: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+def produtos_da_categoria():
+    """Lista ou busca por nome os produtos de uma categoria, incluindo as subcategorias."""
+    print("\n--- Produtos por Categoria ---")
+    conn = None
+    try:
+        conn = conectar()
+        if not exibir_arvore_categorias(conn):
+            return
+
+        categoria_id = int(input("\nID da categoria: "))
+        categorias = RepositorioCategorias(conn)
+        if not categorias.buscar(categoria_id):
+            print("\nErro: Categoria não encontrada.")
+            return
+        nome = input("Buscar por nome (deixe em branco para listar todos): ").strip()
+
+        print(f"\n{' > '.join(categorias.caminho(categoria_id))}")
+        if not nome:
+            conn.close()
+            conn = None
+            visualizar_produtos(categoria_id)
+            return
+
+        semelhantes = buscar_produtos_semelhantes(conn.cursor(), nome, categoria_id=categoria_id)
+        for grau, produto_id, nome_existente in semelhantes:
+            print(f"ID: {produto_id} | Nome: {nome_existente} ({grau:.0%} parecido)")
+        if not semelhantes:
+            print("Nenhum produto encontrado.")
+    except ValueError:
+        print("\nErro: ID da categoria inválido.")
+    except sqlite3.Error as e:
+        print(f"\nErro ao consultar os produtos da categoria: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+def menu_categorias():
+    """Menu da árvore de categorias."""
+    while True:
+        print("\n--- Categorias ---")
+        print("1 - Visualizar categorias e totais")
+        print("2 - Cadastrar categoria")
+        print("3 - Renomear categoria")
+        print("4 - Excluir categoria")
+        print("5 - Produtos de uma categoria")
+        print("6 - Voltar")
+
+        opcao = input("Escolha uma opção: ")
+
+        if opcao == '1':
+            visualizar_categorias()
+        elif opcao == '2':
+            cadastrar_categoria()
+        elif opcao == '3':
+            renomear_categoria()
+        elif opcao == '4':
+            excluir_categoria()
+        elif opcao == '5':
+            produtos_da_categoria()
+        elif opcao == '6':
+            break
+        else:
+            print("\nOpção inválida.")
+
+# --- Histórico de preços ---
+
+def preco_na_data(cursor, produto_id, momento):
+    """Retorna o preço em vigor no momento informado ('AAAA-MM-DD[ HH:MM:SS]') ou None."""
+    if len(momento) == 10:
+        momento += ' 23:59:59.999'
+    cursor.execute("""
+        SELECT preco FROM historico_precos
+        WHERE produto_id = ? AND momento <= ?
+        ORDER BY momento DESC LIMIT 1
+    """, (produto_id, momento))
+    resultado = cursor.fetchone()
+    return resultado[0] if resultado else None
+
+def alteracoes_de_preco(cursor, produto_id, inicio, fim):
+    """Retorna as mudanças de preço (momento, preco) de um produto entre 'inicio' e 'fim'."""
+    cursor.execute("""
+        SELECT momento, preco FROM historico_precos
+        WHERE produto_id = ? AND momento >= ? AND momento < ?
+        ORDER BY momento
+    """, (produto_id, inicio, fim))
+    return cursor.fetchall()
+
+def estatisticas_de_preco(cursor, produto_id, inicio, fim):
+    """Retorna (mínimo, máximo, média, quantidade de registros) dos preços de um produto no período."""
+    cursor.execute("""
+        SELECT MIN(preco), MAX(preco), AVG(preco), COUNT(*) FROM historico_precos
+        WHERE produto_id = ? AND momento >= ? AND momento < ?
+    """, (produto_id, inicio, fim))
+    return cursor.fetchone()
+
+def visualizar_historico_precos():
+    """Permite ao administrador consultar o histórico de preços de um produto."""
+    visualizar_produtos()
+    print("\n--- Histórico de Preços ---")
+    conn = None
+    try:
+        produto_id = int(input("Digite o ID do produto: "))
+        dias = int(input("Mostrar as alterações de quantos dias atrás? ") or 30)
+        data_consulta = input("Consultar o preço em uma data (AAAA-MM-DD, deixe em branco para pular): ")
+
+        conn = conectar()
+        cursor = conn.cursor()
+
+        fim = (datetime.datetime.now() + datetime.timedelta(seconds=1)).strftime('%Y-%m-%d %H:%M:%S')
+        inicio = (datetime.datetime.now() - datetime.timedelta(days=dias)).strftime('%Y-%m-%d %H:%M:%S')
+
+        alteracoes = alteracoes_de_preco(cursor, produto_id, inicio, fim)
+        if not alteracoes:
+            print(f"\nNenhuma alteração de preço nos últimos {dias} dias.")
+        else:
+            for momento, preco in alteracoes:
+                print(f"{momento[:19]} | Preço: R${preco:.2f}")
+
+            minimo, maximo, media, total = estatisticas_de_preco(cursor, produto_id, inicio, fim)
+            print("-" * 30)
+            print(f"Mínimo: R${minimo:.2f} | Máximo: R${maximo:.2f} | Média: R${media:.2f} | Registros: {total}")
+
+        if data_consulta:
+            preco = preco_na_data(cursor, produto_id, data_consulta)
+            if preco is None:
+                print(f"\nNenhum preço registrado até {data_consulta}.")
+            else:
+                print(f"\nPreço em {data_consulta}: R${preco:.2f}")
+    except ValueError:
+        print("\nErro: ID do produto e quantidade de dias devem ser números.")
+    except sqlite3.Error as e:
+        print(f"\nErro ao consultar o histórico de preços: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+def compactar_historico_precos(cursor, dias=DIAS_HISTORICO_DETALHADO):
+    """
+    Reduz o histórico anterior a 'dias' dias a uma linha por produto e por dia,
+    mantendo o último preço de cada dia (o que continua valendo no fim do dia).
+    Processa os produtos em blocos de TAMANHO_LOTE_EXPURGO IDs para manter as transações
+    curtas. Os blocos seguem os IDs que existem no histórico, então IDs esparsos (como os
+    provisórios de um terminal offline) não geram faixas vazias.
+    Retorna a quantidade de linhas removidas.
+    """
+    limite = (datetime.datetime.now() - datetime.timedelta(days=dias)).strftime('%Y-%m-%d')
+    ultimo_id = -1
+    removidas = 0
+
+    while True:
+        cursor.execute("""
+            SELECT MAX(produto_id) FROM (
+                SELECT DISTINCT produto_id FROM historico_precos WHERE produto_id > ? ORDER BY produto_id LIMIT ?
+            )
+        """, (ultimo_id, TAMANHO_LOTE_EXPURGO))
+        ate_id = cursor.fetchone()[0]
+        if ate_id is None:
+            return removidas
+
+        cursor.execute("""
+            DELETE FROM historico_precos
+            WHERE produto_id > ? AND produto_id <= ? AND momento < ?
+              AND EXISTS (
+                  SELECT 1 FROM historico_precos AS posterior
+                  WHERE posterior.produto_id = historico_precos.produto_id
+                    AND posterior.momento > historico_precos.momento
+                    AND posterior.momento < date(historico_precos.momento, '+1 day')
+              )
+        """, (ultimo_id, ate_id, limite))
+        removidas += cursor.rowcount
+        cursor.connection.commit()
+        ultimo_id = ate_id
+
+# --- Alertas de estoque baixo ---
+
+def consultar_alertas_pendentes(cursor, categoria_id=None):
+    """
+    Retorna os produtos com alerta de estoque baixo pendente:
+    (id, nome, quantidade, estoque_minimo, alerta desde).
+    Com 'categoria_id', só os produtos dessa categoria e de suas subcategorias.
+    """
+    if categoria_id is None:
+        cursor.execute("""
+            SELECT p.id, p.nome, p.quantidade, p.estoque_minimo, a.criado_em
+            FROM alertas_estoque AS a
+            JOIN produtos AS p ON p.id = a.produto_id
+            WHERE a.resolvido_em IS NULL AND p.deleted_at IS NULL
+            ORDER BY a.criado_em
+        """)
+    else:
+        cursor.execute("""
+            SELECT p.id, p.nome, p.quantidade, p.estoque_minimo, a.criado_em
+            FROM categorias_fechamento AS f
+            JOIN produtos AS p ON p.categoria_id = f.descendente_id
+            JOIN alertas_estoque AS a ON a.produto_id = p.id
+            WHERE f.ancestral_id = ? AND a.resolvido_em IS NULL AND p.deleted_at IS NULL
+            ORDER BY a.criado_em
+        """, (categoria_id,))
+    return cursor.fetchall()
+
+def exportar_lista_reposicao(alertas, caminho=None):
+    """Grava em CSV a lista de reposição a partir dos alertas pendentes e retorna o caminho do arquivo."""
+    if caminho is None:
+        caminho = f"reposicao_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+
+    with open(caminho, 'w', newline='', encoding='utf-8') as arquivo:
+        escritor = csv.writer(arquivo, delimiter=';')
+        escritor.writerow(['id', 'nome', 'quantidade', 'estoque_minimo', 'repor'])
+        for produto_id, nome, quantidade, estoque_minimo, _ in alertas:
+            escritor.writerow([produto_id, nome, quantidade, estoque_minimo, estoque_minimo - quantidade])
+
+    return caminho
+
+def visualizar_alertas_estoque():
+    """Permite ao administrador ver os alertas de estoque baixo e exportar a lista de reposição."""
+    print("\n--- Alertas de Estoque Baixo ---")
+    conn = None
+    try:
+        categoria_str = input("Filtrar por categoria (ID, deixe em branco para todas): ")
+        categoria_id = int(categoria_str) if categoria_str else None
+
+        conn = conectar()
+        cursor = conn.cursor()
+
+        alertas = consultar_alertas_pendentes(cursor, categoria_id)
+        if not alertas:
+            print("Nenhum produto abaixo do estoque mínimo.")
+            return
+
+        for produto_id, nome, quantidade, estoque_minimo, criado_em in alertas:
+            print(f"ID: {produto_id} | Nome: {nome} | Quantidade: {quantidade} | Mínimo: {estoque_minimo} | Desde: {criado_em}")
+
+        print("-" * 30)
+        if input("Deseja exportar a lista de reposição? (s/n): ").lower() == 's':
+            caminho = exportar_lista_reposicao(alertas)
+            print(f"\nLista de reposição exportada para '{caminho}'.")
+
+    except ValueError:
+        print("\nErro: ID da categoria inválido.")
+    except (sqlite3.Error, OSError) as e:
+        print(f"\nErro ao consultar os alertas de estoque: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+# --- Planejamento de reposição ---
+
+def planejar_reposicao():
+    """Calcula a lista de compras pela média móvel das vendas e permite exportá-la."""
+    print("\n--- Planejamento de Reposição ---")
+    try:
+        import planejador_reposicao
+    except ImportError:
+        print("\nErro: O planejador de reposição precisa do NumPy (pip install numpy).")
+        return
+
+    conn = None
+    try:
+        conn = conectar()
+        completo = input("Recalcular todo o catálogo? (s/n): ").lower() == 's'
+        modo, calculados, itens, segundos = planejador_reposicao.planejar(conn, completo)
+        print(f"Cálculo {modo}: {calculados} produto(s) em {segundos:.2f} s.")
+
+        if itens == 0:
+            print("Nenhum produto precisa de compra.")
+            return
+
+        for produto_id, nome, quantidade, _, demanda, cobertura, sugerido in itertools.islice(planejador_reposicao.lista_de_compras(conn.cursor()), 20):
+            dias = "sem vendas" if cobertura is None else f"{cobertura:.1f} dias"
+            print(f"ID: {produto_id} | Nome: {nome} | Estoque: {quantidade} | Venda/dia: {demanda:.2f} | Cobertura: {dias} | Comprar: {sugerido}")
+
+        print("-" * 30)
+        print(f"{itens} produto(s) na lista de compras (acima, os 20 que acabam primeiro).")
+        if input("Deseja exportar a lista de compras? (s/n): ").lower() == 's':
+            caminho, _ = planejador_reposicao.exportar_lista_compras(conn.cursor())
+            print(f"\nLista de compras exportada para '{caminho}'.")
+    except sqlite3.Error as e:
+        print(f"\nErro ao planejar a reposição: {e}")
+    except OSError as e:
+        print(f"\nErro ao exportar a lista de compras: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+# --- Relatório e arquivo de vendas ---
+
+def arquivar_vendas(conn):
+    """
+    Move as vendas dos meses fechados para o arquivo colunar (arquivo_vendas.py).
+    Sem o NumPy instalado as vendas simplesmente continuam no banco. Quando vários
+    processos usam o mesmo banco, só o que reservar a vez arquiva; os demais não fazem nada.
+    Retorna a quantidade de vendas arquivadas.
+    """
+    try:
+        import arquivo_vendas
+    except ImportError:
+        return 0
+
+    arquivadas, _ = arquivo_vendas.arquivar(conn)
+    return arquivadas
+
+def relatorio_vendas():
+    """Resume as vendas de um período, juntando as vendas arquivadas e as que estão no banco."""
+    print("\n--- Relatório de Vendas ---")
+    try:
+        import arquivo_vendas
+    except ImportError:
+        print("\nErro: O relatório de vendas precisa do NumPy (pip install numpy).")
+        return
+
+    conn = None
+    try:
+        hoje = datetime.date.today()
+        inicio = input(f"Data inicial (AAAA-MM-DD, padrão {hoje.replace(month=1, day=1)}): ") or hoje.replace(month=1, day=1).isoformat()
+        fim = input(f"Data final (AAAA-MM-DD, padrão {hoje}): ") or hoje.isoformat()
+        produto = input("ID do produto (deixe em branco para todos): ")
+        produto_id = int(produto) if produto else None
+
+        # A data final entra no relatório: a consulta vai até o dia seguinte, exclusive
+        inicio = datetime.date.fromisoformat(inicio).isoformat()
+        fim = (datetime.date.fromisoformat(fim) + datetime.timedelta(days=1)).isoformat()
+
+        conn = conectar()
+        resumo = arquivo_vendas.resumo_vendas(conn, inicio, fim, produto_id)
+        if resumo.vendas == 0:
+            print("Nenhuma venda no período.")
+            return
+
+        print(f"\nVendas: {resumo.vendas} | Unidades: {resumo.unidades}")
+        print("Unidades por mês:")
+        for mes, unidades in sorted(resumo.por_mes.items()):
+            print(f"  {mes}: {unidades}")
+
+        if produto_id is None:
+            produtos = RepositorioProdutos(conn)
+            print("Mais vendidos:")
+            for mais_vendido, unidades in resumo.mais_vendidos():
+                produto = produtos.buscar(mais_vendido)
+                nome = produto.nome if produto else "(produto removido)"
+                print(f"  ID: {mais_vendido} | Nome: {nome} | Unidades: {unidades}")
+    except ValueError:
+        print("\nErro: Datas devem estar no formato AAAA-MM-DD e o ID deve ser um número.")
+    except sqlite3.Error as e:
+        print(f"\nErro ao gerar o relatório de vendas: {e}")
+    except OSError as e:
+        print(f"\nErro ao ler o arquivo de vendas: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+# --- Registro de alterações (changelog) para sincronização incremental ---
+
+def registrar_consumidor(cursor, nome, a_partir_de=None):
+    """
+    Registra um sistema que vai ler o changelog. Por padrão ele começa no último 'seq'
+    existente, então deve fazer uma carga completa das tabelas antes da primeira leitura.
+    Retorna o 'seq' a partir do qual o consumidor vai ler.
+    """
+    if a_partir_de is None:
+        cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM changelog")
+        a_partir_de = cursor.fetchone()[0]
+
+    cursor.execute(
+        "INSERT OR IGNORE INTO consumidores_changelog (nome, ultimo_seq, atualizado_em) VALUES (?, ?, ?)",
+        (nome, a_partir_de, agora_texto())
+    )
+    cursor.connection.commit()
+
+    cursor.execute("SELECT ultimo_seq FROM consumidores_changelog WHERE nome = ?", (nome,))
+    return cursor.fetchone()[0]
+
+def ultimo_seq_changelog(cursor):
+    """Último 'seq' já usado no changelog, mesmo que a poda já o tenha removido (0 se nenhum)."""
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", ('changelog',))
+    linha = cursor.fetchone()
+    return linha[0] if linha else 0
+
+def changelog_cobre(cursor, desde_seq):
+    """
+    Se o changelog ainda tem todas as alterações depois de 'desde_seq'. Quem lê o changelog
+    sem se registrar como consumidor (veja planejador_reposicao.py) não segura a poda e
+    precisa conferir isso antes de continuar de onde parou. A poda só remove o começo
+    do registro e o 'seq' nunca é reutilizado, então basta comparar com o primeiro 'seq'
+    que ainda está lá (ou com o próximo a ser usado, se o registro estiver vazio).
+    """
+    cursor.execute("SELECT MIN(seq) FROM changelog")
+    primeiro = cursor.fetchone()[0]
+    if primeiro is None:
+        primeiro = ultimo_seq_changelog(cursor) + 1
+    return primeiro <= desde_seq + 1
+
+def buscar_alteracoes(cursor, desde_seq, limite=TAMANHO_LOTE_CHANGELOG):
+    """
+    Retorna no máximo 'limite' alterações com seq maior que 'desde_seq', em ordem:
+    [(seq, tabela, operacao, chave, dados, momento)], com 'dados' já convertido de JSON.
+    Para continuar a leitura, chame de novo com o 'seq' da última alteração recebida.
+    """
+    cursor.execute("""
+        SELECT seq, tabela, operacao, chave, dados, momento FROM changelog
+        WHERE seq > ? ORDER BY seq LIMIT ?
+    """, (desde_seq, limite))
+    return [
+        (seq, tabela, operacao, chave, json.loads(dados) if dados else None, momento)
+        for seq, tabela, operacao, chave, dados, momento in cursor.fetchall()
+    ]
+
+def confirmar_alteracoes(cursor, nome, ate_seq):
+    """Registra que o consumidor 'nome' já processou todas as alterações até 'ate_seq'."""
+    cursor.execute("""
+        UPDATE consumidores_changelog SET ultimo_seq = MAX(ultimo_seq, ?), atualizado_em = ?
+        WHERE nome = ?
+    """, (ate_seq, agora_texto(), nome))
+    cursor.connection.commit()
+    return cursor.rowcount > 0
+
+def remover_consumidor(cursor, nome):
+    """Remove um consumidor; suas confirmações deixam de segurar a poda do changelog."""
+    cursor.execute("DELETE FROM consumidores_changelog WHERE nome = ?", (nome,))
+    cursor.connection.commit()
+
+def podar_changelog(cursor):
+    """
+    Remove do changelog, em lotes, as alterações que todos os consumidores registrados
+    já confirmaram. Sem consumidores registrados nada precisa ser guardado, pois um
+    novo consumidor sempre começa pelo último 'seq'.
+    Retorna a quantidade de alterações removidas.
+    """
+    cursor.execute("SELECT MIN(ultimo_seq), COUNT(*) FROM consumidores_changelog")
+    menor_confirmado, consumidores = cursor.fetchone()
+    if consumidores == 0:
+        cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM changelog")
+        menor_confirmado = cursor.fetchone()[0]
+
+    cursor.execute("SELECT MIN(seq) FROM changelog")
+    inicio = cursor.fetchone()[0]
+    if inicio is None:
+        return 0
+
+    removidas = 0
+    while inicio <= menor_confirmado:
+        fim = min(inicio + TAMANHO_LOTE_EXPURGO - 1, menor_confirmado)
+        cursor.execute("DELETE FROM changelog WHERE seq BETWEEN ? AND ?", (inicio, fim))
+        removidas += cursor.rowcount
+        cursor.connection.commit()
+        inicio = fim + 1
+
+    return removidas
+
+# --- Compactação do banco de dados ---
+
+def devolver_paginas_livres(cursor):
+    """
+    Devolve as páginas livres ao sistema de arquivos aos poucos, sem reescrever o arquivo
+    inteiro. Só funciona com auto_vacuum = INCREMENTAL (veja criar_banco_de_dados); em
+    outro modo o incremental_vacuum não libera nada e não há o que fazer.
+    """
+    cursor.execute("PRAGMA auto_vacuum")
+    if cursor.fetchone()[0] != 2:
+        return
+    cursor.execute("PRAGMA freelist_count")
+    livres = cursor.fetchone()[0]
+    while livres:
+        cursor.execute(f"PRAGMA incremental_vacuum({PAGINAS_POR_VACUUM})")
+        cursor.fetchall()
+        cursor.execute("PRAGMA freelist_count")
+        antes, livres = livres, cursor.fetchone()[0]
+        if livres >= antes:
+            break
+
+
+def compactar_banco(exibir=True):
+    """
+    Remove definitivamente os registros excluídos há mais de DIAS_RETENCAO_EXCLUIDOS dias
+    e devolve as páginas livres ao sistema de arquivos com o VACUUM incremental.
+    Também reduz o histórico de preços antigo a uma linha por dia, poda do changelog
+    as alterações já confirmadas por todos os consumidores e move as vendas dos meses
+    fechados para o arquivo colunar.
+    O expurgo é feito em lotes pequenos, cada um em sua própria transação, para que
+    o banco nunca fique bloqueado por muito tempo.
+    Retorna a quantidade de registros removidos.
+    """
+    limite = (datetime.datetime.now() - datetime.timedelta(days=DIAS_RETENCAO_EXCLUIDOS)).strftime('%Y-%m-%d %H:%M:%S')
+    removidos = 0
+    conn = None
+    try:
+        conn = conectar()
+        cursor = conn.cursor()
+
+        for tabela in ('produtos', 'usuarios'):
+            while True:
+                cursor.execute(f"""
+                    DELETE FROM {tabela} WHERE rowid IN (
+                        SELECT rowid FROM {tabela} WHERE deleted_at IS NOT NULL AND deleted_at < ? LIMIT ?
+                    )
+                """, (limite, TAMANHO_LOTE_EXPURGO))
+                apagados = cursor.rowcount
+                conn.commit()
+                removidos += apagados
+                if apagados < TAMANHO_LOTE_EXPURGO:
+                    break
+
+        compactar_historico_precos(cursor)
+        podar_changelog(cursor)
+        arquivadas = arquivar_vendas(conn)
+
+        devolver_paginas_livres(cursor)
+
+        if exibir:
+            print(f"\nCompactação concluída: {removidos} registro(s) excluído(s) removido(s) definitivamente, "
+                  f"{arquivadas} venda(s) arquivada(s).")
+
+    except sqlite3.Error as e:
+        if exibir:
+            print(f"\nErro ao compactar o banco de dados: {e}")
+
+    except OSError as e:
+        if exibir:
+            print(f"\nErro ao arquivar as vendas: {e}")
+
+    finally:
+        if conn:
+            conn.close()
+
+    return removidos
+
+_compactacao_agendada = None
+
+def iniciar_compactacao_agendada():
+    """
+    Inicia, uma única vez por processo, uma thread em segundo plano que executa
+    compactar_banco() uma vez por noite dentro do HORARIO_COMPACTACAO.
+    """
+    global _compactacao_agendada
+    if _compactacao_agendada is not None:
+        return
+
+    def executar():
+        ultima_execucao = None
+        while True:
+            agora = datetime.datetime.now()
+            hora_inicio, hora_fim = HORARIO_COMPACTACAO
+            if hora_inicio <= agora.hour < hora_fim and ultima_execucao != agora.date():
+                compactar_banco(exibir=False)
+                ultima_execucao = agora.date()
+            time.sleep(600)
+
+    _compactacao_agendada = threading.Thread(target=executar, name="compactacao-mercprd", daemon=True)
+    _compactacao_agendada.start()
+
+# --- Menus ---
+
+def menu_admin():
+    """Menu exclusivo para administradores."""
+    while True:
+        print("\n--- Menu do Administrador ---")
+        print("1 - Gerenciar Usuários")
+        print("2 - Gerenciar Produtos")
+        print("3 - Trocar minha senha")
+        print("4 - Compactar banco de dados")
+        print("5 - Alertas de estoque baixo")
+        print("6 - Planejar reposição")
+        print("7 - Relatório de vendas")
+        print("8 - Sair do menu de administrador")
+        
+        opcao = input("Escolha uma opção (1, 2, 3, 4, 5, 6, 7 ou 8): ")
+
+        if opcao == '1':
+            visualizar_contas_e_gerenciar()
+        elif opcao == '2':
+            menu_produtos_admin()
+        elif opcao == '3':
+            trocar_senha()
+        elif opcao == '4':
+            compactar_banco()
+        elif opcao == '5':
+            visualizar_alertas_estoque()
+        elif opcao == '6':
+            planejar_reposicao()
+        elif opcao == '7':
+            relatorio_vendas()
+        elif opcao == '8':
+            print("\nSaindo do menu de administrador...")
+            break
+        else:
+            print("\nOpção inválida. Por favor, tente novamente.")
+
+def menu_produtos_admin():
+    """Menu de gerenciamento de produtos para o administrador."""
+    while True:
+        print("\n--- Gerenciamento de Produtos ---")
+        print("1 - Cadastrar novo produto")
+        print("2 - Visualizar produtos")
+        print("3 - Editar produto")
+        print("4 - Excluir produto")
+        print("5 - Restaurar produto excluído")
+        print("6 - Histórico de preços")
+        print("7 - Relatório de produtos duplicados")
+        print("8 - Lotes e validade")
+        print("9 - Categorias")
+        print("10 - Voltar ao menu principal")
         
         opcao = input("Escolha uma opção: ")
 
@@ -510,6 +2599,16 @@ def menu_produtos_admin():
         elif opcao == '4':
             excluir_produto()
         elif opcao == '5':
+            restaurar_produto()
+        elif opcao == '6':
+            visualizar_historico_precos()
+        elif opcao == '7':
+            relatorio_duplicados()
+        elif opcao == '8':
+            menu_lotes()
+        elif opcao == '9':
+            menu_categorias()
+        elif opcao == '10':
             break
         else:
             print("\nOpção inválida.")
@@ -521,17 +2620,20 @@ def menu_usuario():
         print("\n--- Menu do Usuário Comum ---")
         print("1 - Visualizar produtos")
         print("2 - Cadastrar produto")
-        print("3 - Trocar minha senha")
-        print("4 - Sair")
+        print("3 - Registrar venda")
+        print("4 - Trocar minha senha")
+        print("5 - Sair")
 
-        opcao = input("Escolha uma opção (1, 2, 3 ou 4): ")
+        opcao = input("Escolha uma opção (1, 2, 3, 4 ou 5): ")
         if opcao == '1':
             visualizar_produtos()
         elif opcao == '2':
             cadastrar_produto()
         elif opcao == '3':
-            trocar_senha()
+            registrar_venda()
         elif opcao == '4':
+            trocar_senha()
+        elif opcao == '5':
             print("\nSaindo do menu de usuário...")
             break
         else:
@@ -540,6 +2642,7 @@ def menu_usuario():
 def main():
     """Função principal que gerencia o fluxo do programa."""
     criar_banco_de_dados()
+    iniciar_compactacao_agendada()
 
     print(f"\n{saudacao()} Bem-vindo(a) ao Sistema MercPrd.")
 
@@ -550,10 +2653,8 @@ def main():
         print("3 - Trocar senha (para quem esqueceu)")
         print("4 - Sair")
         
-        conn = sqlite3.connect('mercprd.db')
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM usuarios WHERE is_admin = 1")
-        if cursor.fetchone()[0] == 0:
+        conn = conectar()
+        if RepositorioUsuarios(conn).contar_administradores() == 0:
             print("--- ATENÇÃO: Nenhum administrador cadastrado. ---")
             print("Para criar o administrador, digite 'admin'")
         conn.close()
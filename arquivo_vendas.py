@@ -0,0 +1,568 @@
+"""
+Arquivo colunar das vendas do MercPrd3.
+
+Tira da tabela 'vendas' os meses fechados e grava essas vendas em segmentos
+somente-de-acréscimo, um diretório por mês com um arquivo binário por coluna
+(id, produto_id, quantidade, momento), com os tipos registrados no próprio segmento.
+O arquivo fica ao lado do arquivo do banco
+('mercprd.db' -> 'mercprd_arquivo_vendas'), para todos os processos que usam o mesmo
+banco enxergarem o mesmo arquivo. O 'meta.json' guarda, para cada segmento, o
+arquivamento que o gravou, a quantidade de linhas e o mínimo e o máximo de cada coluna
+(mapa de zonas).
+
+Cada arquivamento é registrado no próprio banco, em 'arquivamentos_vendas': ele leva
+as vendas com momento anterior ao corte e ID até o maior ID existente no início. A
+ordem dos IDs não precisa seguir a dos momentos (o terminal offline grava vendas
+antigas com IDs novos); uma venda atrasada de um mês já arquivado entra no próximo
+arquivamento, em outro segmento do mesmo mês. O estado passa de 'gravando' para
+'gravado' quando os segmentos estão no disco e no meta.json, e para 'concluido'
+quando as vendas saíram do banco. Só um processo arquiva por vez (a vez é reservada
+no banco), e se ele cair no meio, a próxima execução descarta o que não chegou a
+'gravado' ou termina de apagar o que já estava gravado.
+
+As consultas abrem as colunas com np.memmap, sem copiar os arquivos para a memória,
+e usam o mapa de zonas para pular os segmentos fora do período ou do produto. Um
+segmento inteiro dentro do período é somado sem máscara nenhuma. resumo_vendas()
+junta os segmentos dos arquivamentos gravados com as vendas que ainda estão no banco
+(menos as de um arquivamento gravado que ainda não foram apagadas), então os
+relatórios não precisam saber onde cada venda está nem contam uma venda duas vezes.
+
+Precisa do NumPy (pip install numpy). O MercPrd3 só importa este módulo no relatório
+de vendas e na compactação do banco.
+
+Uso:
+    python arquivo_vendas.py arquivar
+    python arquivo_vendas.py resumo 2025-01-01 2026-01-01 [--produto ID]
+"""
+import argparse
+import datetime
+import json
+import os
+import shutil
+import socket
+import sys
+import time
+
+import numpy as np
+
+import MercPrd3
+
+# Diretório do arquivo; sem a variável de ambiente ele fica ao lado do arquivo do banco
+DIRETORIO_ARQUIVO = os.environ.get('MERCPRD_ARQUIVO')
+
+# Tipo de cada coluna nos segmentos novos; 'momento' é gravado em segundos (datetime64[s]).
+# Cada segmento guarda os tipos com que foi gravado (os antigos têm 'produto_id' int32).
+COLUNAS = {
+    'id': 'int64',
+    'produto_id': 'int64',
+    'quantidade': 'int32',
+    'momento': 'int64',
+}
+
+# Meses que ficam no banco: o mês atual e o anterior. O planejador de reposição
+# usa os últimos 28 dias, que estão sempre dentro dessa faixa.
+MESES_NO_BANCO = 2
+
+# Linhas lidas do banco por bloco e vendas apagadas do banco por transação
+TAMANHO_BLOCO = 200_000
+LINHAS_POR_EXCLUSAO = 20000
+
+# Por quanto tempo a vez de arquivar fica reservada para um processo (se ele cair, outro assume)
+DURACAO_VEZ = datetime.timedelta(hours=2)
+
+
+def diretorio_padrao():
+    """
+    Diretório do arquivo: MERCPRD_ARQUIVO, se definido, ou ao lado do arquivo do banco.
+    Sem arquivo de banco (banco só na memória, ou a réplica de um terminal offline, cujas
+    vendas são arquivadas no central) não há arquivo: retorna None.
+    """
+    if DIRETORIO_ARQUIVO:
+        return DIRETORIO_ARQUIVO
+    arquivo_banco = MercPrd3.armazenamento().arquivo_banco
+    if not arquivo_banco:
+        return None
+    return os.path.splitext(os.path.abspath(arquivo_banco))[0] + '_arquivo_vendas'
+
+
+def preparar_tabelas(cursor):
+    """Cria no banco o registro dos arquivamentos e a reserva da vez de arquivar, se não existirem."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS arquivamentos_vendas (
+            lote INTEGER PRIMARY KEY AUTOINCREMENT,
+            corte TEXT,
+            limite_id INTEGER NOT NULL,
+            estado TEXT NOT NULL CHECK (estado IN ('gravando', 'gravado', 'concluido')),
+            iniciado_em TEXT NOT NULL
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS arquivamento_vendas_vez (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            dono TEXT NOT NULL,
+            ate TEXT NOT NULL
+        );
+    """)
+    cursor.connection.commit()
+
+
+def filtro_do_lote(corte, limite_id):
+    """
+    Condição SQL (e parâmetros) das vendas de um arquivamento. 'corte' None é um
+    arquivamento de antes do registro por período, que levava só a faixa de IDs.
+    """
+    if corte is None:
+        return "id <= ?", (limite_id,)
+    return "momento < ? AND id <= ?", (corte, limite_id)
+
+
+def caminho_meta(diretorio):
+    return os.path.join(diretorio, 'meta.json')
+
+
+def ler_meta(diretorio):
+    """
+    Lê o 'meta.json' do arquivo; um arquivo que ainda não existe está vazio. Os segmentos
+    de antes dos tipos por segmento recebem os tipos que o meta.json registrava para todos.
+    """
+    try:
+        with open(caminho_meta(diretorio), encoding='utf-8') as arquivo:
+            meta = json.load(arquivo)
+    except FileNotFoundError:
+        return {'colunas': COLUNAS, 'segmentos': []}
+    for segmento in meta['segmentos']:
+        segmento.setdefault('colunas', meta['colunas'])
+    meta['colunas'] = COLUNAS
+    return meta
+
+
+def gravar_meta(diretorio, meta):
+    """Troca o 'meta.json' de uma vez: grava ao lado e renomeia por cima."""
+    temporario = caminho_meta(diretorio) + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(meta, arquivo, indent=1)
+        arquivo.flush()
+        os.fsync(arquivo.fileno())
+    os.replace(temporario, caminho_meta(diretorio))
+
+
+def em_segundos(data):
+    """Converte 'AAAA-MM-DD' (ou 'AAAA-MM-DD HH:MM:SS') para segundos, como em 'momento'."""
+    return int(np.datetime64(data, 's').astype(np.int64))
+
+
+def inicio_do_corte(hoje):
+    """Primeiro dia do mais antigo dos MESES_NO_BANCO meses que ficam no banco."""
+    mes = np.datetime64(hoje, 'M') - (MESES_NO_BANCO - 1)
+    return str(mes.astype('datetime64[D]'))
+
+
+class Segmento:
+    """Um segmento sendo gravado: acrescenta blocos às colunas e acompanha o mapa de zonas."""
+
+    def __init__(self, diretorio, nome, mes):
+        self.nome = nome
+        self.mes = mes
+        self.caminho = os.path.join(diretorio, nome)
+        # Sobra de uma execução que caiu antes de registrar o segmento no meta.json
+        shutil.rmtree(self.caminho, ignore_errors=True)
+        os.makedirs(self.caminho)
+        self.arquivos = {coluna: open(os.path.join(self.caminho, f"{coluna}.bin"), 'wb') for coluna in COLUNAS}
+        self.linhas = 0
+        self.zonas = {}
+
+    def acrescentar(self, colunas):
+        for coluna, valores in colunas.items():
+            self.arquivos[coluna].write(valores.astype(COLUNAS[coluna]).tobytes())
+            menor, maior = int(valores.min()), int(valores.max())
+            if coluna in self.zonas:
+                menor, maior = min(menor, self.zonas[coluna][0]), max(maior, self.zonas[coluna][1])
+            self.zonas[coluna] = [menor, maior]
+        self.linhas += len(colunas['id'])
+
+    def fechar(self):
+        """Garante as colunas no disco e retorna a entrada do segmento para o meta.json."""
+        for arquivo in self.arquivos.values():
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+            arquivo.close()
+        return {'nome': self.nome, 'mes': self.mes, 'linhas': self.linhas, 'colunas': COLUNAS, 'zonas': self.zonas}
+
+
+def obter_vez(conn, dono):
+    """Reserva a vez de arquivar para 'dono'; retorna False se outro processo está arquivando."""
+    agora = MercPrd3.agora_texto()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        atual = conn.execute("SELECT dono, ate FROM arquivamento_vendas_vez WHERE id = 1").fetchone()
+        if atual and atual[0] != dono and atual[1] > agora:
+            conn.rollback()
+            return False
+        ate = (datetime.datetime.now() + DURACAO_VEZ).strftime('%Y-%m-%d %H:%M:%S')
+        conn.execute("INSERT OR REPLACE INTO arquivamento_vendas_vez (id, dono, ate) VALUES (1, ?, ?)", (dono, ate))
+        conn.commit()
+        return True
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def com_a_vez(conn, funcao, sem_a_vez=None):
+    """
+    Executa 'funcao' com a vez de arquivar reservada para este processo e a libera no
+    fim. Se outro processo estiver com a vez, retorna 'sem_a_vez' sem executar nada.
+    """
+    dono = f"{socket.gethostname()}:{os.getpid()}"
+    if not obter_vez(conn, dono):
+        return sem_a_vez
+    try:
+        return funcao()
+    finally:
+        conn.rollback()
+        conn.execute("DELETE FROM arquivamento_vendas_vez WHERE id = 1 AND dono = ?", (dono,))
+        conn.commit()
+
+
+def migrar_meta_antigo(conn, meta, diretorio):
+    """
+    Um meta.json de antes do registro no banco guardava só o último ID arquivado: ele
+    vira um arquivamento 'gravado' pela faixa de IDs, e os segmentos passam a apontar
+    para esse arquivamento.
+    """
+    if 'ultimo_id' not in meta:
+        return
+    if meta['ultimo_id'] > 0:
+        cursor = conn.execute(
+            "INSERT INTO arquivamentos_vendas (corte, limite_id, estado, iniciado_em) VALUES (NULL, ?, 'gravado', ?)",
+            (meta['ultimo_id'], MercPrd3.agora_texto())
+        )
+        for segmento in meta['segmentos']:
+            segmento['lote'] = cursor.lastrowid
+    del meta['ultimo_id']
+    gravar_meta(diretorio, meta)
+    conn.commit()
+
+
+def apagar_do_banco(conn, lote, corte, limite_id):
+    """Apaga do banco, em lotes, as vendas de um arquivamento gravado e o marca como concluído."""
+    filtro, parametros = filtro_do_lote(corte, limite_id)
+    apagadas = 0
+    while True:
+        cursor = conn.execute(
+            f"DELETE FROM vendas WHERE id IN (SELECT id FROM vendas WHERE {filtro} LIMIT ?)",
+            (*parametros, LINHAS_POR_EXCLUSAO)
+        )
+        apagadas += cursor.rowcount
+        conn.commit()
+        if cursor.rowcount < LINHAS_POR_EXCLUSAO:
+            break
+    conn.execute("UPDATE arquivamentos_vendas SET estado = 'concluido' WHERE lote = ?", (lote,))
+    conn.commit()
+    return apagadas
+
+
+def retomar(conn, meta, diretorio):
+    """
+    Acerta o que uma execução anterior deixou pela metade: descarta do meta.json os
+    segmentos de arquivamentos que não chegaram a 'gravado' (ou que o banco não conhece,
+    como depois de voltar um snapshot) e termina de apagar os que já estavam gravados.
+    Retorna as vendas apagadas do banco.
+    """
+    cursor = conn.execute("SELECT lote, corte, limite_id, estado FROM arquivamentos_vendas WHERE estado <> 'concluido'")
+    pendentes = cursor.fetchall()
+    cursor = conn.execute("SELECT lote FROM arquivamentos_vendas WHERE estado IN ('gravado', 'concluido')")
+    validos = {lote for (lote,) in cursor}
+
+    descartados = [segmento for segmento in meta['segmentos'] if segmento['lote'] not in validos]
+    if descartados:
+        meta['segmentos'] = [segmento for segmento in meta['segmentos'] if segmento['lote'] in validos]
+        gravar_meta(diretorio, meta)
+        for segmento in descartados:
+            shutil.rmtree(os.path.join(diretorio, segmento['nome']), ignore_errors=True)
+
+    apagadas = 0
+    for lote, corte, limite_id, estado in pendentes:
+        if estado == 'gravando':
+            conn.execute("DELETE FROM arquivamentos_vendas WHERE lote = ?", (lote,))
+            conn.commit()
+        else:
+            apagadas += apagar_do_banco(conn, lote, corte, limite_id)
+    return apagadas
+
+
+def gravar_segmentos(conn, meta, diretorio, lote, corte, limite_id):
+    """
+    Lê as vendas do arquivamento pelo índice de 'momento', em blocos paginados por
+    (momento, id), e as grava em um segmento novo por mês. Retorna as vendas gravadas.
+    """
+    cursor = conn.cursor()
+    proximo = max((int(segmento['nome']) for segmento in meta['segmentos']), default=0) + 1
+    abertos = {}
+    arquivadas = 0
+    ultimo = ('', 0)
+    while True:
+        cursor.execute("""
+            SELECT momento, id, produto_id, quantidade FROM vendas
+            WHERE momento < ? AND id <= ? AND (momento, id) > (?, ?)
+            ORDER BY momento, id LIMIT ?
+        """, (corte, limite_id, *ultimo, TAMANHO_BLOCO))
+        linhas = cursor.fetchall()
+        if not linhas:
+            break
+        ultimo = linhas[-1][:2]
+
+        momentos, ids, produtos, quantidades = zip(*linhas)
+        bloco = {
+            'id': np.array(ids, dtype=np.int64),
+            'produto_id': np.array(produtos, dtype=np.int64),
+            'quantidade': np.array(quantidades, dtype=np.int64),
+            'momento': np.array(momentos, dtype='datetime64[s]').astype(np.int64),
+        }
+        meses = bloco['momento'].astype('datetime64[s]').astype('datetime64[M]')
+        for mes in np.unique(meses):
+            if mes not in abertos:
+                abertos[mes] = Segmento(diretorio, f"{proximo:06d}", str(mes))
+                proximo += 1
+            do_mes = meses == mes
+            abertos[mes].acrescentar({coluna: valores[do_mes] for coluna, valores in bloco.items()})
+        arquivadas += len(linhas)
+
+    for segmento in abertos.values():
+        entrada = segmento.fechar()
+        entrada['lote'] = lote
+        meta['segmentos'].append(entrada)
+    return arquivadas
+
+
+def arquivar(conn, diretorio=None, hoje=None):
+    """
+    Move para o arquivo as vendas dos meses fechados (anteriores aos MESES_NO_BANCO
+    meses mais recentes), um segmento por mês, e depois as apaga do banco em lotes.
+    Se outro processo estiver arquivando, ou se não houver diretório de arquivo (veja
+    diretorio_padrao()), não faz nada. Retorna (vendas arquivadas, vendas apagadas do banco).
+    """
+    diretorio = diretorio or diretorio_padrao()
+    if diretorio is None:
+        return 0, 0
+    hoje = hoje or datetime.date.today()
+    preparar_tabelas(conn.cursor())
+    return com_a_vez(conn, lambda: arquivar_com_a_vez(conn, diretorio, inicio_do_corte(hoje)), (0, 0))
+
+
+def arquivar_com_a_vez(conn, diretorio, corte):
+    """O arquivamento em si; arquivar() só o chama com a vez reservada."""
+    cursor = conn.cursor()
+    os.makedirs(diretorio, exist_ok=True)
+    meta = ler_meta(diretorio)
+    migrar_meta_antigo(conn, meta, diretorio)
+    apagadas = retomar(conn, meta, diretorio)
+
+    # Vendas gravadas durante o arquivamento têm ID maior que o limite e ficam para o próximo
+    cursor.execute("SELECT MAX(id) FROM vendas")
+    limite_id = cursor.fetchone()[0]
+    cursor.execute("SELECT 1 FROM vendas WHERE momento < ? LIMIT 1", (corte,))
+    if limite_id is None or cursor.fetchone() is None:
+        return 0, apagadas
+
+    cursor.execute(
+        "INSERT INTO arquivamentos_vendas (corte, limite_id, estado, iniciado_em) VALUES (?, ?, 'gravando', ?)",
+        (corte, limite_id, MercPrd3.agora_texto())
+    )
+    lote = cursor.lastrowid
+    conn.commit()
+
+    arquivadas = gravar_segmentos(conn, meta, diretorio, lote, corte, limite_id)
+    gravar_meta(diretorio, meta)
+    cursor.execute("UPDATE arquivamentos_vendas SET estado = 'gravado' WHERE lote = ?", (lote,))
+    conn.commit()
+
+    # Só agora as vendas saem do banco; se algo falhar aqui, a próxima execução continua
+    apagadas += apagar_do_banco(conn, lote, corte, limite_id)
+    return arquivadas, apagadas
+
+
+def coluna(diretorio, segmento, nome):
+    """Abre uma coluna de um segmento com np.memmap, sem copiar o arquivo."""
+    return np.memmap(os.path.join(diretorio, segmento['nome'], f"{nome}.bin"),
+                     dtype=segmento['colunas'][nome], mode='r', shape=(segmento['linhas'],))
+
+
+class Resumo:
+    """
+    Acumula unidades, vendas, unidades por mês e (se 'por_produto') unidades por
+    produto de várias fontes. A soma por produto é a parte cara da varredura, então
+    só é feita quando o relatório vai mostrar os mais vendidos.
+    """
+
+    def __init__(self, por_produto=True):
+        self.unidades = 0
+        self.vendas = 0
+        self.linhas_lidas = 0
+        self.por_mes = {}
+        # (IDs em ordem, unidades de cada um): os IDs podem ser esparsos, como os
+        # provisórios de um terminal offline, então não servem de índice de array
+        self.por_produto = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)) if por_produto else None
+
+    def somar_produtos(self, produtos, quantidades):
+        if self.por_produto is None or len(produtos) == 0:
+            return
+        ids, unidades = self.por_produto
+        ids, posicao = np.unique(np.concatenate([ids, produtos]), return_inverse=True)
+        vendido = np.bincount(posicao, weights=np.concatenate([unidades, quantidades]), minlength=len(ids))
+        self.por_produto = ids, vendido.astype(np.int64)
+
+    def somar_mes(self, mes, produtos, quantidades):
+        """Soma vendas que são todas do mesmo mês (um segmento do arquivo é sempre de um mês só)."""
+        unidades = int(quantidades.sum(dtype=np.int64))
+        self.unidades += unidades
+        self.vendas += len(quantidades)
+        self.por_mes[mes] = self.por_mes.get(mes, 0) + unidades
+        self.somar_produtos(produtos, quantidades)
+
+    def somar(self, produtos, quantidades, momentos):
+        """Soma um bloco qualquer de vendas já filtrado pelo período."""
+        meses = momentos.astype('datetime64[s]').astype('datetime64[M]')
+        for mes in np.unique(meses):
+            do_mes = meses == mes
+            self.somar_mes(str(mes), produtos[do_mes], quantidades[do_mes])
+
+    def mais_vendidos(self, quantos=10):
+        """[(produto_id, unidades)] dos 'quantos' produtos mais vendidos."""
+        if self.por_produto is None:
+            return []
+        ids, unidades = self.por_produto
+        quantos = min(quantos, np.count_nonzero(unidades))
+        if quantos == 0:
+            return []
+        maiores = np.argpartition(unidades, -quantos)[-quantos:]
+        maiores = maiores[np.argsort(unidades[maiores])[::-1]]
+        return [(int(ids[posicao]), int(unidades[posicao])) for posicao in maiores]
+
+
+def resumir_arquivo(resumo, meta, diretorio, lotes, inicio, fim, produto_id=None):
+    """
+    Soma no 'resumo' as vendas arquivadas entre 'inicio' e 'fim' (segundos), usando o
+    mapa de zonas. Só entram os segmentos dos arquivamentos em 'lotes'.
+    """
+    for segmento in meta['segmentos']:
+        if segmento.get('lote') not in lotes:
+            continue
+        menor, maior = segmento['zonas']['momento']
+        if maior < inicio or menor >= fim:
+            continue
+        if produto_id is not None and not segmento['zonas']['produto_id'][0] <= produto_id <= segmento['zonas']['produto_id'][1]:
+            continue
+
+        quantidades = coluna(diretorio, segmento, 'quantidade')
+        produtos = coluna(diretorio, segmento, 'produto_id')
+        resumo.linhas_lidas += segmento['linhas']
+
+        if produto_id is not None:
+            # Primeiro as linhas do produto; o período só é conferido nelas
+            linhas = np.flatnonzero(produtos == produto_id)
+            momentos = coluna(diretorio, segmento, 'momento')[linhas]
+            linhas = linhas[(momentos >= inicio) & (momentos < fim)]
+            resumo.somar_mes(segmento['mes'], produtos[linhas], quantidades[linhas])
+        elif inicio <= menor and maior < fim:
+            # Segmento inteiro no período: soma direto, sem máscara
+            resumo.somar_mes(segmento['mes'], produtos, quantidades)
+        else:
+            momentos = coluna(diretorio, segmento, 'momento')
+            filtro = (momentos >= inicio) & (momentos < fim)
+            resumo.somar_mes(segmento['mes'], produtos[filtro], quantidades[filtro])
+
+
+def resumir_banco(resumo, cursor, gravados, inicio, fim, produto_id=None):
+    """
+    Soma no 'resumo' as vendas entre 'inicio' e 'fim' (datas) que ainda estão no banco,
+    menos as dos arquivamentos 'gravados' [(corte, limite_id)], que já estão no arquivo
+    mas ainda não foram apagadas.
+    """
+    condicoes = ["momento >= ?", "momento < ?"]
+    parametros = [inicio, fim]
+    if produto_id is not None:
+        condicoes.insert(0, "produto_id = ?")
+        parametros.insert(0, produto_id)
+    for corte, limite_id in gravados:
+        filtro, valores = filtro_do_lote(corte, limite_id)
+        condicoes.append(f"NOT ({filtro})")
+        parametros.extend(valores)
+    cursor.execute(f"SELECT produto_id, quantidade, momento FROM vendas WHERE {' AND '.join(condicoes)}", parametros)
+
+    while True:
+        linhas = cursor.fetchmany(TAMANHO_BLOCO)
+        if not linhas:
+            break
+        produtos, quantidades, momentos = zip(*linhas)
+        resumo.linhas_lidas += len(linhas)
+        resumo.somar(np.array(produtos, dtype=np.int64), np.array(quantidades, dtype=np.int64),
+                     np.array(momentos, dtype='datetime64[s]').astype(np.int64))
+
+
+def resumo_vendas(conn, inicio, fim, produto_id=None, por_produto=True, diretorio=None):
+    """
+    Resumo das vendas de 'inicio' (inclusive) a 'fim' (exclusive), datas 'AAAA-MM-DD',
+    juntando o arquivo e o banco. Opcionalmente só de um produto; com 'por_produto'
+    falso não calcula os mais vendidos.
+    """
+    diretorio = diretorio or diretorio_padrao()
+    cursor = conn.cursor()
+    preparar_tabelas(cursor)
+    if diretorio and 'ultimo_id' in ler_meta(diretorio):
+        com_a_vez(conn, lambda: migrar_meta_antigo(conn, ler_meta(diretorio), diretorio))
+    resumo = Resumo(por_produto and produto_id is None)
+
+    # O estado dos arquivamentos e as vendas do banco são lidos na mesma transação, então
+    # uma venda nunca aparece nos dois lugares (nem em nenhum). O meta.json é lido depois:
+    # os segmentos de um arquivamento já estão nele quando o estado passa a 'gravado'.
+    conn.execute("BEGIN")
+    try:
+        cursor.execute("SELECT lote, corte, limite_id, estado FROM arquivamentos_vendas WHERE estado IN ('gravado', 'concluido')")
+        arquivamentos = cursor.fetchall()
+        gravados = [(corte, limite_id) for _, corte, limite_id, estado in arquivamentos if estado == 'gravado']
+        resumir_banco(resumo, cursor, gravados, inicio, fim, produto_id)
+    finally:
+        conn.rollback()
+
+    if diretorio:
+        lotes = {lote for lote, _, _, _ in arquivamentos}
+        resumir_arquivo(resumo, ler_meta(diretorio), diretorio, lotes, em_segundos(inicio), em_segundos(fim), produto_id)
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arquivo colunar das vendas do MercPrd3.")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+    subcomandos.add_parser('arquivar', help="move as vendas dos meses fechados para o arquivo")
+    resumo = subcomandos.add_parser('resumo', help="resume as vendas de um período (arquivo + banco)")
+    resumo.add_argument('inicio', help="data inicial (AAAA-MM-DD), inclusive")
+    resumo.add_argument('fim', help="data final (AAAA-MM-DD), exclusive")
+    resumo.add_argument('--produto', type=int, help="só as vendas deste produto")
+    resumo.add_argument('--mais-vendidos', action='store_true', help="calcula também os 10 produtos mais vendidos")
+    argumentos = parser.parse_args()
+
+    conn = MercPrd3.conectar()
+    try:
+        inicio = time.perf_counter()
+        if argumentos.comando == 'arquivar':
+            arquivadas, apagadas = arquivar(conn)
+            print(f"{arquivadas} venda(s) arquivada(s), {apagadas} apagada(s) do banco "
+                  f"em {time.perf_counter() - inicio:.2f} s.")
+            return 0
+
+        resultado = resumo_vendas(conn, argumentos.inicio, argumentos.fim, argumentos.produto, argumentos.mais_vendidos)
+        segundos = time.perf_counter() - inicio
+        print(f"{resultado.vendas} venda(s), {resultado.unidades} unidade(s).")
+        for mes, unidades in sorted(resultado.por_mes.items()):
+            print(f"  {mes}: {unidades}")
+        for produto_id, unidades in resultado.mais_vendidos():
+            print(f"  produto {produto_id}: {unidades}")
+        print(f"{resultado.linhas_lidas} linha(s) lida(s) em {segundos:.3f} s "
+              f"({resultado.linhas_lidas / max(segundos, 1e-9) / 1e6:.0f} milhões de linhas/s).")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
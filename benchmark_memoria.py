@@ -0,0 +1,130 @@
+"""
+Benchmark de memória da listagem de produtos.
+
+Compara, em uma listagem de um milhão de produtos (ajustável com --linhas):
+  - tuplas + fetchall(): o que as funções do MercPrd3 faziam antes dos repositórios;
+  - registros __slots__ + list(): os mesmos registros do repositório, todos na memória;
+  - registros __slots__ em fluxo: RepositorioProdutos.listar() percorrido linha a linha.
+
+Para cada caso mostra o pico de memória medido com tracemalloc, o custo por linha e o
+tempo. O banco é criado em um diretório temporário (ou na memória, com --memoria) e
+descartado no fim.
+
+Uso:
+    python benchmark_memoria.py
+    python benchmark_memoria.py --linhas 200000 --memoria
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import MercPrd3
+
+
+def preparar_banco(linhas):
+    """Cria o banco com 'linhas' produtos. Os gatilhos são removidos para a carga ser rápida."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        MercPrd3.criar_banco_de_dados()
+
+    conn = MercPrd3.conectar()
+    for (gatilho,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+        conn.execute(f"DROP TRIGGER {gatilho}")
+    conn.executemany(
+        "INSERT INTO produtos (nome, preco, quantidade, estoque_minimo) VALUES (?, ?, ?, ?)",
+        ((f"Produto {numero:07d}", numero % 1000 / 10, numero % 500, numero % 20) for numero in range(linhas))
+    )
+    conn.commit()
+    conn.close()
+
+
+def medir(descricao, funcao):
+    """Executa 'funcao' e retorna (descrição, pico de memória em bytes, linhas, segundos)."""
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    linhas = funcao()
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return descricao, pico, linhas, duracao
+
+
+def tuplas_com_fetchall():
+    conn = MercPrd3.conectar()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {MercPrd3.Produto.colunas()} FROM produtos WHERE deleted_at IS NULL ORDER BY nome")
+    produtos = cursor.fetchall()
+    total = len(produtos)
+    conn.close()
+    return total
+
+
+def registros_em_lista():
+    conn = MercPrd3.conectar()
+    produtos = list(MercPrd3.RepositorioProdutos(conn).listar())
+    total = len(produtos)
+    conn.close()
+    return total
+
+
+def registros_em_fluxo():
+    conn = MercPrd3.conectar()
+    total = 0
+    for produto in MercPrd3.RepositorioProdutos(conn).listar():
+        total += 1
+    conn.close()
+    return total
+
+
+def tamanho_do_objeto_por_linha():
+    """
+    Tamanho só do contêiner de uma linha (sem os valores), com sys.getsizeof. A linha de
+    exemplo tem um valor para cada coluna de Produto.__slots__.
+    """
+    exemplo = {'id': 1, 'nome': "Produto 0000001", 'preco': 9.9, 'quantidade': 10, 'estoque_minimo': 2}
+    campos = {coluna: exemplo.get(coluna) for coluna in MercPrd3.Produto.__slots__}
+    tupla = sys.getsizeof(tuple(campos.values()))
+    registro = sys.getsizeof(MercPrd3.Produto(**campos))
+    dicionario = sys.getsizeof(campos)
+    return tupla, registro, dicionario
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede a memória da listagem de produtos com tuplas e com registros __slots__.")
+    parser.add_argument('--linhas', type=int, default=1_000_000, help="quantidade de produtos no banco de teste")
+    parser.add_argument('--memoria', action='store_true', help="cria o banco de teste na memória em vez do disco")
+    argumentos = parser.parse_args()
+
+    diretorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='memoria_mercprd_') as diretorio:
+        os.chdir(diretorio)
+        try:
+            MercPrd3.configurar_armazenamento('' if argumentos.memoria else 'mercprd.db',
+                                              'memoria' if argumentos.memoria else 'disco')
+            print(f"Criando banco com {argumentos.linhas} produtos...")
+            preparar_banco(argumentos.linhas)
+
+            resultados = [
+                medir("tuplas + fetchall()", tuplas_com_fetchall),
+                medir("registros __slots__ + list()", registros_em_lista),
+                medir("registros __slots__ em fluxo", registros_em_fluxo),
+            ]
+        finally:
+            MercPrd3.armazenamento().fechar()
+            os.chdir(diretorio_original)
+
+    print(f"\n{'Listagem':<32}{'pico (MB)':>12}{'bytes/linha':>14}{'tempo (s)':>12}")
+    for descricao, pico, linhas, duracao in resultados:
+        print(f"{descricao:<32}{pico / 1024 / 1024:>12.1f}{pico / max(linhas, 1):>14.1f}{duracao:>12.2f}")
+
+    tupla, registro, dicionario = tamanho_do_objeto_por_linha()
+    print(f"\nContêiner de uma linha (sem os valores): tupla {tupla} bytes | "
+          f"registro __slots__ {registro} bytes | dict {dicionario} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+Planejador de reposição do MercPrd3.
+
+Calcula, para cada produto, a demanda diária pela média móvel das vendas dos últimos
+JANELA_DIAS dias fechados, os dias de cobertura do estoque atual e a quantidade
+sugerida de compra, e guarda a lista de compras na tabela 'plano_reposicao'.
+
+As vendas (pela ordem de momento) e o catálogo (pela ordem de ID) são lidos em blocos
+de TAMANHO_BLOCO linhas direto para arrays do NumPy; as contas são todas vetorizadas. A memória fica limitada
+a alguns arrays do tamanho do catálogo, qualquer que seja o volume de vendas. Os arrays
+são indexados pela posição do produto no catálogo, não pelo ID, então IDs esparsos
+(como os provisórios de um terminal offline) não aumentam a memória.
+
+O cálculo completo roda uma vez por dia (quando a janela de vendas muda). Nas demais
+execuções do mesmo dia o planejador lê o changelog a partir de onde parou e recalcula
+só os produtos que mudaram desde a última execução (estoque, mínimo, inclusão ou
+exclusão), reaproveitando a demanda já calculada.
+
+Precisa do NumPy (pip install numpy). O MercPrd3 só importa este módulo quando o
+administrador abre o planejador.
+
+Uso:
+    python planejador_reposicao.py                  # completo ou incremental, o que couber
+    python planejador_reposicao.py --completo       # força o cálculo completo
+    python planejador_reposicao.py --exportar compras.csv
+"""
+import argparse
+import csv
+import datetime
+import sys
+import time
+
+import numpy as np
+
+import MercPrd3
+
+# Dias fechados de vendas usados na média móvel da demanda
+JANELA_DIAS = 28
+
+# Dias até a mercadoria chegar e dias de venda que a compra deve cobrir depois disso
+PRAZO_ENTREGA_DIAS = 3
+DIAS_COBERTURA_ALVO = 14
+
+# Linhas lidas do banco por bloco
+TAMANHO_BLOCO = 200_000
+
+# IDs por consulta no cálculo incremental (abaixo do limite de parâmetros do SQLite)
+TAMANHO_LOTE_IDS = 500
+
+# Nome com que versões anteriores registravam o planejador como consumidor do changelog
+CONSUMIDOR_CHANGELOG = 'planejador_reposicao'
+
+
+def preparar_tabelas(cursor):
+    """
+    Cria a tabela da lista de compras e a do estado da última execução, se não existirem.
+    O estado guarda até onde o changelog foi lido. O planejador não se registra como
+    consumidor do changelog: ele só roda quando um administrador abre a tela, e um
+    registro parado seguraria a poda do changelog nos dias em que ninguém a abre.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS plano_reposicao (
+            produto_id INTEGER PRIMARY KEY,
+            demanda_diaria REAL NOT NULL,
+            quantidade INTEGER NOT NULL,
+            estoque_minimo INTEGER NOT NULL,
+            dias_cobertura REAL,
+            sugerido INTEGER NOT NULL
+        );
+    """)
+    # Só os itens a comprar, do que acaba primeiro para o último
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_plano_reposicao_comprar
+        ON plano_reposicao (dias_cobertura) WHERE sugerido > 0;
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS plano_reposicao_estado (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            data_referencia TEXT NOT NULL,
+            calculado_em TEXT NOT NULL,
+            ultimo_seq INTEGER NOT NULL DEFAULT 0
+        );
+    """)
+    cursor.execute("PRAGMA table_info(plano_reposicao_estado)")
+    if 'ultimo_seq' not in [info[1] for info in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE plano_reposicao_estado ADD COLUMN ultimo_seq INTEGER NOT NULL DEFAULT 0;")
+    cursor.connection.commit()
+    # Bancos de versões anteriores ainda têm o planejador entre os consumidores
+    MercPrd3.remover_consumidor(cursor, CONSUMIDOR_CHANGELOG)
+
+
+def janela_de_vendas(hoje):
+    """Retorna (início, fim) da janela de vendas: os JANELA_DIAS dias anteriores a 'hoje'."""
+    return (hoje - datetime.timedelta(days=JANELA_DIAS)).isoformat(), hoje.isoformat()
+
+
+def calcular_plano(demanda, quantidade, estoque_minimo):
+    """
+    Recebe arrays da demanda diária, do estoque e do estoque mínimo e devolve
+    (dias de cobertura, quantidade sugerida). Sem demanda a cobertura é NaN (infinita);
+    o mínimo entra como estoque de segurança, então um produto parado abaixo do mínimo
+    ainda é sugerido.
+    """
+    cobertura = np.divide(quantidade, demanda, out=np.full(demanda.shape, np.nan), where=demanda > 0)
+    alvo = demanda * (PRAZO_ENTREGA_DIAS + DIAS_COBERTURA_ALVO) + estoque_minimo
+    sugerido = np.ceil(np.maximum(alvo - quantidade, 0)).astype(np.int64)
+    return cobertura, sugerido
+
+
+def vendas_por_produto(cursor, inicio, fim, ids):
+    """
+    Soma as vendas da janela por produto, na posição de cada ID em 'ids' (o catálogo
+    ativo, em ordem de ID); vendas de produtos fora do catálogo ficam de fora. A janela
+    é lida pelo índice de 'momento', em blocos paginados por (momento, id): a ordem dos
+    IDs não precisa seguir a dos momentos (o terminal offline grava vendas antigas com
+    IDs novos).
+    """
+    vendido = np.zeros(len(ids), dtype=np.float64)
+    ultimo = ('', 0)
+    while True:
+        cursor.execute("""
+            SELECT momento, id, produto_id, quantidade FROM vendas
+            WHERE momento >= ? AND momento < ? AND (momento, id) > (?, ?)
+            ORDER BY momento, id LIMIT ?
+        """, (inicio, fim, *ultimo, TAMANHO_BLOCO))
+        linhas = cursor.fetchall()
+        if not linhas:
+            break
+        ultimo = linhas[-1][:2]
+        bloco = np.array([linha[2:] for linha in linhas], dtype=np.int64).reshape(-1, 2)
+        posicao = np.searchsorted(ids, bloco[:, 0])
+        no_catalogo = posicao < len(ids)
+        no_catalogo[no_catalogo] = ids[posicao[no_catalogo]] == bloco[no_catalogo, 0]
+        vendido += np.bincount(posicao[no_catalogo], weights=bloco[no_catalogo, 1], minlength=len(ids))
+
+    return vendido
+
+
+def estoque_por_produto(cursor):
+    """Lê o catálogo ativo em blocos; retorna arrays (ids, quantidade, estoque mínimo), em ordem de ID."""
+    blocos = []
+    ultimo_id = 0
+    while True:
+        cursor.execute("""
+            SELECT id, quantidade, estoque_minimo FROM produtos
+            WHERE id > ? AND deleted_at IS NULL ORDER BY id LIMIT ?
+        """, (ultimo_id, TAMANHO_BLOCO))
+        bloco = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 3)
+        if len(bloco) == 0:
+            break
+        blocos.append(bloco)
+        ultimo_id = int(bloco[-1, 0])
+
+    catalogo = np.concatenate(blocos) if blocos else np.zeros((0, 3), dtype=np.int64)
+    return catalogo[:, 0], catalogo[:, 1], catalogo[:, 2]
+
+
+def linhas_do_plano(ids, demanda, quantidade, estoque_minimo, cobertura, sugerido):
+    """
+    Gera as linhas de 'plano_reposicao', com a cobertura infinita gravada como NULL.
+    Os arrays viram objetos Python um bloco por vez, para a memória não crescer com o catálogo.
+    """
+    for inicio in range(0, len(ids), TAMANHO_BLOCO):
+        fatia = slice(inicio, inicio + TAMANHO_BLOCO)
+        yield from zip(
+            ids[fatia].tolist(), demanda[fatia].tolist(), quantidade[fatia].tolist(), estoque_minimo[fatia].tolist(),
+            [None if dias != dias else dias for dias in cobertura[fatia].tolist()],
+            sugerido[fatia].tolist()
+        )
+
+
+def gravar_plano(conn, linhas, remover=None):
+    """Grava as linhas do plano; sem 'remover' a tabela é refeita, com 'remover' só esses IDs saem antes."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if remover is None:
+            conn.execute("DELETE FROM plano_reposicao")
+        else:
+            conn.executemany("DELETE FROM plano_reposicao WHERE produto_id = ?", ((produto_id,) for produto_id in remover))
+        conn.executemany("""
+            INSERT INTO plano_reposicao (produto_id, demanda_diaria, quantidade, estoque_minimo, dias_cobertura, sugerido)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, linhas)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def calcular_completo(conn, hoje):
+    """Recalcula o plano de todo o catálogo. Retorna a quantidade de produtos calculados."""
+    cursor = conn.cursor()
+
+    # O changelog é marcado antes da leitura: o que mudar durante o cálculo é
+    # reprocessado na próxima execução incremental.
+    ate_seq = MercPrd3.ultimo_seq_changelog(cursor)
+
+    inicio, fim = janela_de_vendas(hoje)
+    ids, quantidade, estoque_minimo = estoque_por_produto(cursor)
+    demanda = vendas_por_produto(cursor, inicio, fim, ids) / JANELA_DIAS
+    cobertura, sugerido = calcular_plano(demanda, quantidade, estoque_minimo)
+
+    # Guarda quem vende ou precisa de compra; os demais têm demanda zero e nada a sugerir
+    manter = (demanda > 0) | (sugerido > 0)
+    gravar_plano(conn, linhas_do_plano(ids[manter], demanda[manter], quantidade[manter], estoque_minimo[manter],
+                                       cobertura[manter], sugerido[manter]))
+
+    cursor.execute(
+        "INSERT OR REPLACE INTO plano_reposicao_estado (id, data_referencia, calculado_em, ultimo_seq) VALUES (1, ?, ?, ?)",
+        (hoje.isoformat(), MercPrd3.agora_texto(), ate_seq)
+    )
+    conn.commit()
+    return len(ids)
+
+
+def produtos_alterados(cursor, desde_seq):
+    """
+    Lê o changelog a partir de 'desde_seq' e retorna ({id: dados mais recentes, ou None se
+    o produto saiu do catálogo}, último seq lido).
+    """
+    alterados = {}
+    while True:
+        alteracoes = MercPrd3.buscar_alteracoes(cursor, desde_seq)
+        if not alteracoes:
+            return alterados, desde_seq
+        for seq, tabela, operacao, chave, dados, _ in alteracoes:
+            if tabela == 'produtos':
+                ativo = operacao != 'D' and dados['deleted_at'] is None
+                alterados[int(chave)] = dados if ativo else None
+        desde_seq = alteracoes[-1][0]
+
+
+def demanda_guardada(cursor, ids):
+    """Demanda diária já calculada hoje para 'ids' (zero para quem não está no plano)."""
+    demanda = np.zeros(len(ids), dtype=np.float64)
+    posicao = {produto_id: indice for indice, produto_id in enumerate(ids.tolist())}
+    for inicio in range(0, len(ids), TAMANHO_LOTE_IDS):
+        lote = ids[inicio:inicio + TAMANHO_LOTE_IDS].tolist()
+        marcadores = ", ".join("?" * len(lote))
+        cursor.execute(f"SELECT produto_id, demanda_diaria FROM plano_reposicao WHERE produto_id IN ({marcadores})", lote)
+        for produto_id, demanda_diaria in cursor:
+            demanda[posicao[produto_id]] = demanda_diaria
+    return demanda
+
+
+def calcular_incremental(conn, desde_seq):
+    """Recalcula só os produtos alterados desde 'desde_seq'. Retorna a quantidade recalculada."""
+    cursor = conn.cursor()
+    alterados, ate_seq = produtos_alterados(cursor, desde_seq)
+    if not alterados:
+        # Só mudaram outras tabelas: avança a leitura para a poda não forçar um cálculo completo
+        if ate_seq > desde_seq:
+            cursor.execute("UPDATE plano_reposicao_estado SET ultimo_seq = ? WHERE id = 1", (ate_seq,))
+            conn.commit()
+        return 0
+
+    ids = np.array(sorted(alterados), dtype=np.int64)
+    ativos = np.array([alterados[produto_id] is not None for produto_id in ids.tolist()], dtype=bool)
+    quantidade = np.array([dados['quantidade'] if dados else 0 for dados in map(alterados.get, ids.tolist())], dtype=np.int64)
+    estoque_minimo = np.array([dados['estoque_minimo'] if dados else 0 for dados in map(alterados.get, ids.tolist())], dtype=np.int64)
+
+    demanda = demanda_guardada(cursor, ids)
+    cobertura, sugerido = calcular_plano(demanda, quantidade, estoque_minimo)
+
+    manter = ativos & ((demanda > 0) | (sugerido > 0))
+    gravar_plano(conn, linhas_do_plano(ids[manter], demanda[manter], quantidade[manter], estoque_minimo[manter],
+                                       cobertura[manter], sugerido[manter]),
+                 remover=ids.tolist())
+
+    cursor.execute("UPDATE plano_reposicao_estado SET ultimo_seq = ?, calculado_em = ? WHERE id = 1",
+                   (ate_seq, MercPrd3.agora_texto()))
+    conn.commit()
+    return len(ids)
+
+
+def planejar(conn, completo=False, hoje=None):
+    """
+    Atualiza 'plano_reposicao'. Faz o cálculo completo quando pedido, na primeira
+    execução ou quando a janela de vendas mudou (outro dia); senão, o incremental.
+    Retorna (modo, produtos calculados, itens a comprar, segundos).
+    """
+    inicio = time.perf_counter()
+    hoje = hoje or datetime.date.today()
+    cursor = conn.cursor()
+    preparar_tabelas(cursor)
+
+    cursor.execute("SELECT data_referencia, ultimo_seq FROM plano_reposicao_estado WHERE id = 1")
+    estado = cursor.fetchone()
+
+    # O incremental só vale no mesmo dia e se a poda não levou alterações ainda não lidas
+    if completo or not estado or estado[0] != hoje.isoformat() or not MercPrd3.changelog_cobre(cursor, estado[1]):
+        modo, calculados = 'completo', calcular_completo(conn, hoje)
+    else:
+        modo, calculados = 'incremental', calcular_incremental(conn, estado[1])
+
+    cursor.execute("SELECT COUNT(*) FROM plano_reposicao WHERE sugerido > 0")
+    itens = cursor.fetchone()[0]
+    return modo, calculados, itens, time.perf_counter() - inicio
+
+
+def lista_de_compras(cursor):
+    """Gera (id, nome, quantidade, estoque_minimo, demanda_diaria, dias_cobertura, sugerido), do que acaba primeiro."""
+    cursor.execute("""
+        SELECT p.id, p.nome, r.quantidade, r.estoque_minimo, r.demanda_diaria, r.dias_cobertura, r.sugerido
+        FROM plano_reposicao AS r
+        JOIN produtos AS p ON p.id = r.produto_id
+        WHERE r.sugerido > 0
+        ORDER BY r.dias_cobertura
+    """)
+    yield from cursor
+
+
+def exportar_lista_compras(cursor, caminho=None):
+    """Grava a lista de compras em CSV e retorna (caminho do arquivo, quantidade de itens)."""
+    if caminho is None:
+        caminho = f"compras_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+
+    itens = 0
+    with open(caminho, 'w', newline='', encoding='utf-8') as arquivo:
+        escritor = csv.writer(arquivo, delimiter=';')
+        escritor.writerow(['id', 'nome', 'quantidade', 'estoque_minimo', 'demanda_diaria', 'dias_cobertura', 'comprar'])
+        for produto_id, nome, quantidade, estoque_minimo, demanda_diaria, dias_cobertura, sugerido in lista_de_compras(cursor):
+            escritor.writerow([produto_id, nome, quantidade, estoque_minimo, f"{demanda_diaria:.2f}",
+                               '' if dias_cobertura is None else f"{dias_cobertura:.1f}", sugerido])
+            itens += 1
+
+    return caminho, itens
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calcula a lista de compras do MercPrd3 pela média móvel das vendas.")
+    parser.add_argument('--completo', action='store_true', help="recalcula todo o catálogo mesmo que o incremental baste")
+    parser.add_argument('--exportar', metavar='CAMINHO', nargs='?', const='', help="grava a lista de compras em CSV")
+    argumentos = parser.parse_args()
+
+    conn = MercPrd3.conectar()
+    try:
+        modo, calculados, itens, segundos = planejar(conn, argumentos.completo)
+        print(f"Cálculo {modo}: {calculados} produto(s) em {segundos:.2f} s; {itens} item(ns) a comprar.")
+        if argumentos.exportar is not None:
+            caminho, _ = exportar_lista_compras(conn.cursor(), argumentos.exportar or None)
+            print(f"Lista de compras exportada para '{caminho}'.")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
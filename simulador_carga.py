@@ -0,0 +1,475 @@
+"""
+Simulador de carga do MercPrd3.
+
+Sobe N processos ("caixas") que usam o mesmo banco ao mesmo tempo, cada um
+executando sessões completas pelo main() e pelos menus reais do MercPrd3, com
+input e print trocados por uma entrada roteirizada. Mede a latência de cada fluxo
+(fazer_login, cadastrar_produto, visualizar_produtos, editar_produto), os erros de
+bloqueio do banco e a vazão, e grava um relatório em JSON que pode ser comparado
+com o de outra execução.
+
+Exemplos:
+    python simulador_carga.py --terminais 30 --duracao 60 --saida antes.json
+    python simulador_carga.py --terminais 30 --duracao 60 --saida depois.json
+    python simulador_carga.py --comparar antes.json depois.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import time
+
+# Limites superiores (em ms) das faixas do histograma de latência
+FAIXAS_HISTOGRAMA = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+FLUXOS = ['fazer_login', 'cadastrar_produto', 'visualizar_produtos', 'editar_produto']
+
+MIX_PADRAO = 'visualizar=50,cadastrar=20,editar=20,login=10'
+
+SENHA_PADRAO = 'senha1234'
+
+# Quanto esperar, depois do fim da simulação, pelo resultado dos terminais
+PRAZO_ENCERRAMENTO_S = 60
+
+
+class Opcao:
+    """Passo do roteiro que escolhe a opção de menu pelo texto, e não pelo número."""
+
+    def __init__(self, texto):
+        self.texto = texto
+
+
+class EntradaRoteirizada:
+    """
+    Substitui input() e print() do MercPrd3. As respostas vêm de um roteiro; um passo
+    Opcao('Editar produto') procura a linha "N - Editar produto" entre as últimas
+    linhas impressas e responde N. Perguntas de confirmação que só aparecem às vezes
+    são respondidas pelo dicionário 'respostas_automaticas'.
+    """
+
+    respostas_automaticas = {
+        'mesmo assim': 's',
+    }
+
+    def __init__(self, coletor):
+        self.coletor = coletor
+        self.roteiro = []
+        self.linhas = []
+
+    def carregar(self, roteiro):
+        self.roteiro = list(roteiro)
+        self.linhas = []
+
+    def print(self, *args, **kwargs):
+        texto = " ".join(str(arg) for arg in args)
+        for linha in texto.splitlines():
+            self.linhas.append(linha)
+            self.coletor.observar_linha(linha)
+
+    def input(self, prompt=''):
+        for trecho, resposta in self.respostas_automaticas.items():
+            if trecho in prompt:
+                return resposta
+
+        if not self.roteiro:
+            raise EOFError(f"Roteiro terminou antes do fim da sessão (pergunta: {prompt!r})")
+
+        passo = self.roteiro.pop(0)
+        if isinstance(passo, Opcao):
+            for linha in reversed(self.linhas):
+                numero, separador, rotulo = linha.strip().partition(' - ')
+                if separador and numero.isdigit() and rotulo.startswith(passo.texto):
+                    passo = numero
+                    break
+            else:
+                raise EOFError(f"Opção de menu {passo.texto!r} não encontrada")
+
+        self.linhas = []
+        return passo
+
+
+class Coletor:
+    """Guarda as latências de cada fluxo e conta os erros impressos durante cada um."""
+
+    def __init__(self):
+        self.latencias = {fluxo: [] for fluxo in FLUXOS}
+        self.erros = {fluxo: 0 for fluxo in FLUXOS}
+        self.bloqueios = {fluxo: 0 for fluxo in FLUXOS}
+        self.erros_roteiro = 0
+        self.sessoes_interrompidas = {}
+        self.fluxo_atual = None
+        self.inicio_login = None
+
+    def observar_linha(self, linha):
+        if self.fluxo_atual is None or 'Erro' not in linha:
+            return
+        if 'locked' in linha or 'busy' in linha:
+            self.bloqueios[self.fluxo_atual] += 1
+        else:
+            self.erros[self.fluxo_atual] += 1
+
+    def medir(self, fluxo, funcao):
+        """Envolve 'funcao' para medir o tempo do fluxo; chamadas aninhadas contam só no fluxo externo."""
+        def medida(*args, **kwargs):
+            if self.fluxo_atual is not None:
+                return funcao(*args, **kwargs)
+            self.fluxo_atual = fluxo
+            inicio = time.perf_counter()
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                self.latencias[fluxo].append((time.perf_counter() - inicio) * 1000)
+                self.fluxo_atual = None
+        return medida
+
+    def medir_login(self, fazer_login):
+        """O login termina quando o menu do usuário ou do administrador é aberto."""
+        def medida(*args, **kwargs):
+            self.fluxo_atual = 'fazer_login'
+            self.inicio_login = time.perf_counter()
+            try:
+                return fazer_login(*args, **kwargs)
+            finally:
+                if self.inicio_login is not None:
+                    self.registrar_fim_login()
+        return medida
+
+    def registrar_fim_login(self):
+        self.latencias['fazer_login'].append((time.perf_counter() - self.inicio_login) * 1000)
+        self.inicio_login = None
+        self.fluxo_atual = None
+
+    def medir_menu(self, menu):
+        def medida(*args, **kwargs):
+            if self.inicio_login is not None:
+                self.registrar_fim_login()
+            return menu(*args, **kwargs)
+        return medida
+
+
+def ler_mix(texto):
+    """Converte 'visualizar=50,cadastrar=20' em {'visualizar': 50, 'cadastrar': 20}."""
+    mix = {}
+    for item in texto.split(','):
+        nome, _, peso = item.partition('=')
+        mix[nome.strip()] = float(peso)
+    desconhecidos = set(mix) - {'login', 'cadastrar', 'visualizar', 'editar'}
+    if desconhecidos:
+        raise ValueError(f"Operações desconhecidas no mix: {', '.join(sorted(desconhecidos))}")
+    return mix
+
+
+def roteiro_da_sessao(operacao, terminal, contador, configuracao, sorteio):
+    """Monta as respostas de uma sessão completa: login, a operação, logout e saída do sistema."""
+    usuario = f"caixa{terminal}"
+    produto_id = str(sorteio.randint(1, configuracao['produtos']))
+
+    if operacao == 'login':
+        return ['1', usuario, SENHA_PADRAO, Opcao('Sair'), Opcao('Sair')]
+
+    if operacao == 'visualizar':
+        return ['1', usuario, SENHA_PADRAO, Opcao('Visualizar produtos'), Opcao('Sair'), Opcao('Sair')]
+
+    if operacao == 'cadastrar':
+        nome = f"Produto carga {terminal}-{contador}-{sorteio.randint(0, 10 ** 9)}"
+        return ['1', usuario, SENHA_PADRAO, Opcao('Cadastrar produto'),
+                nome, f"{sorteio.uniform(1, 100):.2f}", str(sorteio.randint(0, 500)), '', '',
+                Opcao('Sair'), Opcao('Sair')]
+
+    # 'editar' só existe no menu do administrador
+    return ['1', 'gerente', SENHA_PADRAO, Opcao('Gerenciar Produtos'), Opcao('Editar produto'),
+            produto_id, '', f"{sorteio.uniform(1, 100):.2f}", str(sorteio.randint(0, 500)), '', '',
+            Opcao('Voltar'), Opcao('Sair'), Opcao('Sair')]
+
+
+def executar_terminal(terminal, configuracao, fila):
+    """
+    Processo de um caixa: roda sessões até o fim do tempo e devolve as medições pela fila.
+    Uma exceção em uma sessão só interrompe aquela sessão; o resultado é enviado mesmo
+    que o terminal não consiga nem começar.
+    """
+    coletor = Coletor()
+    sessoes = 0
+    falha = None
+    try:
+        sessoes = rodar_sessoes(terminal, configuracao, coletor)
+    except Exception as e:
+        falha = f"{type(e).__name__}: {e}"
+    finally:
+        fila.put({
+            'terminal': terminal,
+            'sessoes': sessoes,
+            'latencias': coletor.latencias,
+            'erros': coletor.erros,
+            'bloqueios': coletor.bloqueios,
+            'erros_roteiro': coletor.erros_roteiro,
+            'sessoes_interrompidas': coletor.sessoes_interrompidas,
+            'falha': falha,
+        })
+
+
+def rodar_sessoes(terminal, configuracao, coletor):
+    """Troca input/print do MercPrd3 pela entrada roteirizada e roda sessões até o fim do tempo."""
+    os.chdir(configuracao['diretorio'])
+    sys.path.insert(0, configuracao['codigo'])
+    import MercPrd3
+
+    # Os terminais são processos separados, então precisam dividir o mesmo arquivo
+    MercPrd3.configurar_armazenamento('mercprd.db', 'disco')
+
+    entrada = EntradaRoteirizada(coletor)
+    MercPrd3.input = entrada.input
+    MercPrd3.print = entrada.print
+    MercPrd3.fazer_login = coletor.medir_login(MercPrd3.fazer_login)
+    MercPrd3.menu_usuario = coletor.medir_menu(MercPrd3.menu_usuario)
+    MercPrd3.menu_admin = coletor.medir_menu(MercPrd3.menu_admin)
+    for fluxo in ('cadastrar_produto', 'visualizar_produtos', 'editar_produto'):
+        setattr(MercPrd3, fluxo, coletor.medir(fluxo, getattr(MercPrd3, fluxo)))
+
+    sorteio = random.Random(configuracao['semente'] + terminal)
+    operacoes = list(configuracao['mix'])
+    pesos = [configuracao['mix'][operacao] for operacao in operacoes]
+    fim = time.monotonic() + configuracao['duracao']
+    sessoes = 0
+
+    while time.monotonic() < fim:
+        operacao = sorteio.choices(operacoes, weights=pesos)[0]
+        entrada.carregar(roteiro_da_sessao(operacao, terminal, sessoes, configuracao, sorteio))
+        try:
+            MercPrd3.main()
+        except EOFError:
+            coletor.erros_roteiro += 1
+        except Exception as e:
+            # Ex.: sqlite3.OperationalError fora dos blocos try do MercPrd3
+            tipo = f"{type(e).__name__}: {e}"
+            coletor.sessoes_interrompidas[tipo] = coletor.sessoes_interrompidas.get(tipo, 0) + 1
+        coletor.fluxo_atual = None
+        coletor.inicio_login = None
+        sessoes += 1
+
+        if configuracao['pensar'] > 0:
+            time.sleep(sorteio.expovariate(1 / configuracao['pensar']))
+
+    return sessoes
+
+
+def coletar_resultados(fila, processos, prazo):
+    """
+    Lê um resultado por terminal. Não espera para sempre: para quando passa o prazo ou
+    quando nenhum processo está vivo e a fila ficou vazia.
+    """
+    resultados = []
+    limite = time.monotonic() + prazo
+    while len(resultados) < len(processos):
+        try:
+            resultados.append(fila.get(timeout=1))
+            continue
+        except queue.Empty:
+            pass
+        if time.monotonic() > limite or not any(processo.is_alive() for processo in processos):
+            break
+    return resultados
+
+
+def preparar_banco(configuracao):
+    """Cria o banco de teste com um caixa por terminal, um administrador e o catálogo inicial."""
+    os.makedirs(configuracao['diretorio'], exist_ok=True)
+    os.chdir(configuracao['diretorio'])
+    if os.path.exists('mercprd.db') and not configuracao['manter_banco']:
+        os.remove('mercprd.db')
+
+    sys.path.insert(0, configuracao['codigo'])
+    import MercPrd3
+
+    MercPrd3.configurar_armazenamento('mercprd.db', 'disco')
+    with contextlib.redirect_stdout(io.StringIO()):
+        MercPrd3.criar_banco_de_dados()
+
+    conn = MercPrd3.conectar()
+    cursor = conn.cursor()
+    cursor.execute("INSERT OR IGNORE INTO usuarios (username, password, is_admin) VALUES (?, ?, 1)", ('gerente', SENHA_PADRAO))
+    cursor.executemany(
+        "INSERT OR IGNORE INTO usuarios (username, password, is_admin) VALUES (?, ?, 0)",
+        [(f"caixa{terminal}", SENHA_PADRAO) for terminal in range(configuracao['terminais'])]
+    )
+
+    cursor.execute("SELECT COUNT(*) FROM produtos")
+    existentes = cursor.fetchone()[0]
+    sorteio = random.Random(configuracao['semente'])
+    for numero in range(existentes, configuracao['produtos']):
+        nome = f"Produto {numero} lote {sorteio.randint(0, 10 ** 6)}"
+        cursor.execute("INSERT INTO produtos (nome, preco, quantidade) VALUES (?, ?, ?)",
+                       (nome, round(sorteio.uniform(1, 100), 2), sorteio.randint(0, 500)))
+        MercPrd3.indexar_trigramas(cursor, cursor.lastrowid, nome)
+    conn.commit()
+    conn.close()
+
+
+def percentil(valores_ordenados, fracao):
+    if not valores_ordenados:
+        return None
+    posicao = min(len(valores_ordenados) - 1, int(round(fracao * (len(valores_ordenados) - 1))))
+    return valores_ordenados[posicao]
+
+
+def histograma(valores):
+    contagem = [0] * (len(FAIXAS_HISTOGRAMA) + 1)
+    for valor in valores:
+        for posicao, limite in enumerate(FAIXAS_HISTOGRAMA):
+            if valor <= limite:
+                contagem[posicao] += 1
+                break
+        else:
+            contagem[-1] += 1
+    rotulos = [f"<={limite}ms" for limite in FAIXAS_HISTOGRAMA] + [f">{FAIXAS_HISTOGRAMA[-1]}ms"]
+    return dict(zip(rotulos, contagem))
+
+
+def montar_relatorio(configuracao, resultados, duracao_real):
+    relatorio = {
+        'configuracao': {chave: valor for chave, valor in configuracao.items() if chave != 'codigo'},
+        'duracao_s': round(duracao_real, 3),
+        'sessoes': sum(resultado['sessoes'] for resultado in resultados),
+        'erros_roteiro': sum(resultado['erros_roteiro'] for resultado in resultados),
+        'sessoes_interrompidas': {},
+        'terminais_com_falha': {resultado['terminal']: resultado['falha'] for resultado in resultados if resultado['falha']},
+        'terminais_sem_resultado': sorted(set(range(configuracao['terminais'])) - {resultado['terminal'] for resultado in resultados}),
+        'fluxos': {},
+    }
+    for resultado in resultados:
+        for tipo, quantidade in resultado['sessoes_interrompidas'].items():
+            relatorio['sessoes_interrompidas'][tipo] = relatorio['sessoes_interrompidas'].get(tipo, 0) + quantidade
+
+    for fluxo in FLUXOS:
+        valores = sorted(latencia for resultado in resultados for latencia in resultado['latencias'][fluxo])
+        bloqueios = sum(resultado['bloqueios'][fluxo] for resultado in resultados)
+        erros = sum(resultado['erros'][fluxo] for resultado in resultados)
+        relatorio['fluxos'][fluxo] = {
+            'execucoes': len(valores),
+            'vazao_por_s': round(len(valores) / duracao_real, 2) if duracao_real else 0,
+            'media_ms': round(sum(valores) / len(valores), 3) if valores else None,
+            'p50_ms': percentil(valores, 0.50),
+            'p95_ms': percentil(valores, 0.95),
+            'p99_ms': percentil(valores, 0.99),
+            'max_ms': valores[-1] if valores else None,
+            'erros_bloqueio': bloqueios,
+            'taxa_bloqueio': round(bloqueios / len(valores), 4) if valores else 0,
+            'outros_erros': erros,
+            'histograma': histograma(valores),
+        }
+
+    return relatorio
+
+
+def formatar_ms(valor):
+    return "-" if valor is None else f"{valor:.1f}"
+
+
+def exibir_relatorio(relatorio):
+    print(f"\nSessões: {relatorio['sessoes']} em {relatorio['duracao_s']:.1f}s"
+          f" | Erros de roteiro: {relatorio['erros_roteiro']}"
+          f" | Sessões interrompidas: {sum(relatorio['sessoes_interrompidas'].values())}")
+    for tipo, quantidade in relatorio['sessoes_interrompidas'].items():
+        print(f"  {quantidade}x {tipo}")
+    for terminal, falha in relatorio['terminais_com_falha'].items():
+        print(f"Terminal {terminal} parou: {falha}")
+    if relatorio['terminais_sem_resultado']:
+        print(f"Terminais sem resultado: {', '.join(map(str, relatorio['terminais_sem_resultado']))}")
+    print(f"{'Fluxo':<22}{'exec':>8}{'op/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'bloq.':>8}")
+    for fluxo, dados in relatorio['fluxos'].items():
+        print(f"{fluxo:<22}{dados['execucoes']:>8}{dados['vazao_por_s']:>9.1f}"
+              f"{formatar_ms(dados['p50_ms']):>9}{formatar_ms(dados['p95_ms']):>9}"
+              f"{formatar_ms(dados['p99_ms']):>9}{formatar_ms(dados['max_ms']):>9}{dados['erros_bloqueio']:>8}")
+
+
+def comparar_relatorios(caminho_base, caminho_novo):
+    """Mostra, por fluxo, a variação de vazão, p50, p99 e taxa de bloqueio entre duas execuções."""
+    with open(caminho_base, encoding='utf-8') as arquivo:
+        base = json.load(arquivo)
+    with open(caminho_novo, encoding='utf-8') as arquivo:
+        novo = json.load(arquivo)
+
+    def variacao(antes, depois):
+        if antes in (None, 0) or depois is None:
+            return "-"
+        return f"{(depois - antes) / antes:+.1%}"
+
+    print(f"\nComparação: {caminho_base} -> {caminho_novo}")
+    print(f"{'Fluxo':<22}{'op/s':>10}{'p50':>10}{'p99':>10}{'bloq. antes':>13}{'bloq. depois':>14}")
+    for fluxo in FLUXOS:
+        antes = base['fluxos'].get(fluxo, {})
+        depois = novo['fluxos'].get(fluxo, {})
+        print(f"{fluxo:<22}"
+              f"{variacao(antes.get('vazao_por_s'), depois.get('vazao_por_s')):>10}"
+              f"{variacao(antes.get('p50_ms'), depois.get('p50_ms')):>10}"
+              f"{variacao(antes.get('p99_ms'), depois.get('p99_ms')):>10}"
+              f"{antes.get('taxa_bloqueio', 0):>13.2%}{depois.get('taxa_bloqueio', 0):>14.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simula vários caixas usando o MercPrd3 ao mesmo tempo.")
+    parser.add_argument('--terminais', type=int, default=30, help="quantidade de processos simultâneos")
+    parser.add_argument('--duracao', type=float, default=30, help="duração da simulação em segundos")
+    parser.add_argument('--mix', default=MIX_PADRAO, help=f"peso de cada operação (padrão: {MIX_PADRAO})")
+    parser.add_argument('--pensar', type=float, default=0.2, help="tempo médio de espera entre sessões, em segundos")
+    parser.add_argument('--produtos', type=int, default=2000, help="tamanho do catálogo inicial")
+    parser.add_argument('--diretorio', default='carga_mercprd', help="onde criar o banco da simulação")
+    parser.add_argument('--manter-banco', action='store_true', help="reaproveita o banco da simulação anterior")
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', help="arquivo JSON para gravar o relatório")
+    parser.add_argument('--comparar', nargs=2, metavar=('BASE', 'NOVO'), help="compara dois relatórios e sai")
+    argumentos = parser.parse_args()
+
+    if argumentos.comparar:
+        comparar_relatorios(*argumentos.comparar)
+        return
+
+    configuracao = {
+        'terminais': argumentos.terminais,
+        'duracao': argumentos.duracao,
+        'mix': ler_mix(argumentos.mix),
+        'pensar': argumentos.pensar,
+        'produtos': argumentos.produtos,
+        'diretorio': os.path.abspath(argumentos.diretorio),
+        'manter_banco': argumentos.manter_banco,
+        'semente': argumentos.semente,
+        'codigo': os.path.dirname(os.path.abspath(__file__)),
+    }
+
+    preparar_banco(configuracao)
+    print(f"Banco preparado em '{configuracao['diretorio']}'. Iniciando {configuracao['terminais']} terminais...")
+
+    contexto = multiprocessing.get_context('spawn')
+    fila = contexto.Queue()
+    processos = [
+        contexto.Process(target=executar_terminal, args=(terminal, configuracao, fila))
+        for terminal in range(configuracao['terminais'])
+    ]
+
+    inicio = time.monotonic()
+    for processo in processos:
+        processo.start()
+    resultados = coletar_resultados(fila, processos, configuracao['duracao'] + PRAZO_ENCERRAMENTO_S)
+    for processo in processos:
+        processo.join(timeout=1)
+        if processo.is_alive():
+            processo.terminate()
+            processo.join()
+    duracao_real = time.monotonic() - inicio
+
+    relatorio = montar_relatorio(configuracao, resultados, duracao_real)
+    exibir_relatorio(relatorio)
+
+    if argumentos.saida:
+        with open(argumentos.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+        print(f"\nRelatório gravado em '{argumentos.saida}'.")
+
+
+if __name__ == "__main__":
+    main()
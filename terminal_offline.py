@@ -0,0 +1,680 @@
+"""
+Modo offline do MercPrd3: cada terminal trabalha sobre uma réplica local.
+
+Com MERCPRD_MOTOR=offline o terminal abre só o arquivo local (MERCPRD_REPLICA), que
+tem o mesmo esquema do banco central (MERCPRD_DB) e uma cópia de 'produtos',
+'usuarios' e da árvore de categorias. Leituras e escritas nunca esperam pelo central. Toda escrita local em
+'produtos', 'usuarios' e 'vendas' é registrada por gatilhos na tabela 'diario'.
+
+Uma thread de sincronização, a cada INTERVALO_SINCRONIZACAO segundos:
+  - envia o diário ao central em lotes, cada lote em uma transação. A quantidade em
+    estoque vai como diferença (quantidade = quantidade + delta), para que as vendas
+    de vários caixas se somem. Nos demais campos vale o último que sincronizou, e só
+    os campos que o terminal realmente mudou são enviados. Produtos criados no
+    terminal recebem um ID a partir de BASE_ID_LOCAL e ganham o ID definitivo do
+    central quando são enviados;
+  - copia a árvore de categorias, que na réplica é só de leitura: categorias só são
+    criadas, renomeadas e excluídas no central;
+  - recebe do changelog do central o que os outros terminais mudaram. O changelog não
+    leva a senha, então as contas alteradas são lidas do central pela chave. Enquanto
+    um produto tem alterações locais ainda não enviadas, a quantidade local é a do
+    central somada a essas diferenças.
+
+O central guarda o último lote aplicado de cada terminal ('diarios_aplicados') e os
+IDs definitivos dos produtos criados nos terminais ('mapa_ids_terminais'), na mesma
+transação do lote. Se o terminal cair depois de enviar e antes de limpar o diário,
+nada é aplicado duas vezes.
+
+Lotes e validade ficam só no central, e a réplica recusa a entrada de lotes. Uma venda
+feita no terminal baixa o estoque da réplica, mas essa baixa não vai ao central como
+diferença: a venda vai como intenção (produto, quantidade, momento) e o central a refaz
+com MercPrd3.retirar_estoque_fefo(), tirando dos lotes que vencem primeiro. Uma venda
+que já aconteceu nunca é recusada; se faltar estoque vendável no central, o resto sai
+dos lotes vencidos e o estoque para no zero.
+
+Uso:
+    MERCPRD_MOTOR=offline MERCPRD_DB=/mnt/loja/mercprd.db MERCPRD_REPLICA=caixa1.db python MercPrd3.py
+    python terminal_offline.py --central mercprd.db --local caixa1.db --sincronizar
+"""
+import argparse
+import atexit
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+
+import MercPrd3
+
+# --- Configurações (podem vir de variáveis de ambiente) ---
+
+CAMINHO_REPLICA = os.environ.get('MERCPRD_REPLICA', 'mercprd_local.db')       # Arquivo da réplica local
+INTERVALO_SINCRONIZACAO = int(os.environ.get('MERCPRD_SYNC_S', '5'))          # Segundos entre sincronizações
+
+ESPERA_MAXIMA = 60             # Maior intervalo entre tentativas quando o central não responde
+TEMPO_LIMITE_CENTRAL = 5       # Segundos de espera por uma trava no banco central
+ESPERA_CARGA_INICIAL = 30      # Quanto a primeira abertura de um terminal espera pela carga inicial
+TAMANHO_LOTE_DIARIO = 500      # Entradas do diário enviadas por transação
+BASE_ID_LOCAL = 10 ** 12       # IDs de produtos criados no terminal, até receberem o ID do central
+
+# Tabelas locais que referenciam o ID do produto e acompanham a troca de ID
+TABELAS_COM_PRODUTO = ('trigramas_produtos', 'historico_precos', 'alertas_estoque', 'lotes', 'vendas')
+
+# Tabelas registradas no diário e a chave de cada uma
+TABELAS_DO_DIARIO = {'produtos': 'id', 'usuarios': 'username'}
+
+
+def colunas(conn, tabela):
+    return [coluna[1] for coluna in conn.execute(f"PRAGMA table_info({tabela})")]
+
+
+def json_da_linha(prefixo, campos):
+    """Expressão SQL que monta o JSON de NEW ou OLD com os 'campos' (NULL sem prefixo)."""
+    if prefixo is None:
+        return "NULL"
+    return f"json_object({', '.join(f'{campo!r}, {prefixo}.{campo}' for campo in campos)})"
+
+
+def consumidor(terminal):
+    """Nome do terminal na tabela de consumidores do changelog do central."""
+    return f"terminal_{terminal}"
+
+
+def preparar_replica(conn):
+    """
+    Cria na réplica o diário, o estado da réplica e os gatilhos do diário. Os gatilhos
+    são recriados a cada abertura, com as colunas atuais das tabelas, e ficam desligados
+    enquanto 'replica_estado.aplicando' vale 1 (dados que vieram do central).
+    """
+    # Leitores nunca esperam pela thread de sincronização
+    conn.execute("PRAGMA journal_mode = WAL")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS replica_estado (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            terminal TEXT NOT NULL,
+            aplicando INTEGER NOT NULL DEFAULT 0,
+            carregada INTEGER NOT NULL DEFAULT 0
+        );
+    """)
+    conn.execute("INSERT OR IGNORE INTO replica_estado (id, terminal) VALUES (1, ?)", (uuid.uuid4().hex[:12],))
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS diario (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tabela TEXT NOT NULL,
+            operacao TEXT NOT NULL CHECK (operacao IN ('I', 'U', 'D')),
+            chave TEXT NOT NULL,
+            antes TEXT,
+            depois TEXT,
+            momento TEXT NOT NULL
+        );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_diario_chave ON diario (tabela, chave);")
+    # Vendas ainda não enviadas de um produto (estoque pendente e troca de ID)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_diario_venda_produto ON diario (json_extract(depois, '$.produto_id')) WHERE tabela = 'vendas';")
+
+    # Produtos criados no terminal ficam em uma faixa de IDs que o central não usa
+    sequencia = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'produtos'").fetchone()
+    if sequencia is None:
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('produtos', ?)", (BASE_ID_LOCAL,))
+    elif sequencia[0] < BASE_ID_LOCAL:
+        conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'produtos'", (BASE_ID_LOCAL,))
+
+    eventos = (('insercao', 'INSERT', 'I', None, 'NEW'), ('alteracao', 'UPDATE', 'U', 'OLD', 'NEW'), ('exclusao', 'DELETE', 'D', 'OLD', None))
+    for tabela, chave in list(TABELAS_DO_DIARIO.items()) + [('vendas', 'id')]:
+        campos = colunas(conn, tabela)
+        for nome, evento, operacao, antes, depois in eventos:
+            if tabela == 'vendas' and operacao != 'I':
+                continue
+            conn.execute(f"DROP TRIGGER IF EXISTS trg_diario_{tabela}_{nome}")
+            conn.execute(f"""
+                CREATE TRIGGER trg_diario_{tabela}_{nome} AFTER {evento} ON {tabela}
+                WHEN (SELECT aplicando FROM replica_estado) = 0
+                BEGIN
+                    INSERT INTO diario (tabela, operacao, chave, antes, depois, momento)
+                    VALUES ('{tabela}', '{operacao}', {depois or antes}.{chave}, {json_da_linha(antes, campos)}, {json_da_linha(depois, campos)},
+                            strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'));
+                END;
+            """)
+
+    # A venda baixou 'produtos.quantidade' na réplica logo antes de gravar a linha de
+    # 'vendas', na mesma transação. Essa baixa sai da entrada do produto no diário: o
+    # central recebe só a intenção de venda e faz a baixa pelos lotes.
+    baixa_existia = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_diario_vendas_baixa'"
+    ).fetchone() is not None
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_diario_vendas_baixa AFTER INSERT ON vendas
+        WHEN (SELECT aplicando FROM replica_estado) = 0
+        BEGIN
+            UPDATE diario SET depois = json_set(depois, '$.quantidade', json_extract(depois, '$.quantidade') + NEW.quantidade)
+            WHERE id = (SELECT MAX(id) FROM diario WHERE tabela = 'produtos' AND chave = CAST(NEW.produto_id AS TEXT) AND operacao = 'U');
+        END;
+    """)
+    if not baixa_existia:
+        # Réplica de uma versão que enviava a baixa junto com o produto: as vendas que
+        # ainda estão no diário são acertadas uma vez, como o gatilho faria
+        vendas = conn.execute(
+            "SELECT id, json_extract(depois, '$.produto_id'), json_extract(depois, '$.quantidade') FROM diario WHERE tabela = 'vendas'"
+        ).fetchall()
+        for entrada_id, produto_id, quantidade in vendas:
+            conn.execute("""
+                UPDATE diario SET depois = json_set(depois, '$.quantidade', json_extract(depois, '$.quantidade') + ?)
+                WHERE id = (SELECT MAX(id) FROM diario WHERE tabela = 'produtos' AND chave = ? AND operacao = 'U' AND id < ?)
+            """, (quantidade, str(produto_id), entrada_id))
+
+    # Lotes só entram pelo central; a réplica não tem os lotes do central para conferir
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_replica_lotes_insercao BEFORE INSERT ON lotes
+        BEGIN
+            SELECT RAISE(ABORT, 'Lotes só podem ser registrados no banco central');
+        END;
+    """)
+    # A árvore de categorias só muda pelo que vem do central (veja receber_categorias)
+    for nome, evento in (('insercao', 'INSERT'), ('alteracao', 'UPDATE'), ('exclusao', 'DELETE')):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_replica_categorias_{nome} BEFORE {evento} ON categorias
+            WHEN (SELECT aplicando FROM replica_estado) = 0
+            BEGIN
+                SELECT RAISE(ABORT, 'Categorias só podem ser alteradas no banco central');
+            END;
+        """)
+    conn.commit()
+
+
+def preparar_central(central):
+    """Cria no central o controle dos lotes já aplicados e dos IDs dados aos produtos dos terminais."""
+    central.execute("""
+        CREATE TABLE IF NOT EXISTS diarios_aplicados (
+            terminal TEXT PRIMARY KEY,
+            ultimo_id INTEGER NOT NULL
+        );
+    """)
+    central.execute("""
+        CREATE TABLE IF NOT EXISTS mapa_ids_terminais (
+            terminal TEXT NOT NULL,
+            id_local INTEGER NOT NULL,
+            id_central INTEGER NOT NULL,
+            PRIMARY KEY (terminal, id_local)
+        ) WITHOUT ROWID;
+    """)
+    central.commit()
+
+
+@contextlib.contextmanager
+def aplicando(local):
+    """Transação local com os gatilhos do diário desligados, para gravar o que veio do central."""
+    local.execute("BEGIN IMMEDIATE")
+    try:
+        local.execute("UPDATE replica_estado SET aplicando = 1")
+        yield local
+        local.execute("UPDATE replica_estado SET aplicando = 0")
+        local.commit()
+    except BaseException:
+        local.rollback()
+        raise
+
+
+def gravar_linha(conn, tabela, chave, linha):
+    """Insere ou atualiza uma linha pela chave, só com as colunas que a tabela local tem."""
+    campos = [campo for campo in colunas(conn, tabela) if campo in linha]
+    atualizar = ", ".join(f"{campo} = excluded.{campo}" for campo in campos if campo != chave)
+    conn.execute(
+        f"INSERT INTO {tabela} ({', '.join(campos)}) VALUES ({', '.join('?' * len(campos))}) "
+        f"ON CONFLICT({chave}) DO UPDATE SET {atualizar}",
+        [linha[campo] for campo in campos]
+    )
+
+
+def receber_categorias(local, central):
+    """
+    Copia a árvore de categorias do central para a réplica. A árvore é pequena, então é
+    lida inteira a cada rodada e só as diferenças são gravadas. Quando ela muda, os
+    totais das categorias da réplica são recalculados pelos produtos da réplica (um
+    produto pode ter chegado antes da sua categoria). Retorna as categorias alteradas.
+    """
+    campos = "id, nome, pai_id, nivel"
+    do_central = {linha[0]: linha for linha in central.execute(f"SELECT {campos} FROM categorias")}
+    locais = {linha[0]: linha for linha in local.execute(f"SELECT {campos} FROM categorias")}
+    if do_central == locais:
+        return 0
+
+    # Categorias só são criadas, renomeadas e excluídas (nunca mudam de pai) e os IDs não
+    # se repetem; as excluídas saem da mais funda para o topo, as novas entram do topo
+    with aplicando(local):
+        for categoria_id, _, _, _ in sorted(locais.values(), key=lambda linha: linha[3], reverse=True):
+            if categoria_id not in do_central:
+                local.execute("DELETE FROM categorias WHERE id = ?", (categoria_id,))
+        for linha in sorted(do_central.values(), key=lambda linha: linha[3]):
+            if linha[0] not in locais:
+                local.execute(f"INSERT INTO categorias ({campos}) VALUES (?, ?, ?, ?)", linha)
+            elif locais[linha[0]] != linha:
+                local.execute("UPDATE categorias SET nome = ? WHERE id = ?", (linha[1], linha[0]))
+        local.execute("""
+            UPDATE categorias_totais SET (produtos, quantidade, valor_estoque) = (
+                SELECT COUNT(*), COALESCE(SUM(p.quantidade), 0), COALESCE(SUM(p.quantidade * p.preco), 0)
+                FROM categorias_fechamento AS f
+                JOIN produtos AS p ON p.categoria_id = f.descendente_id
+                WHERE f.ancestral_id = categorias_totais.categoria_id AND p.deleted_at IS NULL
+            )
+        """)
+    return (sum(1 for categoria_id in locais if categoria_id not in do_central)
+            + sum(1 for categoria_id, linha in do_central.items() if locais.get(categoria_id) != linha))
+
+
+def carga_inicial(local, central, terminal):
+    """Copia a árvore de categorias, 'produtos' e 'usuarios' do central para a réplica e registra o terminal no changelog."""
+    cursor_central = central.cursor()
+    # O consumidor é registrado antes da cópia: o que mudar durante ela é recebido depois
+    cursor_central.execute("SELECT COALESCE(MAX(seq), 0) FROM changelog")
+    MercPrd3.registrar_consumidor(cursor_central, consumidor(terminal), cursor_central.fetchone()[0])
+    receber_categorias(local, central)
+
+    campos_produtos = [campo for campo in colunas(central, 'produtos') if campo in colunas(local, 'produtos')]
+    campos_usuarios = [campo for campo in colunas(central, 'usuarios') if campo in colunas(local, 'usuarios')]
+    with aplicando(local):
+        ultimo_id = 0
+        while True:
+            cursor_central.execute(
+                f"SELECT {', '.join(campos_produtos)} FROM produtos WHERE id > ? ORDER BY id LIMIT ?",
+                (ultimo_id, TAMANHO_LOTE_DIARIO)
+            )
+            linhas = cursor_central.fetchall()
+            if not linhas:
+                break
+            for valores in linhas:
+                produto = dict(zip(campos_produtos, valores))
+                gravar_linha(local, 'produtos', 'id', produto)
+                MercPrd3.indexar_trigramas(local.cursor(), produto['id'], produto['nome'])
+            ultimo_id = linhas[-1][0]
+
+        cursor_central.execute(f"SELECT {', '.join(campos_usuarios)} FROM usuarios")
+        for valores in cursor_central.fetchall():
+            gravar_linha(local, 'usuarios', 'username', dict(zip(campos_usuarios, valores)))
+
+        local.execute("UPDATE replica_estado SET carregada = 1")
+
+
+def id_no_central(chave, mapa):
+    produto_id = int(chave)
+    return mapa.get(produto_id, produto_id)
+
+
+def campos_alterados(antes, depois, ignorar):
+    """Campos que a escrita local realmente mudou (os demais não são enviados)."""
+    return {campo: valor for campo, valor in depois.items() if campo not in ignorar and antes.get(campo) != valor}
+
+
+def categoria_existe(cursor, categoria_id):
+    """Se a categoria ainda existe no central (ela pode ter sido excluída enquanto o terminal estava offline)."""
+    if categoria_id is None:
+        return True
+    cursor.execute("SELECT 1 FROM categorias WHERE id = ?", (categoria_id,))
+    return cursor.fetchone() is not None
+
+
+def aplicar_no_central(cursor, terminal, tabela, operacao, chave, antes, depois, mapa):
+    """
+    Aplica uma entrada do diário no central. Retorna o nome da conta a recarregar do
+    central quando a conta criada no terminal já existia lá, ou None.
+    """
+    if tabela == 'produtos':
+        if operacao == 'I':
+            if not categoria_existe(cursor, depois.get('categoria_id')):
+                depois['categoria_id'] = None
+            campos = [campo for campo in depois if campo != 'id']
+            cursor.execute(
+                f"INSERT INTO produtos ({', '.join(campos)}) VALUES ({', '.join('?' * len(campos))})",
+                [depois[campo] for campo in campos]
+            )
+            novo_id = cursor.lastrowid
+            cursor.execute("INSERT INTO mapa_ids_terminais (terminal, id_local, id_central) VALUES (?, ?, ?)",
+                           (terminal, int(chave), novo_id))
+            MercPrd3.indexar_trigramas(cursor, novo_id, depois['nome'])
+            mapa[int(chave)] = novo_id
+        elif operacao == 'U':
+            produto_id = id_no_central(chave, mapa)
+            alterados = campos_alterados(antes, depois, ('id', 'quantidade'))
+            if 'categoria_id' in alterados and not categoria_existe(cursor, alterados['categoria_id']):
+                # A categoria escolhida no terminal não existe mais: o produto fica na do central
+                del alterados['categoria_id']
+            delta = depois['quantidade'] - antes['quantidade']
+            # A diferença não leva a quantidade abaixo do saldo dos lotes do central (o
+            # gatilho do central recusaria o lote inteiro do diário)
+            soma = "quantidade = MAX(quantidade + ?, (SELECT COALESCE(SUM(quantidade), 0) FROM lotes WHERE produto_id = produtos.id))"
+            atribuicoes = [f"{campo} = ?" for campo in alterados] + ([soma] if delta else [])
+            if atribuicoes:
+                cursor.execute(f"UPDATE produtos SET {', '.join(atribuicoes)} WHERE id = ?",
+                               list(alterados.values()) + ([delta] if delta else []) + [produto_id])
+                if 'nome' in alterados and cursor.rowcount:
+                    MercPrd3.indexar_trigramas(cursor, produto_id, alterados['nome'])
+        else:
+            # Só o expurgo apaga de vez; no central a linha só sai se lá ela também estiver excluída
+            cursor.execute("DELETE FROM produtos WHERE id = ? AND deleted_at IS NOT NULL", (id_no_central(chave, mapa),))
+
+    elif tabela == 'usuarios':
+        if operacao == 'I':
+            campos = list(depois)
+            cursor.execute(
+                f"INSERT INTO usuarios ({', '.join(campos)}) VALUES ({', '.join('?' * len(campos))}) "
+                "ON CONFLICT(username) DO NOTHING",
+                [depois[campo] for campo in campos]
+            )
+            if cursor.rowcount == 0:
+                return chave
+        elif operacao == 'U':
+            alterados = campos_alterados(antes, depois, ('username',))
+            if alterados:
+                cursor.execute(f"UPDATE usuarios SET {', '.join(f'{campo} = ?' for campo in alterados)} WHERE username = ?",
+                               list(alterados.values()) + [chave])
+        else:
+            cursor.execute("DELETE FROM usuarios WHERE username = ? AND deleted_at IS NOT NULL", (chave,))
+
+    elif tabela == 'vendas':
+        # Intenção de venda: o central faz a baixa pelos lotes, na data em que a venda aconteceu
+        MercPrd3.retirar_estoque_fefo(cursor.connection, id_no_central(depois['produto_id'], mapa),
+                                      depois['quantidade'], depois['momento'], ja_vendida=True)
+    return None
+
+
+def trocar_id_produto(local, antigo, novo):
+    """Troca na réplica o ID provisório de um produto pelo ID que ele recebeu no central."""
+    local.execute("DELETE FROM produtos WHERE id = ?", (novo,))
+    local.execute("UPDATE produtos SET id = ? WHERE id = ?", (novo, antigo))
+    for tabela in TABELAS_COM_PRODUTO:
+        local.execute(f"UPDATE {tabela} SET produto_id = ? WHERE produto_id = ?", (novo, antigo))
+    local.execute("UPDATE diario SET chave = ? WHERE tabela = 'produtos' AND chave = ?", (str(novo), str(antigo)))
+    local.execute("""
+        UPDATE diario SET depois = json_set(depois, '$.produto_id', ?)
+        WHERE tabela = 'vendas' AND json_extract(depois, '$.produto_id') = ?
+    """, (novo, antigo))
+
+
+def conta_do_central(cursor, username):
+    """Linha completa de uma conta no central (com a senha, que o changelog não leva), ou None."""
+    cursor.execute("SELECT username, password, is_admin, deleted_at FROM usuarios WHERE username = ?", (username,))
+    linha = cursor.fetchone()
+    return dict(zip(('username', 'password', 'is_admin', 'deleted_at'), linha)) if linha else None
+
+
+def enviar_diario(local, central, terminal):
+    """Envia o diário ao central em lotes, cada um em uma transação. Retorna as entradas enviadas."""
+    cursor_central = central.cursor()
+    cursor_central.execute("SELECT ultimo_id FROM diarios_aplicados WHERE terminal = ?", (terminal,))
+    linha = cursor_central.fetchone()
+    ja_aplicado = linha[0] if linha else 0
+
+    enviadas = 0
+    while True:
+        entradas = local.execute(
+            "SELECT id, tabela, operacao, chave, antes, depois FROM diario ORDER BY id LIMIT ?", (TAMANHO_LOTE_DIARIO,)
+        ).fetchall()
+        if not entradas:
+            return enviadas
+
+        mapa = {}
+        recarregar = []
+        central.execute("BEGIN IMMEDIATE")
+        try:
+            for entrada_id, tabela, operacao, chave, antes, depois in entradas:
+                if entrada_id <= ja_aplicado:
+                    # Já aplicada em uma rodada que caiu antes de limpar o diário
+                    if tabela == 'produtos' and operacao == 'I':
+                        cursor_central.execute("SELECT id_central FROM mapa_ids_terminais WHERE terminal = ? AND id_local = ?",
+                                               (terminal, int(chave)))
+                        mapa[int(chave)] = cursor_central.fetchone()[0]
+                    continue
+                conflito = aplicar_no_central(cursor_central, terminal, tabela, operacao, chave,
+                                              json.loads(antes) if antes else None, json.loads(depois) if depois else None, mapa)
+                if conflito:
+                    recarregar.append(conflito)
+
+            ja_aplicado = entradas[-1][0]
+            cursor_central.execute("""
+                INSERT INTO diarios_aplicados (terminal, ultimo_id) VALUES (?, ?)
+                ON CONFLICT(terminal) DO UPDATE SET ultimo_id = excluded.ultimo_id
+            """, (terminal, ja_aplicado))
+            central.commit()
+        except BaseException:
+            central.rollback()
+            raise
+
+        contas = [conta_do_central(cursor_central, username) for username in recarregar]
+        with aplicando(local):
+            for antigo, novo in mapa.items():
+                trocar_id_produto(local, antigo, novo)
+            for conta in contas:
+                gravar_linha(local, 'usuarios', 'username', conta)
+            local.execute("DELETE FROM diario WHERE id <= ?", (ja_aplicado,))
+        enviadas += len(entradas)
+
+
+def diferenca_pendente(local, produto_id):
+    """
+    Diferença de estoque ainda não enviada de um produto (as alterações de quantidade
+    feitas no terminal menos as vendas), ou None se ele não tem nada pendente.
+    """
+    pendentes = local.execute(
+        "SELECT antes, depois FROM diario WHERE tabela = 'produtos' AND chave = ?", (str(produto_id),)
+    ).fetchall()
+    vendas, vendido = local.execute("""
+        SELECT COUNT(*), COALESCE(SUM(json_extract(depois, '$.quantidade')), 0) FROM diario
+        WHERE tabela = 'vendas' AND json_extract(depois, '$.produto_id') = ?
+    """, (produto_id,)).fetchone()
+    if not pendentes and not vendas:
+        return None
+    return sum(json.loads(depois)['quantidade'] - json.loads(antes)['quantidade']
+               for antes, depois in pendentes if antes and depois) - vendido
+
+
+def aplicar_produto_local(local, produto_id, dados):
+    """Grava na réplica um produto vindo do central (None se ele foi apagado de vez)."""
+    if dados is None:
+        local.execute("DELETE FROM produtos WHERE id = ?", (produto_id,))
+        return
+
+    pendente = diferenca_pendente(local, produto_id)
+    if pendente is not None:
+        # Os campos alterados no terminal vencem quando forem enviados; o estoque soma
+        local.execute("UPDATE produtos SET quantidade = ? WHERE id = ?", (dados['quantidade'] + pendente, produto_id))
+        return
+
+    atual = local.execute("SELECT nome FROM produtos WHERE id = ?", (produto_id,)).fetchone()
+    gravar_linha(local, 'produtos', 'id', dados)
+    if not atual or atual[0] != dados['nome']:
+        MercPrd3.indexar_trigramas(local.cursor(), produto_id, dados['nome'])
+
+
+def aplicar_conta_local(local, username, conta):
+    """Grava na réplica uma conta vinda do central (None se ela foi apagada de vez)."""
+    if local.execute("SELECT 1 FROM diario WHERE tabela = 'usuarios' AND chave = ? LIMIT 1", (username,)).fetchone():
+        return
+    if conta is None:
+        local.execute("DELETE FROM usuarios WHERE username = ?", (username,))
+    else:
+        gravar_linha(local, 'usuarios', 'username', conta)
+
+
+def receber_alteracoes(local, central, terminal):
+    """Aplica na réplica o changelog do central a partir de onde o terminal parou. Retorna as alterações lidas."""
+    cursor_central = central.cursor()
+    cursor_central.execute("SELECT ultimo_seq FROM consumidores_changelog WHERE nome = ?", (consumidor(terminal),))
+    linha = cursor_central.fetchone()
+    if linha is None:
+        # O central esqueceu o terminal (por exemplo, foi restaurado): copia tudo de novo
+        carga_inicial(local, central, terminal)
+        return 0
+
+    desde = linha[0]
+    recebidas = 0
+    while True:
+        alteracoes = MercPrd3.buscar_alteracoes(cursor_central, desde)
+        if not alteracoes:
+            return recebidas
+
+        produtos = {}
+        contas = {}
+        for seq, tabela, operacao, chave, dados, _ in alteracoes:
+            if tabela == 'produtos':
+                produtos[int(chave)] = None if operacao == 'D' else dados
+            elif tabela == 'usuarios':
+                contas[chave] = operacao
+        contas = {username: None if operacao == 'D' else conta_do_central(cursor_central, username)
+                  for username, operacao in contas.items()}
+
+        with aplicando(local):
+            for produto_id, dados in produtos.items():
+                aplicar_produto_local(local, produto_id, dados)
+            for username, conta in contas.items():
+                aplicar_conta_local(local, username, conta)
+
+        desde = alteracoes[-1][0]
+        MercPrd3.confirmar_alteracoes(cursor_central, consumidor(terminal), desde)
+        recebidas += len(alteracoes)
+
+
+def abrir_central(caminho):
+    """Abre o banco central só se ele existir (sqlite3.connect criaria um arquivo vazio)."""
+    uri = f"file:{urllib.parse.quote(os.path.abspath(caminho))}?mode=rw"
+    return sqlite3.connect(uri, uri=True, timeout=TEMPO_LIMITE_CENTRAL)
+
+
+class ArmazenamentoOffline:
+    """
+    Réplica local de um banco central. As conexões do sistema abrem só a réplica; uma
+    thread sincroniza com o central em segundo plano e tenta de novo, com intervalos
+    crescentes, enquanto o central não responde.
+    """
+
+    def __init__(self, caminho_central, caminho_local=CAMINHO_REPLICA, intervalo=INTERVALO_SINCRONIZACAO):
+        self.caminho_central = caminho_central
+        self.caminho_local = caminho_local
+        self.descricao = f"{caminho_local} (réplica de {caminho_central})"
+        # As vendas são arquivadas no central (veja arquivo_vendas.diretorio_padrao)
+        self.arquivo_banco = None
+        # Lotes e categorias só são registrados no central
+        self.replica = True
+        self.intervalo = intervalo
+        self.trava = threading.Lock()
+        self.parar = threading.Event()
+        self.carregada = threading.Event()
+        self.sincronizador = None
+        self.ultima_sincronizacao = None
+        self.ultimo_erro = None
+        atexit.register(self.fechar)
+
+    def conectar(self):
+        return sqlite3.connect(self.caminho_local)
+
+    def preparar(self, conn):
+        """Prepara a réplica depois de criar_banco_de_dados() e inicia a sincronização."""
+        preparar_replica(conn)
+        if conn.execute("SELECT carregada FROM replica_estado").fetchone()[0]:
+            self.carregada.set()
+
+        if self.sincronizador is None and self.intervalo > 0:
+            self.sincronizador = threading.Thread(target=self.sincronizar_periodicamente, name="sincronizacao-mercprd", daemon=True)
+            self.sincronizador.start()
+        # Primeira abertura do terminal: sem a carga inicial não há nem contas para o login
+        self.carregada.wait(ESPERA_CARGA_INICIAL if self.sincronizador else 0)
+
+    def sincronizar(self):
+        """Uma rodada: envia o diário e recebe o changelog. Retorna (enviadas, recebidas)."""
+        with self.trava:
+            local = MercPrd3.rastrear(sqlite3.connect(self.caminho_local))
+            central = None
+            try:
+                central = MercPrd3.rastrear(abrir_central(self.caminho_central))
+                preparar_central(central)
+                terminal = local.execute("SELECT terminal FROM replica_estado").fetchone()[0]
+                if not self.carregada.is_set():
+                    carga_inicial(local, central, terminal)
+                    self.carregada.set()
+                enviadas = enviar_diario(local, central, terminal)
+                recebidas = receber_categorias(local, central) + receber_alteracoes(local, central, terminal)
+                self.ultima_sincronizacao = MercPrd3.agora_texto()
+                self.ultimo_erro = None
+                return enviadas, recebidas
+            finally:
+                if central:
+                    central.close()
+                local.close()
+
+    def sincronizar_periodicamente(self):
+        espera = self.intervalo
+        while True:
+            try:
+                self.sincronizar()
+                espera = self.intervalo
+            except (sqlite3.Error, OSError) as e:
+                self.ultimo_erro = str(e)
+                espera = min(espera * 2, ESPERA_MAXIMA)
+            if self.parar.wait(espera):
+                return
+
+    def estado(self):
+        """Resumo da réplica: terminal, entradas do diário ainda não enviadas e última sincronização."""
+        conn = self.conectar()
+        try:
+            terminal, carregada = conn.execute("SELECT terminal, carregada FROM replica_estado").fetchone()
+            pendentes = conn.execute("SELECT COUNT(*) FROM diario").fetchone()[0]
+        finally:
+            conn.close()
+        return {'terminal': terminal, 'carregada': bool(carregada), 'pendentes': pendentes,
+                'ultima_sincronizacao': self.ultima_sincronizacao, 'ultimo_erro': self.ultimo_erro}
+
+    def salvar_snapshot(self):
+        """Nada a fazer: a réplica já está no disco."""
+
+    def fechar(self):
+        """Para a sincronização e tenta enviar o que ficou pendente uma última vez."""
+        if self.parar.is_set():
+            return
+        self.parar.set()
+        try:
+            if self.carregada.is_set() and self.estado()['pendentes']:
+                self.sincronizar()
+        except (sqlite3.Error, OSError):
+            pass
+        atexit.unregister(self.fechar)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sincroniza a réplica local de um terminal com o banco central.")
+    parser.add_argument('--central', default=MercPrd3.CAMINHO_BANCO, help="arquivo do banco central")
+    parser.add_argument('--local', default=CAMINHO_REPLICA, help="arquivo da réplica local")
+    parser.add_argument('--sincronizar', action='store_true', help="faz uma rodada de sincronização antes de mostrar o estado")
+    argumentos = parser.parse_args()
+
+    # A réplica tem o mesmo esquema do sistema; criar_banco_de_dados() o cria no arquivo local
+    with contextlib.redirect_stdout(io.StringIO()):
+        MercPrd3.configurar_armazenamento(argumentos.local, 'disco')
+        MercPrd3.criar_banco_de_dados()
+
+    replica = ArmazenamentoOffline(argumentos.central, argumentos.local, intervalo=0)
+    conn = replica.conectar()
+    try:
+        replica.preparar(conn)
+    finally:
+        conn.close()
+
+    if argumentos.sincronizar:
+        try:
+            inicio = time.perf_counter()
+            enviadas, recebidas = replica.sincronizar()
+            print(f"{enviadas} alteração(ões) enviada(s), {recebidas} recebida(s) em {time.perf_counter() - inicio:.2f} s.")
+        except (sqlite3.Error, OSError) as e:
+            print(f"Erro ao sincronizar com o central: {e}")
+
+    for campo, valor in replica.estado().items():
+        print(f"{campo}: {valor}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
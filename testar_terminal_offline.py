@@ -0,0 +1,437 @@
+"""
+Cenários do modo offline do MercPrd3 (terminal_offline.py) com dois caixas.
+
+Cada cenário cria, em um diretório temporário, um banco central e as réplicas de dois
+caixas, faz vendas e alterações nas réplicas (com o central no ar ou fora dele),
+sincroniza e confere o central e as réplicas. A sincronização é chamada pelo próprio
+cenário, sem a thread de segundo plano, para a ordem dos passos ser sempre a mesma.
+
+Uso:
+    python testar_terminal_offline.py                      # todos os cenários
+    python testar_terminal_offline.py vendas_de_dois_caixas
+    python testar_terminal_offline.py --listar
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import traceback
+
+from simulador_carga import SENHA_PADRAO
+
+import MercPrd3
+import terminal_offline
+
+
+class Falha(Exception):
+    """Uma conferência de um cenário não bateu."""
+
+
+def conferir(obtido, esperado, descricao):
+    if obtido != esperado:
+        raise Falha(f"{descricao}: esperado {esperado!r}, obtido {obtido!r}")
+
+
+def criar_esquema(caminho):
+    """Cria o esquema do sistema em 'caminho' (o central e as réplicas têm o mesmo)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        MercPrd3.configurar_armazenamento(caminho, 'disco')
+        MercPrd3.criar_banco_de_dados()
+
+
+def daqui_a(dias):
+    return (datetime.date.today() + datetime.timedelta(days=dias)).isoformat()
+
+
+class Loja:
+    """
+    Banco central e dois caixas em 'diretorio'. 'central' é uma conexão com o banco
+    central; 'caixas' e 'conexoes' são as réplicas e uma conexão com cada uma, já
+    carregadas do central.
+    """
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        self.caminho_central = os.path.join(diretorio, 'central.db')
+        criar_esquema(self.caminho_central)
+        self.central = sqlite3.connect(self.caminho_central)
+        MercPrd3.RepositorioUsuarios(self.central).criar('gerente', SENHA_PADRAO, 1)
+        self.central.commit()
+        self.caixas = []
+        self.conexoes = []
+
+    def abrir_caixas(self, quantidade=2):
+        for numero in range(1, quantidade + 1):
+            caminho = os.path.join(self.diretorio, f"caixa{numero}.db")
+            criar_esquema(caminho)
+            caixa = terminal_offline.ArmazenamentoOffline(self.caminho_central, caminho, intervalo=0)
+            conn = caixa.conectar()
+            caixa.preparar(conn)
+            caixa.sincronizar()
+            self.caixas.append(caixa)
+            self.conexoes.append(conn)
+        return self.conexoes
+
+    def sincronizar(self, *numeros):
+        """Sincroniza os caixas na ordem dada (padrão: todos, e de novo o primeiro, para ele receber o que os outros enviaram)."""
+        numeros = numeros or tuple(range(1, len(self.caixas) + 1)) + (1,)
+        for numero in numeros:
+            self.caixas[numero - 1].sincronizar()
+
+    @contextlib.contextmanager
+    def central_fora_do_ar(self):
+        fora = self.caminho_central + '.fora'
+        os.rename(self.caminho_central, fora)
+        try:
+            yield
+        finally:
+            os.rename(fora, self.caminho_central)
+
+    def produto(self, conn, produto_id):
+        return conn.execute("SELECT nome, preco, quantidade FROM produtos WHERE id = ?", (produto_id,)).fetchone()
+
+    def lotes(self, produto_id):
+        return [quantidade for (quantidade,) in self.central.execute(
+            "SELECT quantidade FROM lotes WHERE produto_id = ? ORDER BY validade, id", (produto_id,))]
+
+    def pendentes(self, numero):
+        return self.caixas[numero - 1].estado()['pendentes']
+
+    def fechar(self):
+        for caixa in self.caixas:
+            caixa.fechar()
+        for conn in self.conexoes + [self.central]:
+            conn.close()
+
+
+def cadastrar(conn, nome, quantidade, preco=5.0, lotes=()):
+    """Cadastra um produto com estoque sem lote 'quantidade' e os 'lotes' [(quantidade, validade)]. Retorna o ID."""
+    produto_id = MercPrd3.RepositorioProdutos(conn).criar(nome, preco, quantidade)
+    for quantidade_lote, validade in lotes:
+        MercPrd3.RepositorioLotes(conn).criar(produto_id, quantidade_lote, validade)
+    conn.commit()
+    return produto_id
+
+
+# --- Cenários ---
+
+def vendas_de_dois_caixas(loja):
+    """Vendas offline dos dois caixas baixam os lotes do central na ordem de validade e somam no estoque."""
+    leite = cadastrar(loja.central, 'Leite', 10, lotes=[(20, daqui_a(5)), (20, daqui_a(30))])
+    caixa1, caixa2 = loja.abrir_caixas()
+
+    MercPrd3.baixar_estoque_fefo(caixa1, leite, 25)
+    MercPrd3.baixar_estoque_fefo(caixa2, leite, 12)
+    conferir(loja.produto(caixa1, leite)[2], 25, "estoque na réplica do caixa 1 antes de sincronizar")
+    loja.sincronizar()
+
+    conferir(loja.lotes(leite), [0, 3], "lotes do central (primeiro a vencer, primeiro a sair)")
+    conferir(loja.produto(loja.central, leite)[2], 13, "estoque do central (3 em lote, 10 sem lote)")
+    conferir(loja.central.execute("SELECT COUNT(*), SUM(quantidade) FROM vendas").fetchone(), (2, 37), "vendas no central")
+    for numero, conn in enumerate((caixa1, caixa2), 1):
+        conferir(loja.produto(conn, leite)[2], 13, f"estoque na réplica do caixa {numero}")
+        conferir(loja.pendentes(numero), 0, f"diário do caixa {numero}")
+
+
+def venda_alem_do_estoque_vendavel(loja):
+    """Uma venda offline nunca é recusada no central: o que faltar sai dos lotes vencidos e o estoque para no zero."""
+    iogurte = cadastrar(loja.central, 'Iogurte', 10, lotes=[(5, daqui_a(-2))])
+    caixa1, caixa2 = loja.abrir_caixas()
+
+    MercPrd3.baixar_estoque_fefo(caixa1, iogurte, 8)
+    MercPrd3.baixar_estoque_fefo(caixa2, iogurte, 8)
+    loja.sincronizar()
+
+    conferir(loja.lotes(iogurte), [0], "lote vencido do central")
+    conferir(loja.produto(loja.central, iogurte)[2], 0, "estoque do central")
+    conferir(loja.central.execute("SELECT SUM(quantidade) FROM vendas").fetchone()[0], 16, "unidades vendidas no central")
+    conferir((loja.pendentes(1), loja.pendentes(2)), (0, 0), "diários dos caixas")
+
+
+def estoque_pendente_na_replica(loja):
+    """Enquanto uma venda não foi enviada, o estoque recebido do central desconta essa venda."""
+    arroz = cadastrar(loja.central, 'Arroz', 50)
+    caixa1, caixa2 = loja.abrir_caixas()
+
+    MercPrd3.baixar_estoque_fefo(caixa1, arroz, 3)
+    MercPrd3.baixar_estoque_fefo(caixa2, arroz, 4)
+    loja.sincronizar(2)
+
+    # O caixa 1 só recebe (a venda dele continua no diário)
+    central = terminal_offline.abrir_central(loja.caminho_central)
+    try:
+        terminal = caixa1.execute("SELECT terminal FROM replica_estado").fetchone()[0]
+        terminal_offline.receber_alteracoes(caixa1, central, terminal)
+    finally:
+        central.close()
+    conferir(loja.produto(caixa1, arroz)[2], 43, "estoque na réplica com a venda pendente")
+    conferir(loja.pendentes(1), 2, "diário do caixa 1 (a baixa e a venda)")
+
+    loja.sincronizar(1)
+    conferir(loja.produto(loja.central, arroz)[2], 43, "estoque do central")
+    conferir(loja.produto(caixa1, arroz)[2], 43, "estoque na réplica depois de sincronizar")
+
+
+def edicoes_de_campos_diferentes(loja):
+    """Cada caixa muda um campo do mesmo produto offline; o central fica com as duas mudanças."""
+    feijao = cadastrar(loja.central, 'Feijão', 30)
+    caixa1, caixa2 = loja.abrir_caixas()
+
+    MercPrd3.RepositorioProdutos(caixa1).atualizar(feijao, nome='Feijão carioca')
+    caixa1.commit()
+    MercPrd3.RepositorioProdutos(caixa2).atualizar(feijao, preco=7.5)
+    caixa2.commit()
+    loja.sincronizar()
+
+    esperado = ('Feijão carioca', 7.5, 30)
+    conferir(loja.produto(loja.central, feijao), esperado, "produto no central")
+    for numero, conn in enumerate((caixa1, caixa2), 1):
+        conferir(loja.produto(conn, feijao), esperado, f"produto na réplica do caixa {numero}")
+
+
+def produto_criado_offline(loja):
+    """Um produto criado no caixa ganha o ID do central, e as vendas dele chegam com esse ID."""
+    caixa1, caixa2 = loja.abrir_caixas()
+
+    pao = cadastrar(caixa1, 'Pão de forma', 10)
+    conferir(pao > terminal_offline.BASE_ID_LOCAL, True, "ID provisório do produto criado no caixa")
+    MercPrd3.baixar_estoque_fefo(caixa1, pao, 2)
+    loja.sincronizar()
+
+    definitivo = loja.central.execute("SELECT id, quantidade FROM produtos WHERE nome = 'Pão de forma'").fetchone()
+    conferir(definitivo is not None and definitivo[0] < terminal_offline.BASE_ID_LOCAL, True, "ID do produto no central")
+    conferir(definitivo[1], 8, "estoque do central")
+    conferir(loja.central.execute("SELECT produto_id, quantidade FROM vendas").fetchall(), [(definitivo[0], 2)], "venda no central")
+    conferir(caixa1.execute("SELECT id, quantidade FROM produtos WHERE nome = 'Pão de forma'").fetchall(), [definitivo], "produto na réplica do caixa 1")
+    conferir(caixa2.execute("SELECT id, quantidade FROM produtos WHERE nome = 'Pão de forma'").fetchall(), [definitivo], "produto na réplica do caixa 2")
+
+
+def conta_criada_nos_dois_caixas(loja):
+    """A mesma conta criada nos dois caixas: vale a que chegou primeiro ao central, e o outro caixa a recebe."""
+    caixa1, caixa2 = loja.abrir_caixas()
+
+    MercPrd3.RepositorioUsuarios(caixa2).criar('ana', 'segundo123')
+    caixa2.commit()
+    MercPrd3.RepositorioUsuarios(caixa1).criar('ana', 'primeiro123')
+    caixa1.commit()
+    loja.sincronizar(2, 1)
+
+    senha = "SELECT password FROM usuarios WHERE username = 'ana'"
+    conferir(loja.central.execute(senha).fetchone(), ('segundo123',), "conta no central")
+    conferir(caixa1.execute(senha).fetchone(), ('segundo123',), "conta na réplica do caixa 1")
+    conferir(loja.pendentes(1), 0, "diário do caixa 1")
+
+
+def central_fora_do_ar(loja):
+    """Sem o central o caixa continua vendendo; o que ficou no diário é enviado quando ele volta."""
+    cafe = cadastrar(loja.central, 'Café', 20)
+    caixa1, _ = loja.abrir_caixas()
+
+    with loja.central_fora_do_ar():
+        MercPrd3.baixar_estoque_fefo(caixa1, cafe, 5)
+        conferir(MercPrd3.RepositorioUsuarios(caixa1).autenticar('gerente', SENHA_PADRAO) is not None, True, "login no caixa sem o central")
+        try:
+            loja.sincronizar(1)
+            raise Falha("a sincronização deveria falhar sem o central")
+        except sqlite3.Error:
+            pass
+        conferir(loja.pendentes(1), 2, "diário do caixa 1 sem o central")
+        conferir(os.path.exists(loja.caminho_central), False, "o caixa não criou um central vazio")
+
+    loja.sincronizar(1)
+    conferir(loja.produto(loja.central, cafe)[2], 15, "estoque do central depois que ele voltou")
+    conferir(loja.pendentes(1), 0, "diário do caixa 1")
+
+
+def queda_depois_de_enviar(loja):
+    """O caixa cai depois de o central aplicar o lote e antes de limpar o diário: nada é aplicado duas vezes."""
+    acucar = cadastrar(loja.central, 'Açúcar', 10, lotes=[(10, daqui_a(60))])
+    caixa1, _ = loja.abrir_caixas()
+    queijo = cadastrar(caixa1, 'Queijo', 5)
+    MercPrd3.baixar_estoque_fefo(caixa1, queijo, 1)
+    MercPrd3.baixar_estoque_fefo(caixa1, acucar, 4)
+
+    aplicando = terminal_offline.aplicando
+
+    def queda(local):
+        raise sqlite3.OperationalError("queda simulada")
+
+    terminal_offline.aplicando = queda
+    try:
+        loja.sincronizar(1)
+        raise Falha("a queda simulada deveria interromper a sincronização")
+    except sqlite3.OperationalError:
+        pass
+    finally:
+        terminal_offline.aplicando = aplicando
+    conferir(loja.pendentes(1), 5, "diário do caixa 1 depois da queda")
+
+    loja.sincronizar(1)
+    conferir(loja.central.execute("SELECT COUNT(*) FROM produtos WHERE nome = 'Queijo'").fetchone()[0], 1, "produtos criados no central")
+    conferir(loja.central.execute("SELECT quantidade FROM produtos WHERE nome = 'Queijo'").fetchone()[0], 4, "estoque do queijo no central")
+    conferir(loja.lotes(acucar), [6], "lote do açúcar no central")
+    conferir(loja.central.execute("SELECT COUNT(*) FROM vendas").fetchone()[0], 2, "vendas no central")
+    conferir(loja.pendentes(1), 0, "diário do caixa 1")
+
+
+def lote_na_replica(loja):
+    """A réplica recusa a entrada de lotes, que só existem no central."""
+    oleo = cadastrar(loja.central, 'Óleo', 10, lotes=[(10, daqui_a(90))])
+    caixa1, _ = loja.abrir_caixas()
+
+    try:
+        MercPrd3.RepositorioLotes(caixa1).criar(oleo, 5, daqui_a(30))
+        raise Falha("a réplica deveria recusar o lote")
+    except sqlite3.IntegrityError:
+        caixa1.rollback()
+    conferir(loja.pendentes(1), 0, "diário do caixa 1")
+    conferir(loja.produto(caixa1, oleo)[2], 20, "estoque na réplica")
+
+
+def edicao_abaixo_dos_lotes(loja):
+    """Uma quantidade editada no caixa não leva o central abaixo do saldo dos lotes nem trava o diário."""
+    farinha = cadastrar(loja.central, 'Farinha', 5, lotes=[(20, daqui_a(90))])
+    caixa1, _ = loja.abrir_caixas()
+
+    MercPrd3.RepositorioProdutos(caixa1).atualizar(farinha, quantidade=10)
+    caixa1.commit()
+    loja.sincronizar(1)
+
+    conferir(loja.produto(loja.central, farinha)[2], 20, "estoque do central (saldo dos lotes)")
+    conferir(loja.produto(caixa1, farinha)[2], 20, "estoque na réplica")
+    conferir(loja.pendentes(1), 0, "diário do caixa 1")
+
+
+def categorias_do_central(loja):
+    """A árvore de categorias vem do central, e a categoria escolhida no caixa chega ao central com o mesmo ID."""
+    categorias = MercPrd3.RepositorioCategorias(loja.central)
+    mercearia = categorias.criar('Mercearia')
+    graos = categorias.criar('Grãos', mercearia)
+    loja.central.commit()
+    lentilha = cadastrar(loja.central, 'Lentilha', 12)
+    caixa1, caixa2 = loja.abrir_caixas()
+
+    conferir(MercPrd3.RepositorioCategorias(caixa1).caminho(graos), ['Mercearia', 'Grãos'], "árvore na réplica do caixa 1")
+    MercPrd3.RepositorioProdutos(caixa1).atualizar(lentilha, categoria_id=graos)
+    caixa1.commit()
+    categorias.renomear(graos, 'Grãos e cereais')
+    loja.central.commit()
+    loja.sincronizar()
+
+    conferir(loja.central.execute("SELECT categoria_id FROM produtos WHERE id = ?", (lentilha,)).fetchone(), (graos,), "categoria no central")
+    conferir(categorias.totais(mercearia)[:2], (1, 12), "totais do departamento no central")
+    for numero, conn in enumerate((caixa1, caixa2), 1):
+        conferir(MercPrd3.RepositorioCategorias(conn).caminho(graos), ['Mercearia', 'Grãos e cereais'], f"árvore na réplica do caixa {numero}")
+        conferir(MercPrd3.RepositorioCategorias(conn).totais(mercearia)[:2], (1, 12), f"totais do departamento na réplica do caixa {numero}")
+
+
+def categoria_na_replica(loja):
+    """A réplica recusa criar, renomear e excluir categorias, que só mudam no central."""
+    bebidas = MercPrd3.RepositorioCategorias(loja.central).criar('Bebidas')
+    loja.central.commit()
+    caixa1, _ = loja.abrir_caixas()
+
+    categorias = MercPrd3.RepositorioCategorias(caixa1)
+    for descricao, alterar in (("criar", lambda: categorias.criar('Limpeza')),
+                               ("renomear", lambda: categorias.renomear(bebidas, 'Bebidas geladas')),
+                               ("excluir", lambda: categorias.excluir(bebidas))):
+        try:
+            alterar()
+            raise Falha(f"a réplica deveria recusar {descricao} uma categoria")
+        except sqlite3.IntegrityError:
+            caixa1.rollback()
+    conferir([categoria.nome for categoria in categorias.listar()], ['Bebidas'], "árvore na réplica")
+    conferir(loja.pendentes(1), 0, "diário do caixa 1")
+
+
+def categoria_excluida_no_central(loja):
+    """A categoria escolhida no caixa foi excluída no central: o produto chega sem ela e o diário não trava."""
+    categorias = MercPrd3.RepositorioCategorias(loja.central)
+    frios = categorias.criar('Frios')
+    loja.central.commit()
+    presunto = cadastrar(loja.central, 'Presunto', 8)
+    caixa1, _ = loja.abrir_caixas()
+
+    MercPrd3.RepositorioProdutos(caixa1).atualizar(presunto, categoria_id=frios, preco=9.0)
+    caixa1.commit()
+    mortadela = cadastrar(caixa1, 'Mortadela', 4)
+    MercPrd3.RepositorioProdutos(caixa1).atualizar(mortadela, categoria_id=frios)
+    caixa1.commit()
+    categorias.excluir(frios)
+    loja.central.commit()
+    loja.sincronizar(1)
+
+    conferir(loja.central.execute("SELECT categoria_id, preco FROM produtos WHERE id = ?", (presunto,)).fetchone(), (None, 9.0), "presunto no central")
+    conferir(loja.central.execute("SELECT categoria_id FROM produtos WHERE nome = 'Mortadela'").fetchone(), (None,), "mortadela no central")
+    conferir(caixa1.execute("SELECT COUNT(*) FROM produtos WHERE categoria_id IS NOT NULL").fetchone()[0], 0, "produtos com categoria na réplica")
+    conferir(caixa1.execute("SELECT COUNT(*) FROM categorias").fetchone()[0], 0, "árvore na réplica")
+    conferir(loja.pendentes(1), 0, "diário do caixa 1")
+
+
+CENARIOS = {funcao.__name__: funcao for funcao in (
+    vendas_de_dois_caixas,
+    venda_alem_do_estoque_vendavel,
+    estoque_pendente_na_replica,
+    edicoes_de_campos_diferentes,
+    produto_criado_offline,
+    conta_criada_nos_dois_caixas,
+    central_fora_do_ar,
+    queda_depois_de_enviar,
+    lote_na_replica,
+    edicao_abaixo_dos_lotes,
+    categorias_do_central,
+    categoria_na_replica,
+    categoria_excluida_no_central,
+)}
+
+
+def rodar(cenario):
+    """Roda um cenário em um diretório novo. Retorna None se passou, ou o motivo da falha."""
+    with tempfile.TemporaryDirectory(prefix='offline_mercprd_') as diretorio:
+        loja = Loja(diretorio)
+        try:
+            cenario(loja)
+            return None
+        except Falha as e:
+            return str(e)
+        except Exception:
+            return traceback.format_exc()
+        finally:
+            loja.fechar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roda os cenários do modo offline com dois caixas.")
+    parser.add_argument('cenarios', nargs='*', help="nomes dos cenários (padrão: todos)")
+    parser.add_argument('--listar', action='store_true', help="lista os cenários e sai")
+    argumentos = parser.parse_args()
+
+    if argumentos.listar:
+        for nome, cenario in CENARIOS.items():
+            print(f"{nome}: {cenario.__doc__}")
+        return 0
+
+    desconhecidos = [nome for nome in argumentos.cenarios if nome not in CENARIOS]
+    if desconhecidos:
+        print(f"Cenário(s) desconhecido(s): {', '.join(desconhecidos)} (veja --listar)")
+        return 2
+
+    nomes = argumentos.cenarios or list(CENARIOS)
+    falhas = 0
+    for nome in nomes:
+        motivo = rodar(CENARIOS[nome])
+        print(f"[{'OK' if motivo is None else 'FALHA'}] {nome}")
+        if motivo is not None:
+            print(f"    {motivo}")
+            falhas += 1
+
+    print(f"\n{len(nomes) - falhas} de {len(nomes)} cenário(s) passaram.")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
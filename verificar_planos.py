@@ -0,0 +1,464 @@
+"""
+Verificador de planos de consulta do MercPrd3.
+
+Cria um banco grande de teste, executa todos os fluxos dos menus (com entrada
+roteirizada, como no simulador_carga.py) e as funções de consulta usadas por
+outros sistemas, e registra cada comando SQL emitido pela aplicação através de
+MercPrd3.definir_rastreador_sql(). Os comandos dos gatilhos são lidos do próprio
+esquema. Depois roda EXPLAIN QUERY PLAN em cada comando e falha quando um comando
+que deveria usar índice faz varredura de tabela (SCAN) ou ordena em uma árvore B
+temporária.
+
+Por fim, um caixa offline (terminal_offline.py) abre uma réplica de uma cópia do banco
+de teste, faz vendas e alterações nela e roda uma sincronização completa; os comandos
+da réplica, dos gatilhos do diário e da sincronização são verificados na réplica.
+
+Todo comando é tratado como indexado, a não ser que esteja registrado em
+VARREDURAS_PERMITIDAS com o motivo.
+
+Uso:
+    python verificar_planos.py                # sai com código 1 se houver regressão
+    python verificar_planos.py --mostrar      # lista o plano de todos os comandos
+    python verificar_planos.py --memoria      # usa o motor em memória (veja ArmazenamentoMemoria)
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+
+from simulador_carga import EntradaRoteirizada, Opcao, SENHA_PADRAO
+
+import MercPrd3
+import arquivo_vendas
+import planejador_reposicao
+import terminal_offline
+
+# Comandos que podem ler uma tabela inteira ou ordenar em memória, com o motivo.
+# A chave é uma expressão regular aplicada ao comando normalizado (veja normalizar()).
+VARREDURAS_PERMITIDAS = {
+    r"^SELECT [\w, ]+ FROM produtos WHERE deleted_at IS NULL ORDER BY nome$":
+        "listagem completa do catálogo, já na ordem do índice parcial de nomes",
+    r"^SELECT [\w, ]+ FROM usuarios WHERE deleted_at IS NULL ORDER BY username$":
+        "listagem completa das contas",
+    r"^SELECT id, nome FROM produtos WHERE deleted_at IS NULL$":
+        "relatório de duplicados em lote lê o catálogo inteiro uma vez",
+    r"^SELECT trigrama, produto_id FROM trigramas_produtos ORDER BY trigrama$":
+        "relatório de duplicados em lote percorre o índice de trigramas uma vez, em ordem",
+    r"^SELECT p\.id, p\.nome FROM \( SELECT produto_id FROM trigramas_produtos WHERE trigrama IN":
+        "agrupa as listas dos trigramas do nome procurado; a ordenação é só sobre os candidatos",
+    r"^SELECT p\.id, p\.nome, p\.quantidade, p\.estoque_minimo, a\.criado_em FROM alertas_estoque AS a":
+        "percorre só os alertas pendentes, pelo índice parcial idx_alertas_estoque_pendentes_data",
+    r"^SELECT MIN\(ultimo_seq\), COUNT\(\*\) FROM consumidores_changelog$":
+        "uma linha por sistema consumidor do changelog",
+    r"^SELECT COUNT\(\*\) FROM plano_reposicao WHERE sugerido > \?$":
+        "conta só os itens a comprar, pelo índice parcial idx_plano_reposicao_comprar",
+    r"^SELECT p\.id, p\.nome, r\.quantidade, [\w., ]+ FROM plano_reposicao AS r":
+        "lista de compras percorre só os itens a comprar, pelo índice parcial idx_plano_reposicao_comprar",
+    r"^SELECT [\w, ]+ FROM arquivamentos_vendas WHERE estado":
+        "uma linha por arquivamento de vendas (no máximo um por noite)",
+    r"^SELECT [\w, ]+ FROM categorias ORDER BY nivel, nome$":
+        "árvore de categorias completa (poucas centenas de linhas)",
+    r"^SELECT categoria_id, produtos, quantidade, valor_estoque FROM categorias_totais$":
+        "totais de todas as categorias para exibir a árvore",
+    r"^SELECT id, nome, pai_id, nivel FROM categorias$":
+        "o terminal offline compara a árvore inteira com a do central a cada rodada",
+    r"^UPDATE categorias_totais SET \(produtos, quantidade, valor_estoque\) = \(":
+        "recalcula os totais de todas as categorias da réplica só quando a árvore muda",
+    r"^SELECT c\.nome FROM categorias_fechamento AS f JOIN categorias AS c":
+        "ordena os no máximo três ancestrais de uma categoria",
+    r"^SELECT [\w, ]+ FROM categorias_fechamento AS f JOIN produtos AS p ON p\.categoria_id = f\.descendente_id WHERE f\.ancestral_id = \? AND p\.deleted_at IS NULL ORDER BY p\.nome$":
+        "ordena só os produtos da subárvore, lidos pelo índice idx_produtos_categoria",
+    r"^SELECT p\.id, p\.nome, p\.quantidade, p\.estoque_minimo, a\.criado_em FROM categorias_fechamento AS f":
+        "ordena só os alertas dos produtos da subárvore",
+    r"^(?:SELECT [\w, ]+ FROM|UPDATE) replica_estado\b":
+        "estado da réplica do caixa offline, sempre uma linha só",
+    r"^SELECT seq FROM sqlite_sequence WHERE name = \?$":
+        "uma linha por tabela com AUTOINCREMENT (faixa de IDs provisórios da réplica)",
+    r"^SELECT id, tabela, operacao, chave, antes, depois FROM diario ORDER BY id LIMIT \?$":
+        "lê só o primeiro lote do diário, na ordem da chave",
+    r"^SELECT username, password, is_admin, deleted_at FROM usuarios$":
+        "carga inicial da réplica copia todas as contas uma vez",
+}
+
+# Tamanho padrão do banco de teste
+PRODUTOS_PADRAO = 20000
+USUARIOS_PADRAO = 2000
+
+
+# Textos e números literais, e listas de '?' seguidos (as listas do IN)
+LITERAIS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+LISTA_DE_MARCADORES = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+def normalizar(sql):
+    """
+    Troca valores literais por '?' e junta os espaços, para agrupar comandos iguais.
+    Roda para cada comando executado (centenas de milhares na carga do caixa), então usa
+    só duas expressões regulares já compiladas.
+    """
+    sql = LISTA_DE_MARCADORES.sub("?", LITERAIS.sub("?", sql))
+    return " ".join(sql.split()).rstrip(';')
+
+
+def deve_verificar(sql):
+    comando = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ''
+    return comando in ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH')
+
+
+def preparar_banco(produtos, usuarios):
+    """Cria o banco de teste no diretório atual com catálogo, contas, excluídos, alertas, histórico e lotes."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        MercPrd3.criar_banco_de_dados()
+
+    sorteio = random.Random(7)
+    conn = MercPrd3.conectar()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO usuarios (username, password, is_admin) VALUES ('gerente', ?, 1)", (SENHA_PADRAO,))
+    cursor.executemany(
+        "INSERT INTO usuarios (username, password, is_admin) VALUES (?, ?, 0)",
+        [(f"caixa{numero}", SENHA_PADRAO) for numero in range(usuarios)]
+    )
+    categorias = MercPrd3.RepositorioCategorias(conn)
+    subsecoes = []
+    for departamento in range(8):
+        departamento_id = categorias.criar(f"Departamento {departamento}")
+        for secao in range(5):
+            secao_id = categorias.criar(f"Seção {secao}", departamento_id)
+            subsecoes += [categorias.criar(f"Subseção {subsecao}", secao_id) for subsecao in range(4)]
+    for numero in range(produtos):
+        nome = f"Produto {numero} marca {sorteio.randint(0, 999)}"
+        categoria_id = sorteio.choice(subsecoes) if numero % 10 else None
+        cursor.execute("INSERT INTO produtos (nome, preco, quantidade, estoque_minimo, categoria_id) VALUES (?, ?, ?, ?, ?)",
+                       (nome, round(sorteio.uniform(1, 100), 2), sorteio.randint(0, 500), sorteio.randint(0, 50), categoria_id))
+        MercPrd3.indexar_trigramas(cursor, cursor.lastrowid, nome)
+    for numero in range(1, produtos + 1, 7):
+        cursor.execute("UPDATE produtos SET preco = preco + 1 WHERE id = ?", (numero,))
+    hoje = datetime.date.today()
+    cursor.executemany(
+        "INSERT INTO lotes (produto_id, quantidade, validade, criado_em) VALUES (?, ?, ?, '2000-01-01 00:00:00')",
+        [(numero, sorteio.randint(1, 50), (hoje + datetime.timedelta(days=sorteio.randint(-10, 180))).isoformat())
+         for numero in range(1, produtos + 1, 3)]
+    )
+    cursor.executemany(
+        "INSERT INTO vendas (produto_id, quantidade, momento) VALUES (?, ?, ?)",
+        [(sorteio.randint(1, produtos), sorteio.randint(1, 5), f"{hoje - datetime.timedelta(days=dias)} 12:00:00")
+         for dias in range(60, 0, -1) for _ in range(produtos // 20)]
+    )
+    cursor.execute("UPDATE produtos SET deleted_at = '2000-01-01 00:00:00' WHERE id % 50 = 0")
+    cursor.execute("UPDATE usuarios SET deleted_at = '2000-01-01 00:00:00' WHERE username LIKE 'caixa%0'")
+    conn.commit()
+    conn.close()
+
+
+def sessoes_dos_menus():
+    """Roteiros que passam por todas as opções dos menus."""
+    admin = ['1', 'gerente', SENHA_PADRAO]
+    usuario = ['1', 'caixa1', SENHA_PADRAO]
+    return [
+        # Menu principal
+        ['2', 'novacaixa', SENHA_PADRAO, Opcao('Sair')],
+        ['3', 'caixa1', SENHA_PADRAO, SENHA_PADRAO, Opcao('Sair')],
+        ['1', 'caixa1', 'senhaerrada1', Opcao('Sair')],
+        # Menu do usuário comum
+        usuario + [Opcao('Visualizar produtos'), Opcao('Cadastrar produto'), 'Produto 12 marca 5', '9.90', '10', '5', '3',
+                   Opcao('Registrar venda'), '4', '2',
+                   Opcao('Trocar minha senha'), 'caixa1', SENHA_PADRAO, SENHA_PADRAO, Opcao('Sair'), Opcao('Sair')],
+        # Menu do administrador: contas
+        admin + [Opcao('Gerenciar Usuários'), 's', 'a', 'caixa2', SENHA_PADRAO,
+                 's', 'e', 'caixa3', 's', 's', 'r', 'caixa3', 'n', Opcao('Sair'), Opcao('Sair')],
+        # Menu do administrador: produtos
+        admin + [Opcao('Gerenciar Produtos'),
+                 Opcao('Cadastrar novo produto'), 'Arroz 5kg', '25', '3', '10', '',
+                 Opcao('Visualizar produtos'),
+                 Opcao('Editar produto'), '11', 'Produto onze', '12.5', '2', '20', '4',
+                 Opcao('Excluir produto'), '13', 's',
+                 Opcao('Restaurar produto excluído'), '13',
+                 Opcao('Histórico de preços'), '8', '30', '2020-01-01',
+                 Opcao('Relatório de produtos duplicados'), 'n',
+                 Opcao('Lotes e validade'),
+                 Opcao('Entrada de lote'), '7', '12', '2100-01-01',
+                 Opcao('Lotes de um produto'), '7',
+                 Opcao('Produtos vencendo'), '30',
+                 Opcao('Registrar venda'), '7', '3',
+                 Opcao('Voltar'),
+                 Opcao('Categorias'),
+                 Opcao('Visualizar categorias'),
+                 Opcao('Cadastrar categoria'), 'Mercearia', '',
+                 Opcao('Cadastrar categoria'), 'Grãos', '1',
+                 Opcao('Renomear categoria'), '2', 'Seção renomeada',
+                 Opcao('Produtos de uma categoria'), '1', '',
+                 Opcao('Produtos de uma categoria'), '2', 'Produto 12 marca',
+                 Opcao('Excluir categoria'), '3', 's',
+                 Opcao('Excluir categoria'), '6', 's',
+                 Opcao('Voltar'),
+                 Opcao('Voltar'), Opcao('Sair'), Opcao('Sair')],
+        # Menu do administrador: demais opções
+        admin + [Opcao('Trocar minha senha'), 'gerente', SENHA_PADRAO, SENHA_PADRAO,
+                 Opcao('Alertas de estoque baixo'), '', 'n',
+                 Opcao('Alertas de estoque baixo'), '1', 'n',
+                 Opcao('Planejar reposição'), 's', 'n',
+                 Opcao('Planejar reposição'), 'n', 'n',
+                 Opcao('Relatório de vendas'), '', '', '',
+                 Opcao('Relatório de vendas'), '', '', '9',
+                 Opcao('Compactar banco de dados'),
+                 Opcao('Sair'), Opcao('Sair')],
+    ]
+
+
+def chamadas_de_api():
+    """Funções públicas chamadas por outros sistemas, fora dos menus."""
+    conn = MercPrd3.conectar()
+    cursor = conn.cursor()
+    MercPrd3.preco_na_data(cursor, 8, '2020-01-01')
+    MercPrd3.alteracoes_de_preco(cursor, 8, '2020-01-01', '2100-01-01')
+    MercPrd3.estatisticas_de_preco(cursor, 8, '2020-01-01', '2100-01-01')
+    MercPrd3.consultar_alertas_pendentes(cursor)
+    MercPrd3.consultar_alertas_pendentes(cursor, 1)
+    MercPrd3.buscar_produtos_semelhantes(cursor, 'Produto 100 marca 1')
+    MercPrd3.buscar_produtos_semelhantes(cursor, 'Produto 100 marca 1', categoria_id=1)
+    list(MercPrd3.RepositorioProdutos(conn).listar_da_categoria(1))
+    MercPrd3.RepositorioCategorias(conn).caminho(5)
+    try:
+        MercPrd3.baixar_estoque_fefo(conn, 10, 1)
+    except MercPrd3.EstoqueInsuficiente:
+        pass
+    planejador_reposicao.planejar(conn, completo=True)
+    conn.execute("UPDATE produtos SET quantidade = 0 WHERE id = 9")
+    conn.commit()
+    planejador_reposicao.planejar(conn)
+    planejador_reposicao.exportar_lista_compras(conn.cursor())
+    arquivo_vendas.arquivar(conn)
+    arquivo_vendas.resumo_vendas(conn, '2000-01-01', '2100-01-01')
+    arquivo_vendas.resumo_vendas(conn, '2000-01-01', '2100-01-01', 9)
+    MercPrd3.registrar_consumidor(cursor, 'verificador')
+    alteracoes = MercPrd3.buscar_alteracoes(cursor, 0)
+    MercPrd3.confirmar_alteracoes(cursor, 'verificador', alteracoes[-1][0] if alteracoes else 0)
+    MercPrd3.podar_changelog(cursor)
+    MercPrd3.remover_consumidor(cursor, 'verificador')
+    conn.close()
+
+
+def comandos_dos_gatilhos(conn):
+    """
+    Extrai os comandos do corpo de cada gatilho, trocando NEW.x e OLD.x por parâmetros.
+    RAISE() só existe dentro de gatilhos, então vira NULL para o plano poder ser obtido.
+    """
+    comandos = []
+    for nome, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"):
+        corpo = sql[sql.upper().index('BEGIN') + len('BEGIN'):sql.upper().rindex('END')]
+        for comando in corpo.split(';'):
+            if comando.strip():
+                comando = re.sub(r"\bRAISE\s*\([^)]*\)", "NULL", comando.strip(), flags=re.IGNORECASE)
+                comandos.append((f"gatilho {nome}", re.sub(r"\b(?:NEW|OLD)\.\w+", "?", comando)))
+    return comandos
+
+
+def coletar_comandos():
+    """Executa os fluxos e devolve {comando normalizado: (origem, exemplo executável)}."""
+    comandos = {}
+
+    def registrar(sql):
+        if sql.startswith('--') or not deve_verificar(sql):
+            return
+        comandos.setdefault(normalizar(sql), ('aplicação', sql))
+
+    MercPrd3.definir_rastreador_sql(registrar)
+    entrada = EntradaRoteirizada(type('Silencioso', (), {'observar_linha': lambda self, linha: None})())
+    MercPrd3.input = entrada.input
+    MercPrd3.print = entrada.print
+    try:
+        for roteiro in sessoes_dos_menus():
+            entrada.carregar(roteiro)
+            MercPrd3.main()
+        chamadas_de_api()
+    finally:
+        MercPrd3.definir_rastreador_sql(None)
+        del MercPrd3.input, MercPrd3.print
+
+    conn = MercPrd3.conectar()
+    for origem, sql in comandos_dos_gatilhos(conn):
+        comandos.setdefault(normalizar(sql), (origem, sql))
+    conn.close()
+    return comandos
+
+
+def preparar_caixa():
+    """
+    Copia o banco de teste para 'central.db' e cria o esquema de uma réplica vazia em
+    'caixa.db'. Depois disso o armazenamento do sistema é a réplica.
+    """
+    origem = MercPrd3.conectar()
+    destino = sqlite3.connect('central.db')
+    origem.backup(destino)
+    destino.close()
+    origem.close()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        MercPrd3.configurar_armazenamento('caixa.db', 'disco')
+        MercPrd3.criar_banco_de_dados()
+
+
+def rodada_de_sincronizacao():
+    """
+    Abre um caixa offline sobre 'central.db' e faz a carga inicial, vendas, um produto
+    novo, edições e uma conta na réplica, alterações no central e uma sincronização nos
+    dois sentidos.
+    """
+    replica = terminal_offline.ArmazenamentoOffline('central.db', 'caixa.db', intervalo=0)
+    conn = MercPrd3.conectar()
+    replica.preparar(conn)
+    replica.sincronizar()
+
+    for produto_id in (7, 10):
+        try:
+            MercPrd3.baixar_estoque_fefo(conn, produto_id, 1)
+        except MercPrd3.EstoqueInsuficiente:
+            pass
+    produtos = MercPrd3.RepositorioProdutos(conn)
+    novo_id = produtos.criar('Produto do caixa', 3.5, 10)
+    conn.commit()
+    MercPrd3.baixar_estoque_fefo(conn, novo_id, 2)
+    produtos.atualizar(11, nome='Produto onze do caixa', quantidade=5)
+    produtos.excluir(13)
+    MercPrd3.RepositorioUsuarios(conn).criar('caixa_offline', SENHA_PADRAO)
+    conn.commit()
+
+    destino = sqlite3.connect('central.db')
+    destino.execute("UPDATE produtos SET preco = preco + 1 WHERE id IN (11, 12)")
+    destino.execute("UPDATE usuarios SET password = ? WHERE username = 'caixa1'", (SENHA_PADRAO + '0',))
+    destino.commit()
+    destino.close()
+
+    replica.sincronizar()
+    replica.estado()
+    replica.fechar()
+    # As tabelas só do central entram na réplica para os comandos do central terem plano
+    terminal_offline.preparar_central(conn)
+    conn.close()
+
+
+def coletar_comandos_do_caixa(ja_coletados):
+    """
+    Prepara o caixa, roda rodada_de_sincronizacao() e devolve os comandos dela e dos gatilhos da réplica
+    que ainda não estão em 'ja_coletados', no mesmo formato de coletar_comandos().
+    """
+    comandos = {}
+
+    def registrar(sql):
+        if sql.startswith('--') or not deve_verificar(sql):
+            return
+        normalizado = normalizar(sql)
+        if normalizado not in ja_coletados:
+            comandos.setdefault(normalizado, ('sincronização', sql))
+
+    preparar_caixa()
+    MercPrd3.definir_rastreador_sql(registrar)
+    try:
+        rodada_de_sincronizacao()
+    finally:
+        MercPrd3.definir_rastreador_sql(None)
+
+    conn = MercPrd3.conectar()
+    for origem, sql in comandos_dos_gatilhos(conn):
+        normalizado = normalizar(sql)
+        if normalizado not in ja_coletados:
+            comandos.setdefault(normalizado, (origem, sql))
+    conn.close()
+    return comandos
+
+
+def problemas_do_plano(conn, sql, plano):
+    """
+    Retorna as linhas do plano que indicam varredura de tabela ou ordenação temporária.
+    Percorrer o resultado de uma subconsulta não conta como varredura; percorrer uma
+    tabela, pelo nome ou por um apelido ("produtos AS p"), conta.
+    """
+    tabelas = {nome for (nome,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    apelidos = {apelido for tabela, apelido in re.findall(r"\b(\w+)\s+AS\s+(\w+)", sql, re.IGNORECASE) if tabela in tabelas}
+    problemas = []
+    for _, _, _, detalhe in plano:
+        if detalhe.startswith('SCAN '):
+            alvo = detalhe.split()[1]
+            if alvo in tabelas or alvo in apelidos:
+                problemas.append(detalhe)
+        elif 'USE TEMP B-TREE' in detalhe:
+            problemas.append(detalhe)
+    return problemas
+
+
+def verificar(comandos, mostrar=False):
+    """Roda EXPLAIN QUERY PLAN em cada comando e retorna a lista de regressões."""
+    conn = MercPrd3.conectar()
+    regressoes = []
+    for normalizado, (origem, sql) in sorted(comandos.items()):
+        quantidade_parametros = sql.count('?')
+        try:
+            plano = conn.execute(f"EXPLAIN QUERY PLAN {sql}", (None,) * quantidade_parametros).fetchall()
+        except sqlite3.Error as e:
+            regressoes.append((origem, normalizado, [f"não foi possível obter o plano: {e}"]))
+            continue
+
+        problemas = problemas_do_plano(conn, sql, plano)
+        permitido = next((motivo for padrao, motivo in VARREDURAS_PERMITIDAS.items() if re.search(padrao, normalizado)), None)
+
+        if mostrar:
+            situacao = "OK" if not problemas else ("PERMITIDO" if permitido else "FALHA")
+            print(f"\n[{situacao}] ({origem}) {normalizado}")
+            for _, _, _, detalhe in plano:
+                print(f"    {detalhe}")
+            if problemas and permitido:
+                print(f"    motivo: {permitido}")
+
+        if problemas and not permitido:
+            regressoes.append((origem, normalizado, problemas))
+    conn.close()
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica os planos de consulta de todos os comandos SQL do MercPrd3.")
+    parser.add_argument('--produtos', type=int, default=PRODUTOS_PADRAO, help="tamanho do catálogo de teste")
+    parser.add_argument('--usuarios', type=int, default=USUARIOS_PADRAO, help="quantidade de contas de teste")
+    parser.add_argument('--mostrar', action='store_true', help="mostra o plano de todos os comandos")
+    parser.add_argument('--memoria', action='store_true', help="cria o banco de teste na memória em vez do disco")
+    argumentos = parser.parse_args()
+
+    diretorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='planos_mercprd_') as diretorio:
+        os.chdir(diretorio)
+        try:
+            # No motor em memória 'mercprd.db' é só o snapshot, salvo ao fechar; sem ele o
+            # arquivo de vendas ficaria desligado e os comandos dele, sem verificação
+            MercPrd3.configurar_armazenamento('mercprd.db', 'memoria' if argumentos.memoria else 'disco',
+                                              intervalo_snapshot=0)
+            preparar_banco(argumentos.produtos, argumentos.usuarios)
+            comandos = coletar_comandos()
+            regressoes = verificar(comandos, argumentos.mostrar)
+            comandos_do_caixa = coletar_comandos_do_caixa(comandos)
+            regressoes += verificar(comandos_do_caixa, argumentos.mostrar)
+            comandos.update(comandos_do_caixa)
+        finally:
+            MercPrd3.armazenamento().fechar()
+            os.chdir(diretorio_original)
+
+    print(f"\n{len(comandos)} comando(s) SQL verificado(s).")
+    if not regressoes:
+        print("Nenhuma regressão de plano encontrada.")
+        return 0
+
+    print(f"{len(regressoes)} comando(s) com varredura ou ordenação temporária não permitida:")
+    for origem, normalizado, problemas in regressoes:
+        print(f"\n  ({origem}) {normalizado}")
+        for problema in problemas:
+            print(f"    -> {problema}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())